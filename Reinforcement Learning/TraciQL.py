@@ -2,10 +2,17 @@ import os
 import sys 
 import random
 import numpy as np
-import matplotlib.pyplot as plt
 import traci
-import json
-import ast # To safely convert string keys back to tuples
+import meso_profile
+import sumo_pool
+from qtable import load_q_table, save_q_table, visits_file_for, load_visit_counts, save_visit_counts
+from traci_env import SUMO_CFG, DETECTOR_IDS
+from convergence import ConvergenceMonitor
+from discretizer import identity, resolve_for_q_table, save_for_q_table
+from metrics_sink import MetricsSink, new_run_dir
+from emissions import EmissionsMeter
+from preemption import PreemptionController
+from stepping import run_steps
 
 # Step 2: Establish path to SUMO (SUMO_HOME)
 if 'SUMO_HOME' in os.environ:
@@ -16,18 +23,40 @@ else:
 
 
 # Step 3: Define Sumo configuration
-Sumo_config = [
-    'sumo-gui',
-    '-c', 'Reinforcement Learning/RML/RL.sumocfg',
-    '--step-length', '0.10',
-    '--delay', '0',
-    '--lateral-resolution', '0'
-]
+# 'micro' = full microscopic SUMO (final tuning), 'meso' = mesoscopic fast-training
+# profile from RML/RL.meso.sumocfg (cheap pretraining runs)
+SIM_PROFILE = 'micro'
+Sumo_config = meso_profile.build_sumo_command(SUMO_CFG, SIM_PROFILE, binary='sumo-gui')
 
 # Step 4: Open connection between SUMO and Traci
-traci.start(Sumo_config)
+# (takes a pre-launched instance when a SUMO pool is running, see sumo_pool.py)
+sumo_pool.connect(Sumo_config)
 traci.gui.setSchema("View #0", "real world")
 
+# In the meso profile there are no lane area detectors; the adapter rebuilds
+# the same observation vector from edge aggregates.
+meso_adapter = None
+if SIM_PROFILE == 'meso':
+    scenario_dir = os.path.dirname(SUMO_CFG)
+    meso_adapter = meso_profile.MesoObservationAdapter(
+        os.path.join(scenario_dir, 'RL.add.xml'),
+        os.path.join(scenario_dir, 'RL.net.xml'),
+        DETECTOR_IDS
+    )
+    meso_adapter.subscribe()
+
+# CO2/fuel/NOx on the controlled approaches, from subscribed lane aggregates
+step_length = meso_profile.MESO_STEP_LENGTH if SIM_PROFILE == 'meso' else meso_profile.MICRO_STEP_LENGTH
+emissions_meter = EmissionsMeter("Node2", step_length)
+emissions_meter.subscribe()
+
+# Emergency vehicles approaching Node2 take over the light (see PreemptionController)
+EMERGENCY_PREEMPTION = True
+preemption = None
+if EMERGENCY_PREEMPTION:
+    preemption = PreemptionController("Node2")
+    preemption.subscribe()
+
 # -------------------------
 # Step 5: Define Variables
 # -------------------------
@@ -40,6 +69,9 @@ current_phase = 0
 
 # ---- Reinforcement Learning Hyperparameters ----
 TOTAL_STEPS = 50000 # The total number of simulation steps for continuous (online) training.
+PIPELINED_STEPPING = False # Overlap the Q-update of step t with SUMO computing step t+1
+# Stop early (or anneal epsilon) once the policy has converged; None = always run TOTAL_STEPS
+CONVERGENCE_MODE = 'stop' # 'stop', 'anneal' or None
 
 ALPHA = 0.1 # Learning rate (α) between[0, 1]
 GAMMA = 0.9 # Discount factor (γ) between[0, 1]
@@ -50,27 +82,35 @@ ACTIONS = [0, 1]# The discrete action space (0 = keep phase, 1 = switch phase)
 # Q-table dictionary: key = state tuple, value = numpy array of Q-values for each action
 Q_table = {}
 
+# ---- State discretization ----
+# identity() keeps raw vehicle counts per direction (the table grows with traffic volume).
+# Bins saved next to the Q-table (q_table.bins.json) replace this setting: the bins the table was
+# trained with, or quantile bins fitted from a recorded run with `python discretizer.py runs/<run>`.
+# Bounded alternatives for a new table are discretizer.fixed_bins(5, 60) and discretizer.log_bins(2, 64).
+DISCRETIZER = identity()
+
+# ---- Reward ----
+# Penalty per g/s of CO2 emitted on the controlled approaches, added to the queue
+# penalty. 0 keeps the queue-only reward; emissions are recorded either way.
+EMISSION_REWARD_WEIGHT = 0.0
+
 # ---- Additional Stability Parameters ----
-MIN_GREEN_STEPS = 100
+MIN_GREEN_STEPS = meso_profile.steps_for_profile(100, SIM_PROFILE) # 10 s of green in either profile
 last_switch_step = -MIN_GREEN_STEPS
 
 # ----------------------------------------------------
 # New Logic: Load or initialize Q-table
 # ----------------------------------------------------
 Q_TABLE_FILE = 'q_table.txt'
-if os.path.exists(Q_TABLE_FILE):
-    try:
-        with open(Q_TABLE_FILE, 'r') as f:
-            Q_table_serializable = json.load(f)
-            # Convert string keys back to tuples and lists back to numpy arrays
-            Q_table = {ast.literal_eval(k): np.array(v) for k, v in Q_table_serializable.items()}
-        print(f"\nLoaded existing Q-table from {Q_TABLE_FILE}. Size: {len(Q_table)}")
-    except (IOError, json.JSONDecodeError) as e:
-        print(f"\nError loading Q-table file: {e}. Starting with an empty Q-table.")
-        Q_table = {}
-else:
-    print(f"\n{Q_TABLE_FILE} not found. Starting with an empty Q-table.")
-    Q_table = {}
+Q_table = load_q_table(Q_TABLE_FILE)
+# How often each state was acted in, accumulated across runs (read by q_table_analytics.py)
+Q_VISITS_FILE = visits_file_for(Q_TABLE_FILE)
+visit_counts = load_visit_counts(Q_VISITS_FILE)
+# The bin definition is saved next to the Q-table; saved bins are always kept
+try:
+    DISCRETIZER = resolve_for_q_table(DISCRETIZER, Q_TABLE_FILE, bool(Q_table))
+except ValueError as e:
+    sys.exit(str(e))
 
 # -------------------------
 # Step 6: Define Functions
@@ -84,36 +124,40 @@ def get_max_Q_value_of_state(s):
         Q_table[s] = np.zeros(len(ACTIONS))
     return np.max(Q_table[s])
 
-def get_reward(state):
+def get_reward(observation, emissions=None):
     """
-    Calculates the reward based on the total queue length.
+    Calculates the reward based on the total queue length (and, with
+    EMISSION_REWARD_WEIGHT > 0, the CO2 emitted on the controlled approaches).
     A negative reward encourages the agent to minimize vehicle queues.
     """
-    # The state tuple is now (current_phase, q_EB_0, q_EB_1, q_EB_2, ...)
+    # The raw observation is (current_phase, q_EB, q_SB, q_WB, q_NB); the reward
+    # uses the actual vehicle counts, not their bins
     # Summing up all queue length variables
-    total_queue = sum(state[1:])
+    total_queue = sum(observation[1:])
     reward = -float(total_queue)
+    if EMISSION_REWARD_WEIGHT and emissions is not None:
+        reward -= EMISSION_REWARD_WEIGHT * emissions['co2_mg_s'] / 1000.0
     return reward
 
-def get_state():
+def get_observation():
     """
-    Retrieves the current state of the simulation from SUMO.
-    The state is a tuple of the current phase and the queue lengths
+    Retrieves the current raw observation of the simulation from SUMO.
+    The observation is a tuple of the current phase and the queue lengths
     for all lanes.
     """
     global q_EB, q_SB, q_WB, q_NB, current_phase
     
     # Detector IDs
-    detector_ids = {
-        'EB': ["Node1_2_EB_0", "Node1_2_EB_1", "Node1_2_EB_2"],
-        'SB': ["Node2_7_SB_0", "Node2_7_SB_1", "Node2_7_SB_2"],
-        'WB': ["Node2_3_WB_0", "Node2_3_WB_1", "Node2_3_WB_2"],
-        'NB': ["Node2_5_NB_0", "Node2_5_NB_1", "Node2_5_NB_2"] # Example NB detectors
-    }
+    detector_ids = DETECTOR_IDS
     
     # Traffic light ID
     traffic_light_id = "Node2"
     
+    if meso_adapter is not None:
+        observation = meso_adapter.get_state(traffic_light_id)
+        current_phase = observation[0]
+        return observation
+    
     # Get queue lengths from each detector and store in dictionaries
     q_EB = {det_id: get_queue_length(det_id) for det_id in detector_ids['EB']}
     q_SB = {det_id: get_queue_length(det_id) for det_id in detector_ids['SB']}
@@ -125,6 +169,13 @@ def get_state():
     # Return a single tuple containing all queue lengths and the current phase
     return (current_phase, sum(q_EB.values()), sum(q_SB.values()), sum(q_WB.values()), sum(q_NB.values()))
 
+def get_state(observation):
+    """
+    Turns a raw observation into the Q-table state: the current phase plus the
+    discretized queue of every direction (see DISCRETIZER).
+    """
+    return (observation[0],) + DISCRETIZER(observation[1:])
+
 def apply_action(action, tls_id="Node2"):
     """
     Executes the chosen action on the traffic light.
@@ -159,7 +210,9 @@ def update_Q_table(old_state, action, reward, new_state):
     # 2) Predict Q-values for new_state to get max future Q (new state)
     best_future_q = get_max_Q_value_of_state(new_state)
     # 3) Incorporate ALPHA to partially update the Q-value and update Q table
-    Q_table[old_state][action] = old_q + ALPHA * (reward + GAMMA * best_future_q - old_q)
+    q_delta = ALPHA * (reward + GAMMA * best_future_q - old_q)
+    Q_table[old_state][action] = old_q + q_delta
+    return q_delta
 
 def get_action_from_policy(state):
     """
@@ -188,41 +241,42 @@ def get_current_phase(tls_id):
     return traci.trafficlight.getPhase(tls_id)
 
 
-# -------------------------
-# Step 7: Fully Online Continuous Learning Loop
-# -------------------------
-
-# Lists to record data for plotting
-step_history = []
-reward_history = []
-queue_history = []
-wait_time_history = []
-vehicle_wait_times = {}
+def simulation_step():
+    """
+    Advances SUMO by one step and reads everything the learner needs from it:
+    the new observation, the waiting time of every vehicle in the simulation
+    and the emissions on the controlled approaches.
+    All TraCI traffic of a step happens here.
+    """
+    traci.simulationStep() # Advance simulation by one step
+    new_observation = get_observation()
+    wait_times = {veh_id: traci.vehicle.getWaitingTime(veh_id) for veh_id in traci.vehicle.getIDList()}
+    emissions = emissions_meter.read()
+    return new_observation, wait_times, emissions
 
-cumulative_reward = 0.0
+def learn_and_record(step, state, action, new_state, new_observation, wait_times, emissions, preempted=False):
+    """
+    Q-update and metrics bookkeeping for one transition. Touches no TraCI
+    state, so in pipelined mode it runs while SUMO computes the next step.
+    Transitions during emergency preemption are recorded but not learned
+    from: the light did not follow the agent's action.
+    """
+    global cumulative_reward, stop_training, EPSILON
 
-print("\n=== Starting Fully Online Continuous Learning ===")
-for step in range(TOTAL_STEPS):
-    current_simulation_step = step
-    
-    state = get_state()
-    action = get_action_from_policy(state)
-    apply_action(action)
-    
-    traci.simulationStep() # Advance simulation by one step
-    
-    new_state = get_state()
-    reward = get_reward(new_state)
+    reward = get_reward(new_observation, emissions)
     cumulative_reward += reward
     
-    update_Q_table(state, action, reward, new_state)
-    
-    # Update and calculate average wait time
-    vehicle_ids = traci.vehicle.getIDList()
+    if not preempted:
+        q_delta = update_Q_table(state, action, reward, new_state)
+        visit_counts[state] = visit_counts.get(state, 0) + 1
+        
+        if convergence_monitor is not None:
+            convergence_monitor.record(q_delta, reward, Q_table[state][action])
+            if convergence_monitor.due():
+                stop_training, EPSILON = convergence_monitor.check(step, Q_table, EPSILON)
     
     # Update waiting times for all vehicles in the simulation
-    for veh_id in vehicle_ids:
-        vehicle_wait_times[veh_id] = traci.vehicle.getWaitingTime(veh_id)
+    vehicle_wait_times.update(wait_times)
         
     avg_wait_time = None
     if vehicle_wait_times:
@@ -230,84 +284,116 @@ for step in range(TOTAL_STEPS):
         if valid_wait_times:
             avg_wait_time = sum(valid_wait_times) / len(valid_wait_times)
 
-    # Print Q-values for the old_state right after update
-    updated_q_vals = Q_table.get(state, np.zeros(len(ACTIONS)))
-
     # Record data every 100 steps
     if step % 1 == 0:
         # Sum the queue lengths for each direction
-        total_q_EB = new_state[1]
-        total_q_SB = new_state[2]
-        total_q_WB = new_state[3]
-        total_q_NB = new_state[4]
-        #print(f"Step {step}, Current_Phase: {new_state[0]}, Total_Queue_EB: {total_q_EB}, Total_Queue_SB: {total_q_SB}, Total_Queue_WB: {total_q_WB}, Total_Queue_NB: {total_q_NB}, Reward: {reward:.2f}, Cumulative Reward: {cumulative_reward:.2f}")
+        total_q_EB = new_observation[1]
+        total_q_SB = new_observation[2]
+        total_q_WB = new_observation[3]
+        total_q_NB = new_observation[4]
+        #print(f"Step {step}, Current_Phase: {new_observation[0]}, Total_Queue_EB: {total_q_EB}, Total_Queue_SB: {total_q_SB}, Total_Queue_WB: {total_q_WB}, Total_Queue_NB: {total_q_NB}, Reward: {reward:.2f}, Cumulative Reward: {cumulative_reward:.2f}")
         
         step_history.append(step)
         reward_history.append(cumulative_reward)
-        queue_history.append(sum(new_state[1:])) # sum of all queue lengths
+        queue_history.append(sum(new_observation[1:])) # sum of all queue lengths
         if avg_wait_time is not None:
             wait_time_history.append(avg_wait_time)
-        #print("Current Q-table:")
-        # for st, qvals in Q_table.items(): 
-        #     print(f"   {st} -> {qvals}")
+        metrics.record(
+            step=step, phase=new_observation[0],
+            q_EB=total_q_EB, q_SB=total_q_SB, q_WB=total_q_WB, q_NB=total_q_NB,
+            total_queue=queue_history[-1], reward=reward, cumulative_reward=cumulative_reward,
+            avg_wait_time=avg_wait_time if avg_wait_time is not None else np.nan,
+            preempted=int(preempted), **emissions
+        )
+
+
+# -------------------------
+# Step 7: Fully Online Continuous Learning Loop
+# -------------------------
+
+# Lists to record data for plotting
+step_history = []
+reward_history = []
+queue_history = []
+wait_time_history = []
+vehicle_wait_times = {}
+
+cumulative_reward = 0.0
+stop_training = False
+convergence_monitor = ConvergenceMonitor(mode=CONVERGENCE_MODE) if CONVERGENCE_MODE else None
+# Per-step metrics (raw observations, reward, wait time, emissions) for reports and quantile bins
+metrics = MetricsSink(new_run_dir(), meta={'sim_profile': SIM_PROFILE, 'discretizer': DISCRETIZER.to_dict(),
+                                           'emission_reward_weight': EMISSION_REWARD_WEIGHT})
+
+print("\n=== Starting Fully Online Continuous Learning ===")
+state = get_state(get_observation())
+
+def act(step, observed):
+    """
+    Chooses the step's action from the state observed after the previous step
+    and applies it, unless an emergency vehicle holds the light.
+    """
+    global current_simulation_step, last_switch_step
+    current_simulation_step = step
+    
+    state = observed[0]
+    action = get_action_from_policy(state)
+    preempted = preemption is not None and preemption.control()
+    if preempted:
+        last_switch_step = step # Minimum green restarts when control returns to the agent
+    else:
+        apply_action(action)
+    return state, action, preempted
+
+def observe_step():
+    new_observation, wait_times, emissions = simulation_step()
+    return get_state(new_observation), new_observation, wait_times, emissions
+
+def learn(step, decision, observed):
+    state, action, preempted = decision
+    learn_and_record(step, state, action, *observed, preempted)
+    return stop_training
+
+# Pipelined stepping lets SUMO compute step t while the Q-update of step t-1 runs (see stepping.run_steps)
+run_steps(TOTAL_STEPS, (state,), act, observe_step, learn, pipelined=PIPELINED_STEPPING)
       
 # -------------------------
 # Step 8: Close connection between SUMO and Traci
 # -------------------------
 traci.close()
+metrics.close()
+print(f"\nPer-step metrics have been saved to {metrics.run_dir}")
 
-# Print final Q-table info
+# Print final Q-table info (run q_table_analytics.py for coverage and policy details)
 print("\nOnline Training completed. Final Q-table size:", len(Q_table))
-for st, actions in Q_table.items():
-    print("State:", st, "-> Q-values:", actions)
     
 if wait_time_history:
     final_avg_wait_time = sum(wait_time_history) / len(wait_time_history)
     print(f"\nAverage waiting time during the simulation: {final_avg_wait_time:.2f} seconds")
 
+totals = emissions_meter.totals_g()
+print(f"Emissions on the controlled approaches: CO2 {totals['co2_g'] / 1000:.2f} kg, "
+      f"fuel {totals['fuel_g'] / 1000:.2f} kg, NOx {totals['nox_g']:.1f} g")
+
+if preemption is not None:
+    stats = preemption.stats()
+    if stats['preemptions']:
+        print(f"Emergency preemptions: {stats['preemptions']}, detection-to-green latency "
+              f"mean {stats['latency_mean_s']:.1f} s, max {stats['latency_max_s']:.1f} s")
+    print(f"Preemption check cost: {stats['control_us_per_step']:.0f} µs per step")
+
 # -------------------------
 # Step 9: Save the Q-table to a text file
 # -------------------------
-# The keys of the dictionary must be strings for JSON serialization, so we convert them.
-# The values are numpy arrays, which also need to be converted to lists.
-Q_table_serializable = {str(k): v.tolist() for k, v in Q_table.items()}
-
-with open(Q_TABLE_FILE, 'w') as f:
-    json.dump(Q_table_serializable, f, indent=4)
+save_q_table(Q_table, Q_TABLE_FILE)
+save_visit_counts(visit_counts, Q_VISITS_FILE)
+save_for_q_table(DISCRETIZER, Q_TABLE_FILE)
 
 print(f"\nQ-table has been saved to {Q_TABLE_FILE}")
 
 # -------------------------
 # Visualization of Results
 # -------------------------
-
-# # Plot Cumulative Reward over Simulation Steps
-# plt.figure(figsize=(10, 6))
-# plt.plot(step_history, reward_history, marker='o', linestyle='-', label="Cumulative Reward")
-# plt.xlabel("Simulation Step")
-# plt.ylabel("Cumulative Reward")
-# plt.title("RL Training: Cumulative Reward over Steps")
-# plt.legend()
-# plt.grid(True)
-# plt.show()
-
-# # Plot Total Queue Length over Simulation Steps
-# plt.figure(figsize=(10, 6))
-# plt.plot(step_history, queue_history, marker='o', linestyle='-', label="Total Queue Length")
-# plt.xlabel("Simulation Step")
-# plt.ylabel("Total Queue Length")
-# plt.title("RL Training: Queue Length over Steps")
-# plt.legend()
-# plt.grid(True)
-# plt.show()
-
-# # Plot Average Wait Time over Simulation Steps
-# if wait_time_history:
-#     plt.figure(figsize=(10, 6))
-#     plt.plot(step_history, wait_time_history, marker='o', linestyle='-', label="Average Wait Time")
-#     plt.xlabel("Simulation Step")
-#     plt.ylabel("Average Wait Time (s)")
-#     plt.title("RL Training: Average Wait Time over Steps")
-#     plt.legend()
-#     plt.grid(True)
-#     plt.show()
+# Plotting every step here was too slow for long runs. Render the cumulative reward,
+# queue length and wait time curves from the recorded metrics instead:
+#   python training_report.py runs/<run> [runs/<other run> ...]
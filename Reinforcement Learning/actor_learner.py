@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import queue
+import random
+import argparse
+import multiprocessing as mp
+import numpy as np
+
+from qtable import ACTIONS, DenseQTable, load_q_table, save_q_table
+from discretizer import load_for_q_table
+
+# ---- Reinforcement Learning Hyperparameters (same as TraciQL) ----
+ALPHA = 0.1
+GAMMA = 0.9
+EPSILON = 0.1
+
+# ---- Actor-learner parameters ----
+TRANSITION_QUEUE_SIZE = 256 # Bounded: actors block when the learner falls behind
+ACTOR_BATCH = 64 # Transitions per message from an actor
+LEARNER_BATCH = 1024 # Transitions per vectorized learner update
+BROADCAST_EVERY = 4 # Learner updates between policy versions
+MAX_POLICY_LAG = 8 # How many versions an actor's policy may fall behind
+
+
+def run_actor(index, steps, profile, seed, transitions, policy_updates, learner_version, max_policy_lag=MAX_POLICY_LAG,
+              discretizer=None):
+    """
+    Runs SUMO and the epsilon-greedy policy, streaming transitions to the
+    learner. The local policy is a copy of the learner's Q-values, kept up to
+    date from the rows the learner broadcasts with every version.
+    """
+    from traci_env import TraciEnv
+
+    random.seed(seed)
+    policy = {}
+    version = 0
+
+    def apply_policy_update(update):
+        nonlocal version
+        new_version, states, values = update
+        for s, v in zip(states, values):
+            policy[tuple(int(x) for x in s)] = v
+        version = new_version
+
+    env = TraciEnv(label=f'actor-{index}', profile=profile, seed=seed, discretizer=discretizer)
+    batch = []
+    try:
+        state = env.reset()
+        for step in range(steps):
+            # Take every policy version published so far, and wait for a fresh
+            # one if ours has fallen more than max_policy_lag versions behind
+            while True:
+                try:
+                    apply_policy_update(policy_updates.get_nowait())
+                except queue.Empty:
+                    break
+            while learner_version.value - version > max_policy_lag:
+                apply_policy_update(policy_updates.get())
+
+            if random.random() < EPSILON:
+                action = random.choice(ACTIONS)
+            else:
+                action = int(np.argmax(policy.get(state, np.zeros(len(ACTIONS)))))
+            new_state, reward = env.step(action)
+            batch.append((state, action, reward, new_state))
+            state = new_state
+
+            if len(batch) >= ACTOR_BATCH:
+                transitions.put((index, version, batch))
+                batch = []
+        if batch:
+            transitions.put((index, version, batch))
+    finally:
+        env.close()
+        transitions.put((index, None, None)) # This actor is done
+
+
+def run_learner(q_table, transitions, policy_queues, learner_version, n_actors, max_policy_lag=MAX_POLICY_LAG):
+    """
+    Drains the transition queue into batches of LEARNER_BATCH and applies each
+    batch as one vectorized Q-learning update. Every BROADCAST_EVERY updates it
+    publishes a new policy version holding the rows that changed.
+    """
+    finished = 0
+    updates = 0
+    dropped = 0
+    applied = 0
+    changed_rows = set()
+    buffer = []
+    start = time.perf_counter()
+
+    while finished < n_actors or buffer:
+        try:
+            index, version, batch = transitions.get(timeout=0.1)
+            if batch is None:
+                finished += 1
+            elif learner_version.value - version > max_policy_lag:
+                dropped += len(batch) # Collected under a policy that is too stale
+            else:
+                buffer.extend(batch)
+        except queue.Empty:
+            pass
+
+        if len(buffer) >= LEARNER_BATCH or (buffer and finished == n_actors):
+            states, actions, rewards, new_states = zip(*buffer)
+            rows = q_table.rows(np.array(states))
+            new_rows = q_table.rows(np.array(new_states))
+            q_table.batch_update(rows, np.array(actions), np.array(rewards), new_rows, ALPHA, GAMMA)
+            changed_rows.update(rows.tolist())
+            applied += len(buffer)
+            buffer = []
+            updates += 1
+
+            if updates % BROADCAST_EVERY == 0:
+                learner_version.value += 1
+                changed = np.array(sorted(changed_rows))
+                update = (learner_version.value, q_table.states[changed], q_table.values[changed])
+                for policy_queue in policy_queues:
+                    policy_queue.put(update)
+                changed_rows.clear()
+                elapsed = time.perf_counter() - start
+                print(f"Policy version {learner_version.value}: {applied} transitions "
+                      f"({applied / elapsed:.0f}/s), {dropped} dropped as stale, Q-table size: {q_table.size}")
+    return q_table
+
+
+if __name__ == '__main__':
+    if 'SUMO_HOME' in os.environ:
+        tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+        sys.path.append(tools)
+    else:
+        sys.exit("Please declare environment variable 'SUMO_HOME'")
+
+    parser = argparse.ArgumentParser(description="Asynchronous actor-learner Q-learning with SUMO actors.")
+    parser.add_argument('--actors', type=int, default=max(1, os.cpu_count() - 1))
+    parser.add_argument('--steps', type=int, default=50000, help="Simulation steps per actor")
+    parser.add_argument('--profile', choices=['micro', 'meso'], default='micro')
+    parser.add_argument('--max-policy-lag', type=int, default=MAX_POLICY_LAG)
+    parser.add_argument('--q-table', default='q_table.txt')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    q_table = DenseQTable.from_dict(load_q_table(args.q_table))
+    discretizer = load_for_q_table(args.q_table) # Actors keep the table's state space
+    transitions = mp.Queue(maxsize=TRANSITION_QUEUE_SIZE)
+    policy_queues = [mp.Queue() for _ in range(args.actors)]
+    learner_version = mp.Value('q', 0, lock=False) # Only the learner writes it
+
+    # Every actor starts from the loaded table as version 0
+    initial = (0, q_table.states[:q_table.size], q_table.values[:q_table.size])
+    for policy_queue in policy_queues:
+        policy_queue.put(initial)
+
+    actors = [
+        mp.Process(target=run_actor,
+                   args=(i, args.steps, args.profile, args.seed + i, transitions, policy_queues[i],
+                         learner_version, args.max_policy_lag, discretizer))
+        for i in range(args.actors)
+    ]
+    print(f"\n=== Starting actor-learner training with {args.actors} actors ===")
+    for actor in actors:
+        actor.start()
+
+    run_learner(q_table, transitions, policy_queues, learner_version, args.actors, args.max_policy_lag)
+
+    for actor in actors:
+        actor.join()
+    for policy_queue in policy_queues:
+        # Finished actors no longer read their queue; don't wait to flush it
+        policy_queue.cancel_join_thread()
+
+    save_q_table(q_table.to_dict(), args.q_table)
+    print(f"\nTraining completed. Q-table ({q_table.size} states) has been saved to {args.q_table}")
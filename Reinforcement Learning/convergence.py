@@ -0,0 +1,137 @@
+import json
+import time
+import numpy as np
+
+# ---- Default convergence criteria ----
+CONVERGENCE_WINDOW = 5000 # Steps per sliding window
+CHECK_EVERY = 1000 # Steps between two checks of the last window
+Q_DELTA_TOL = 0.01 # Mean |ΔQ| relative to the mean |Q| of the updated values below which they count as settled
+POLICY_CHANGE_TOL = 0.01 # Fraction of states whose greedy action may still flip within a window
+REWARD_PLATEAU_TOL = 0.02 # Relative change of the mean reward between a window and the one before it
+PATIENCE = 3 # Windows' worth of consecutive checks that must meet every criterion
+
+
+class ConvergenceMonitor:
+    """
+    Running convergence statistics for online Q-learning.
+
+    Per step it records the magnitude of the Q-value change, the updated
+    Q-value and the reward. Every check_every steps it looks at the last
+    `window` steps: the mean |ΔQ| relative to the mean |Q| of the updated
+    values (so the tolerance does not depend on the reward scale), the
+    fraction of states whose greedy action changed since the check one
+    window earlier, and the relative change of the mean reward against the
+    window before. When all three hold at every check over PATIENCE windows,
+    training has converged: mode 'stop' ends it, mode 'anneal' lowers epsilon
+    instead and only stops once epsilon reaches its floor. Every check and
+    every stop/anneal decision is appended to log_file.
+    """
+
+    def __init__(self, window=CONVERGENCE_WINDOW, q_delta_tol=Q_DELTA_TOL,
+                 policy_change_tol=POLICY_CHANGE_TOL, reward_tol=REWARD_PLATEAU_TOL,
+                 patience=PATIENCE, mode='stop', epsilon_decay=0.5, epsilon_min=0.01,
+                 log_file='convergence_log.jsonl', check_every=CHECK_EVERY):
+        if mode not in ('stop', 'anneal'):
+            raise ValueError(f"Unknown convergence mode '{mode}', expected 'stop' or 'anneal'")
+        self.window = window
+        self.check_every = min(check_every, window)
+        self.q_delta_tol = q_delta_tol
+        self.policy_change_tol = policy_change_tol
+        self.reward_tol = reward_tol
+        self.patience = patience
+        self.mode = mode
+        self.epsilon_decay = epsilon_decay
+        self.epsilon_min = epsilon_min
+        self.log_file = log_file
+
+        # Ring buffers; rewards keep two windows for the plateau comparison
+        self.q_deltas = np.zeros(window)
+        self.q_values = np.zeros(window)
+        self.rewards = np.zeros(2 * window)
+        self.count = 0
+        # Greedy policies of the checks of the last window, oldest first
+        self.checks_per_window = max(window // self.check_every, 1)
+        self.greedy_history = []
+        self.streak = 0
+        self.history = []
+
+    def record(self, q_delta, reward, q_value):
+        i = self.count % self.window
+        self.q_deltas[i] = abs(q_delta)
+        self.q_values[i] = abs(q_value)
+        self.rewards[self.count % (2 * self.window)] = reward
+        self.count += 1
+
+    def due(self):
+        return self.count >= self.window and self.count % self.check_every == 0
+
+    def _reward_means(self):
+        # Mean reward of the window before the last one and of the last one
+        newest = (self.count - 1) % (2 * self.window)
+        order = np.roll(self.rewards, -(newest + 1)) # Oldest first
+        return float(order[:self.window].mean()), float(order[self.window:].mean())
+
+    def _policy_change(self, Q_table):
+        # Greedy actions now against those of the check one window ago
+        if not Q_table:
+            return 1.0
+        states = list(Q_table.keys())
+        greedy = np.argmax(np.array([Q_table[s] for s in states]), axis=1)
+        current = dict(zip(states, greedy.tolist()))
+        self.greedy_history.append(current)
+        if len(self.greedy_history) <= self.checks_per_window:
+            return 1.0
+        previous = self.greedy_history.pop(0)
+        common = [s for s in previous if s in current]
+        changed = sum(1 for s in common if previous[s] != current[s])
+        return changed / len(common) if common else 1.0
+
+    def _log(self, event):
+        event['wall_time'] = time.time()
+        with open(self.log_file, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+    def check(self, step, Q_table, epsilon):
+        """
+        Evaluates the criteria over the last window.
+        Returns (stop, epsilon): whether to stop training and the epsilon to use from now on.
+        """
+        q_delta = float(self.q_deltas.mean())
+        relative_q_delta = q_delta / max(float(self.q_values.mean()), 1e-9)
+        previous_reward_mean, reward_mean = self._reward_means()
+        policy_change = self._policy_change(Q_table)
+        if self.count < 2 * self.window:
+            reward_change = float('inf')
+        else:
+            reward_change = abs(reward_mean - previous_reward_mean) / max(abs(previous_reward_mean), 1e-9)
+
+        converged = (relative_q_delta < self.q_delta_tol
+                     and policy_change < self.policy_change_tol
+                     and reward_change < self.reward_tol)
+        self.streak = self.streak + 1 if converged else 0
+
+        stats = {
+            'event': 'check', 'step': step, 'mean_abs_q_delta': q_delta,
+            'relative_q_delta': relative_q_delta,
+            'policy_change': policy_change, 'reward_mean': reward_mean,
+            'reward_change': reward_change if np.isfinite(reward_change) else None,
+            'states': len(Q_table), 'epsilon': epsilon, 'streak': self.streak
+        }
+        self.history.append(stats)
+        self._log(stats)
+
+        if self.streak < self.patience * self.checks_per_window:
+            return False, epsilon
+
+        self.streak = 0
+        if self.mode == 'anneal' and epsilon > self.epsilon_min:
+            new_epsilon = max(epsilon * self.epsilon_decay, self.epsilon_min)
+            self._log({'event': 'anneal', 'step': step, 'epsilon': new_epsilon, 'previous_epsilon': epsilon})
+            print(f"\nConverged at step {step} with epsilon {epsilon}; annealing epsilon to {new_epsilon}")
+            return False, new_epsilon
+
+        self._log({'event': 'stop', 'step': step, 'epsilon': epsilon,
+                   'reason': f"all criteria met for {self.patience} consecutive windows of {self.window} steps"})
+        print(f"\nConverged at step {step}: mean |ΔQ| {relative_q_delta:.2%} of |Q|, policy change {policy_change:.2%}, "
+              f"reward change {reward_change:.2%}. Stopping training.")
+        return True, epsilon
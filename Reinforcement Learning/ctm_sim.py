@@ -0,0 +1,248 @@
+import os
+import time
+import argparse
+import xml.etree.ElementTree as ET
+import numpy as np
+
+from qtable import ACTIONS, DenseQTable, load_q_table, save_q_table
+from meso_profile import load_detector_geometry, load_lane_geometry
+from traci_env import DETECTOR_IDS
+from discretizer import identity, load_for_q_table, save_for_q_table
+
+# ---- Cell-transmission model parameters ----
+STEP_LENGTH = 0.10 # Same step length as the micro SUMO profile used by TraciQL
+FREE_FLOW_SPEED = 13.89 # m/s (speed limit of the RML approaches)
+BACKWARD_WAVE_SPEED = 5.0 # m/s
+JAM_DENSITY = 1.0 / 7.5 # vehicles per metre per lane
+SATURATION_FLOW = 0.5 # vehicles per second per lane (1800 veh/h)
+CELLS_PER_APPROACH = 16
+
+# ---- Same agent interface as TraciQL ----
+MIN_GREEN_STEPS = 100
+
+
+def load_intersection(net_file, additional_file, tls_id='Node2', detector_groups=DETECTOR_IDS):
+    """
+    Extracts what the cell-transmission model needs from the SUMO scenario:
+    the TLS program, and for every approach its lane count, length, detector
+    coverage and which of its lanes each phase serves.
+    """
+    root = ET.parse(net_file).getroot()
+    detectors = load_detector_geometry(additional_file)
+    lanes, lanes_per_edge = load_lane_geometry(net_file)
+
+    logic = next(t for t in root.iter('tlLogic') if t.get('id') == tls_id)
+    phases = [(float(p.get('duration')), p.get('state')) for p in logic.iter('phase')]
+
+    # linkIndex -> set of (from_edge, from_lane) it controls
+    links = {}
+    for conn in root.iter('connection'):
+        if conn.get('tl') == tls_id:
+            links.setdefault(int(conn.get('linkIndex')), set()).add((conn.get('from'), conn.get('fromLane')))
+
+    approaches = []
+    for name, det_ids in detector_groups.items():
+        edge_id = lanes[detectors[det_ids[0]][0]][0]
+        n_lanes = lanes_per_edge[edge_id]
+        length = lanes[f'{edge_id}_0'][1]
+        # Detector (start, end) spans measured from the start of the lane
+        spans = []
+        for det_id in det_ids:
+            _, start, det_length = detectors[det_id]
+            spans.append((start, min(start + det_length, length)))
+        # Share of the approach's lanes with a green link in each phase
+        served = []
+        for _, state in phases:
+            green_lanes = set()
+            for index, conns in links.items():
+                if index < len(state) and state[index] in 'Gg':
+                    green_lanes.update(lane for edge, lane in conns if edge == edge_id)
+            served.append(len(green_lanes) / n_lanes)
+        approaches.append({'name': name, 'edge': edge_id, 'lanes': n_lanes, 'length': length,
+                           'detector_spans': spans, 'served': served})
+    return phases, approaches
+
+
+def estimate_arrival_rates(trips_file, approaches, default=0.1):
+    """
+    Rough demand per approach from a trips file: trips departing on the
+    approach edge divided by the departure window. Falls back to `default`
+    vehicles per second for approaches no trip starts on.
+    """
+    trips = list(ET.parse(trips_file).getroot().iter('trip'))
+    if not trips:
+        return np.full(len(approaches), default)
+    departs = [float(t.get('depart')) for t in trips]
+    window = max(max(departs) - min(departs), 1.0)
+    rates = []
+    for approach in approaches:
+        count = sum(1 for t in trips if t.get('from') == approach['edge'])
+        rates.append(count / window if count else default)
+    return np.array(rates)
+
+
+class VectorIntersectionEnv:
+    """
+    Thousands of independent copies of one signalised intersection simulated
+    in lockstep with a cell-transmission model.
+
+    Every approach is split into CELLS_PER_APPROACH cells; vehicles flow
+    between cells by the usual min(sending, receiving) rule and leave the
+    stop-line cell at saturation flow on the share of lanes the current phase
+    serves. The fixed-time program advances on its own, and action 1 jumps to
+    the next phase after MIN_GREEN_STEPS, exactly like TraciQL.apply_action.
+
+    States are (current_phase, q_EB, q_SB, q_WB, q_NB) with the queue counted
+    over the detector areas and binned by the discretizer (raw counts by
+    default), and the reward is TraciQL's -sum(queues) on the raw counts.
+    """
+
+    def __init__(self, phases, approaches, arrival_rates, n_envs=1024, step_length=STEP_LENGTH,
+                 min_green_steps=MIN_GREEN_STEPS, demand_jitter=0.5, seed=None, discretizer=None):
+        self.n_envs = n_envs
+        self.discretizer = discretizer or identity()
+        self.dt = step_length
+        self.min_green_steps = min_green_steps
+        self.rng = np.random.default_rng(seed)
+
+        self.durations = np.array([d for d, _ in phases])
+        self.n_phases = len(phases)
+        self.served = np.array([a['served'] for a in approaches]).T # (n_phases, n_approaches)
+
+        lanes = np.array([a['lanes'] for a in approaches], dtype=float)
+        lengths = np.array([a['length'] for a in approaches])
+        cell_length = (lengths / CELLS_PER_APPROACH)[:, None]
+        self.send_ratio = np.minimum(FREE_FLOW_SPEED * self.dt / cell_length, 1.0)
+        self.recv_ratio = np.minimum(BACKWARD_WAVE_SPEED * self.dt / cell_length, 1.0)
+        self.capacity = (SATURATION_FLOW * lanes * self.dt)[:, None]
+        self.max_vehicles = JAM_DENSITY * lanes[:, None] * cell_length
+
+        # Fraction of every cell covered by the approach's detectors
+        edges = np.arange(CELLS_PER_APPROACH + 1) * cell_length
+        self.detector_weights = np.zeros((len(approaches), CELLS_PER_APPROACH))
+        for i, approach in enumerate(approaches):
+            for start, end in approach['detector_spans']:
+                overlap = np.clip(np.minimum(edges[i, 1:], end) - np.maximum(edges[i, :-1], start), 0, None)
+                self.detector_weights[i] += overlap / cell_length[i] / len(approach['detector_spans'])
+
+        # Each copy gets its own demand level so the pretrained table covers a range of traffic
+        jitter = self.rng.uniform(1 - demand_jitter, 1 + demand_jitter, (n_envs, len(approaches)))
+        self.arrival_rates = np.asarray(arrival_rates)[None, :] * jitter
+        self.reset()
+
+    def reset(self):
+        n_approaches = self.served.shape[1]
+        self.cells = np.zeros((self.n_envs, n_approaches, CELLS_PER_APPROACH))
+        self.backlog = np.zeros((self.n_envs, n_approaches)) # vehicles waiting to enter the network
+        self.phase = np.zeros(self.n_envs, dtype=np.int64)
+        self.phase_time = np.zeros(self.n_envs)
+        self.step_count = 0
+        self.last_switch_step = np.full(self.n_envs, -self.min_green_steps)
+        return self.get_state()
+
+    def get_observation(self):
+        queues = np.rint((self.cells * self.detector_weights).sum(axis=2)).astype(np.int64)
+        return np.column_stack([self.phase, queues])
+
+    def get_state(self, observations=None):
+        if observations is None:
+            observations = self.get_observation()
+        return np.column_stack([observations[:, 0], self.discretizer.transform(observations[:, 1:])])
+
+    @staticmethod
+    def get_reward(observations):
+        return -observations[:, 1:].sum(axis=1).astype(float)
+
+    def apply_action(self, actions):
+        switch = (np.asarray(actions) == 1) & (self.step_count - self.last_switch_step >= self.min_green_steps)
+        self.phase = np.where(switch, (self.phase + 1) % self.n_phases, self.phase)
+        self.phase_time[switch] = 0.0
+        self.last_switch_step[switch] = self.step_count
+
+    def simulation_step(self):
+        send = np.minimum(self.cells * self.send_ratio, self.capacity)
+        recv = np.minimum(self.capacity, (self.max_vehicles - self.cells) * self.recv_ratio)
+
+        moved = np.minimum(send[:, :, :-1], recv[:, :, 1:])
+        discharged = send[:, :, -1] * self.served[self.phase]
+
+        self.backlog += self.rng.poisson(self.arrival_rates * self.dt)
+        entering = np.minimum(self.backlog, recv[:, :, 0])
+        self.backlog -= entering
+
+        self.cells[:, :, :-1] -= moved
+        self.cells[:, :, 1:] += moved
+        self.cells[:, :, -1] -= discharged
+        self.cells[:, :, 0] += entering
+
+        # The fixed-time program keeps cycling, as it does in SUMO
+        self.phase_time += self.dt
+        expired = self.phase_time >= self.durations[self.phase]
+        self.phase = np.where(expired, (self.phase + 1) % self.n_phases, self.phase)
+        self.phase_time[expired] = 0.0
+        self.step_count += 1
+
+    def step(self, actions):
+        """
+        Applies one action per copy, advances one step and returns
+        (new_states, rewards), mirroring one iteration of TraciQL's loop.
+        """
+        self.apply_action(actions)
+        self.simulation_step()
+        observations = self.get_observation()
+        return self.get_state(observations), self.get_reward(observations)
+
+
+def pretrain(env, q_table, steps, alpha=0.1, gamma=0.9, epsilon=0.1, log_every=1000):
+    """
+    Runs epsilon-greedy Q-learning on every copy of the environment at once,
+    applying one batched update per step.
+    """
+    rng = np.random.default_rng()
+    rows = q_table.rows(env.reset())
+    start = time.perf_counter()
+    for step in range(steps):
+        greedy = q_table.greedy(rows)
+        explore = rng.random(env.n_envs) < epsilon
+        actions = np.where(explore, rng.integers(0, q_table.n_actions, env.n_envs), greedy)
+
+        new_states, rewards = env.step(actions)
+        new_rows = q_table.rows(new_states)
+        q_table.batch_update(rows, actions, rewards, new_rows, alpha, gamma)
+        rows = new_rows
+
+        if log_every and (step + 1) % log_every == 0:
+            elapsed = time.perf_counter() - start
+            print(f"Step {step + 1}/{steps}, Q-table size: {q_table.size}, "
+                  f"Mean reward: {rewards.mean():.2f}, "
+                  f"Env steps/s: {(step + 1) * env.n_envs / elapsed:,.0f}")
+    return q_table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pretrain a TraciQL Q-table on a vectorized cell-transmission model.")
+    parser.add_argument('--scenario', default='Reinforcement Learning/RML')
+    parser.add_argument('--tls', default='Node2')
+    parser.add_argument('--envs', type=int, default=4096, help="Independent intersection copies")
+    parser.add_argument('--steps', type=int, default=20000)
+    parser.add_argument('--q-table', default='q_table.txt', help="Table to continue from and save to")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    net_file = os.path.join(args.scenario, 'RL.net.xml')
+    phases, approaches = load_intersection(net_file, os.path.join(args.scenario, 'RL.add.xml'), args.tls)
+    rates = estimate_arrival_rates(os.path.join(args.scenario, 'trips.trips.xml'), approaches)
+    print(f"\nApproaches: {[a['name'] for a in approaches]}, arrival rates (veh/s): {np.round(rates, 3).tolist()}")
+
+    # Pretrain in the state space the table is (or will be) trained in online
+    discretizer = load_for_q_table(args.q_table)
+    print(f"State discretization: {discretizer.kind}")
+    env = VectorIntersectionEnv(phases, approaches, rates, n_envs=args.envs, seed=args.seed, discretizer=discretizer)
+    q_table = DenseQTable.from_dict(load_q_table(args.q_table), state_dim=1 + len(approaches), n_actions=len(ACTIONS))
+
+    print("\n=== Starting Vectorized CTM Pretraining ===")
+    pretrain(env, q_table, args.steps)
+
+    save_q_table(q_table.to_dict(), args.q_table)
+    save_for_q_table(discretizer, args.q_table)
+    print(f"\nPretrained Q-table ({q_table.size} states) has been saved to {args.q_table}")
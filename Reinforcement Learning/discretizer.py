@@ -0,0 +1,179 @@
+import os
+import json
+import numpy as np
+
+
+class Discretizer:
+    """
+    Maps the raw per-direction queue counts of an observation onto bin indices,
+    so the Q-table state is (phase, bin_EB, bin_SB, bin_WB, bin_NB) and its
+    size no longer grows with traffic volume.
+
+    A discretizer is fully described by its kind and its bin edges (one sorted
+    list per queue dimension); a value v falls into bin i when
+    edges[i-1] <= v < edges[i]. The 'identity' kind has no edges and keeps the
+    raw counts, which is what TraciQL has always used.
+    """
+
+    def __init__(self, kind='identity', edges=None, params=None):
+        self.kind = kind
+        self.edges = [np.asarray(e, dtype=float) for e in edges] if edges is not None else None
+        self.params = dict(params or {})
+
+    def transform(self, queues):
+        """
+        Vectorized: (n, dims) array of raw queues -> (n, dims) array of bin indices.
+        """
+        queues = np.asarray(queues)
+        if self.edges is None:
+            return queues.astype(np.int64)
+        return np.column_stack([
+            np.searchsorted(self.edges[d], queues[:, d], side='right') for d in range(queues.shape[1])
+        ]).astype(np.int64)
+
+    def __call__(self, queues):
+        """
+        Single observation: tuple of raw queues -> tuple of bins.
+        """
+        if self.edges is None:
+            return tuple(int(q) for q in queues)
+        return tuple(int(np.searchsorted(edges, q, side='right')) for edges, q in zip(self.edges, queues))
+
+    def n_bins(self):
+        return None if self.edges is None else [len(e) + 1 for e in self.edges]
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'edges': None if self.edges is None else [e.tolist() for e in self.edges],
+            'params': self.params,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['kind'], data.get('edges'), data.get('params'))
+
+    def __eq__(self, other):
+        return isinstance(other, Discretizer) and self.to_dict() == other.to_dict()
+
+
+# -------------------------
+# Bin definitions
+# -------------------------
+def identity():
+    return Discretizer('identity')
+
+
+def fixed_bins(width, max_value, dims=4):
+    """
+    Equal-width bins: [0, width), [width, 2*width), ... up to max_value; everything above is the last bin.
+    """
+    edges = np.arange(width, max_value + width, width)
+    return Discretizer('fixed', [edges] * dims, {'width': width, 'max_value': max_value})
+
+
+def log_bins(base=2.0, max_value=128, dims=4):
+    """
+    Bins that widen geometrically: 0, 1, [2, 4), [4, 8), ... with base 2.
+    Small queues stay exact while long queues share a few bins.
+    """
+    edges = [1.0]
+    while edges[-1] * base <= max_value:
+        edges.append(np.ceil(edges[-1] * base))
+    edges = np.unique(edges)
+    return Discretizer('log', [edges] * dims, {'base': base, 'max_value': max_value})
+
+
+def quantile_bins(traces, n_bins=8):
+    """
+    Learns per-dimension edges from recorded raw queues (an (n, dims) array,
+    e.g. the q_* columns of a TraciQL metrics run) so that every bin holds
+    roughly the same share of observations.
+    """
+    traces = np.asarray(traces, dtype=float)
+    quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+    edges = []
+    for d in range(traces.shape[1]):
+        # Queues are integer counts; an edge at x.5 separates x from x+1
+        e = np.unique(np.floor(np.quantile(traces[:, d], quantiles)) + 0.5)
+        edges.append(e)
+    return Discretizer('quantile', edges, {'n_bins': n_bins, 'samples': int(len(traces))})
+
+
+# -------------------------
+# Persistence next to the Q-table
+# -------------------------
+def bins_file_for(q_table_file):
+    """
+    The bin definition is stored next to the Q-table: q_table.txt -> q_table.bins.json.
+    """
+    root, _ = os.path.splitext(q_table_file)
+    return root + '.bins.json'
+
+
+def save_for_q_table(discretizer, q_table_file):
+    with open(bins_file_for(q_table_file), 'w') as f:
+        json.dump(discretizer.to_dict(), f, indent=4)
+
+
+def load_for_q_table(q_table_file):
+    """
+    Returns the discretizer a saved Q-table was trained with. Tables saved
+    before bins were recorded used raw counts (identity).
+    """
+    path = bins_file_for(q_table_file)
+    if not os.path.exists(path):
+        return identity()
+    with open(path, 'r') as f:
+        return Discretizer.from_dict(json.load(f))
+
+
+def resolve_for_q_table(configured, q_table_file, table_has_states):
+    """
+    Picks the discretizer to train with. Bins saved next to the Q-table win
+    over the configured ones, even for a table without states yet (e.g.
+    quantile bins fitted before the first run), so a restart never replaces
+    them. A table that holds states but has no bins file was trained on raw
+    counts; configuring other bins for it raises ValueError rather than
+    silently mixing two state spaces in one table.
+    """
+    path = bins_file_for(q_table_file)
+    if os.path.exists(path):
+        saved = load_for_q_table(q_table_file)
+        if saved != configured:
+            print(f"Using the {saved.kind} bins saved in {path} instead of the configured {configured.kind} bins. "
+                  f"Delete that file or start a new Q-table file to train with other bins.")
+        return saved
+    if table_has_states and configured != identity():
+        raise ValueError(
+            f"{q_table_file} was trained with identity bins but {configured.kind} bins are configured. "
+            f"Use identity() or start a new Q-table file."
+        )
+    return configured
+
+
+if __name__ == '__main__':
+    import argparse
+    from metrics_sink import load_metrics
+
+    parser = argparse.ArgumentParser(description="Fit quantile bins from a recorded TraciQL metrics run.")
+    parser.add_argument('run_dir', help="Metrics run directory (runs/run_...)")
+    parser.add_argument('--bins', type=int, default=8)
+    parser.add_argument('--q-table', default='q_table.txt', help="Q-table the bins are stored next to")
+    parser.add_argument('--force', action='store_true',
+                        help="Replace the bins of a Q-table that already holds states (its states change meaning)")
+    args = parser.parse_args()
+
+    from qtable import load_q_table
+    if os.path.exists(args.q_table) and load_q_table(args.q_table) and not args.force:
+        raise SystemExit(f"{args.q_table} already holds states trained with the bins in {bins_file_for(args.q_table)}; "
+                         f"new bins would change what they mean. Pass --force, or choose a new --q-table.")
+
+    columns = ['q_EB', 'q_SB', 'q_WB', 'q_NB']
+    metrics = load_metrics(args.run_dir, columns)
+    traces = np.column_stack([metrics[c] for c in columns])
+    traces = traces[~np.isnan(traces).any(axis=1)]
+    discretizer = quantile_bins(traces, args.bins)
+    save_for_q_table(discretizer, args.q_table)
+    print(f"Quantile bins from {len(traces)} observations: {[e.tolist() for e in discretizer.edges]}")
+    print(f"Bin definition has been saved to {bins_file_for(args.q_table)}")
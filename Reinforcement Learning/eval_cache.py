@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+import xml.etree.ElementTree as ET
+
+from qtable import load_q_table
+from discretizer import bins_file_for, load_for_q_table
+from traci_env import SUMO_CFG
+from meso_profile import meso_config_path
+
+CACHE_DIR = 'eval_cache'
+EVAL_STEPS = 20000 # Simulation steps of one greedy evaluation
+SCENARIO_INPUTS = ('net-file', 'route-files', 'additional-files')
+
+_sumo_versions = {}
+
+
+# -------------------------
+# Cache key
+# -------------------------
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scenario_files(sumocfg):
+    """
+    The config itself plus every net, route and additional file it loads.
+    """
+    config_dir = os.path.dirname(sumocfg)
+    files = [sumocfg]
+    for element in ET.parse(sumocfg).getroot().iter():
+        if element.tag in SCENARIO_INPUTS:
+            files += [os.path.join(config_dir, name.strip()) for name in element.get('value').split(',') if name.strip()]
+    return files
+
+
+def sumo_version(binary='sumo'):
+    """
+    First line of `sumo --version`, e.g. 'Eclipse SUMO sumo Version 1.24.0'.
+    """
+    if binary not in _sumo_versions:
+        try:
+            output = subprocess.run([binary, '--version'], capture_output=True, text=True, timeout=30).stdout
+            _sumo_versions[binary] = output.strip().splitlines()[0] if output.strip() else 'unknown'
+        except (OSError, subprocess.TimeoutExpired):
+            _sumo_versions[binary] = 'unknown'
+    return _sumo_versions[binary]
+
+
+def cache_key(q_table_file, sumocfg, seed, params, binary='sumo'):
+    """
+    Content hash of everything an evaluation result depends on: the policy
+    (Q-table and its bins), the scenario files, the SUMO version, the seed and
+    the evaluation parameters. Returns (key, inputs) where inputs lists the
+    per-file hashes that went into the key.
+    """
+    config = meso_config_path(sumocfg) if params.get('profile') == 'meso' else sumocfg
+    files = {'policy': [q_table_file], 'scenario': scenario_files(config)}
+    if os.path.exists(bins_file_for(q_table_file)):
+        files['policy'].append(bins_file_for(q_table_file))
+    inputs = {
+        'files': {role: {path: file_hash(path) for path in paths} for role, paths in files.items()},
+        'sumo_version': sumo_version(binary),
+        'seed': seed,
+        'params': params,
+    }
+    blob = json.dumps({
+        'files': {role: sorted(hashes.values()) for role, hashes in inputs['files'].items()},
+        'sumo_version': inputs['sumo_version'], 'seed': seed, 'params': params,
+    }, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest(), inputs
+
+
+# -------------------------
+# Evaluation
+# -------------------------
+def evaluate(q_table_file, sumocfg=SUMO_CFG, seed=42, steps=EVAL_STEPS, profile='micro', binary='sumo'):
+    """
+    Runs the greedy policy of a saved Q-table (no exploration, no learning)
+    for `steps` steps and returns its metrics.
+    """
+    from traci_env import TraciEnv
+
+    Q_table = load_q_table(q_table_file)
+    env = TraciEnv(label=f'eval-{os.getpid()}', sumocfg=sumocfg, profile=profile, binary=binary,
+                   seed=seed, discretizer=load_for_q_table(q_table_file))
+    total_reward = 0.0
+    total_queue = 0
+    unknown_states = 0
+    wait_time_sum = 0.0
+    wait_time_samples = 0
+    arrived = 0
+    start = time.perf_counter()
+    try:
+        state = env.reset()
+        for step in range(steps):
+            q_values = Q_table.get(state)
+            if q_values is None:
+                unknown_states += 1
+                action = 0 # Unknown states keep the phase
+            else:
+                action = int(q_values.argmax())
+            state, reward = env.step(action)
+            total_reward += reward
+            total_queue -= reward
+
+            vehicles = env.conn.vehicle.getIDList()
+            if vehicles:
+                wait_time_sum += sum(env.conn.vehicle.getWaitingTime(v) for v in vehicles) / len(vehicles)
+                wait_time_samples += 1
+            arrived += env.conn.simulation.getArrivedNumber()
+    finally:
+        env.close()
+    return {
+        'steps': steps,
+        'total_reward': total_reward,
+        'mean_reward': total_reward / steps,
+        'mean_queue': total_queue / steps,
+        'mean_wait_time': wait_time_sum / wait_time_samples if wait_time_samples else None,
+        'arrived_vehicles': arrived,
+        'unknown_state_share': unknown_states / steps,
+        'eval_seconds': time.perf_counter() - start,
+    }
+
+
+# -------------------------
+# On-disk index
+# -------------------------
+class EvalCache:
+    """
+    Evaluation results keyed by cache_key(), in cache_dir/index.json.
+    Entries never expire on their own: changing any input changes the key,
+    and stale entries are removed with invalidate().
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return {}
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"\nError loading evaluation cache index: {e}. Starting with an empty cache.")
+            return {}
+
+    def _save(self):
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_file, self.index_file) # Readers never see a half-written index
+
+    def get(self, key):
+        entry = self.index.get(key)
+        return entry['result'] if entry else None
+
+    def put(self, key, inputs, result):
+        self.index[key] = {'created': time.time(), 'inputs': inputs, 'result': result}
+        self._save()
+
+    def invalidate(self, key=None, path=None, everything=False):
+        """
+        Removes one entry, every entry that used the file at `path` (policy or
+        scenario), or the whole index. Returns the number of removed entries.
+        """
+        if everything:
+            removed = list(self.index)
+        elif key is not None:
+            removed = [k for k in self.index if k.startswith(key)]
+        elif path is not None:
+            path = os.path.normpath(path)
+            removed = [
+                k for k, entry in self.index.items()
+                if any(os.path.normpath(p) == path for files in entry['inputs']['files'].values() for p in files)
+            ]
+        else:
+            removed = []
+        for k in removed:
+            del self.index[k]
+        self._save()
+        return len(removed)
+
+    def evaluate(self, q_table_file, sumocfg=SUMO_CFG, seed=42, steps=EVAL_STEPS, profile='micro',
+                 binary='sumo', refresh=False):
+        """
+        Returns (result, cached). Runs the simulation only when no entry
+        matches the current inputs, or when refresh is set.
+        """
+        params = {'steps': steps, 'profile': profile}
+        key, inputs = cache_key(q_table_file, sumocfg, seed, params, binary)
+        result = None if refresh else self.get(key)
+        if result is not None:
+            return result, True
+        result = evaluate(q_table_file, sumocfg, seed, steps, profile, binary)
+        self.put(key, inputs, result)
+        return result, False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cached greedy evaluation of saved Q-tables.")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    eval_parser = sub.add_parser('eval', help="Evaluate Q-tables, reusing cached results")
+    eval_parser.add_argument('q_tables', nargs='+')
+    eval_parser.add_argument('--sumocfg', default=SUMO_CFG)
+    eval_parser.add_argument('--seeds', type=int, nargs='+', default=[42])
+    eval_parser.add_argument('--steps', type=int, default=EVAL_STEPS)
+    eval_parser.add_argument('--profile', choices=['micro', 'meso'], default='micro')
+    eval_parser.add_argument('--refresh', action='store_true', help="Re-run even when a cached result exists")
+
+    sub.add_parser('list', help="List cached results")
+
+    inval_parser = sub.add_parser('invalidate', help="Remove cached results")
+    group = inval_parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--key', help="Entry key (or a prefix of it)")
+    group.add_argument('--path', help="Every entry that used this policy or scenario file")
+    group.add_argument('--all', action='store_true')
+    args = parser.parse_args()
+
+    cache = EvalCache(args.cache_dir)
+    if args.command == 'eval':
+        if 'SUMO_HOME' in os.environ:
+            tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+            sys.path.append(tools)
+        else:
+            sys.exit("Please declare environment variable 'SUMO_HOME'")
+        for q_table_file in args.q_tables:
+            for seed in args.seeds:
+                result, cached = cache.evaluate(q_table_file, args.sumocfg, seed, args.steps, args.profile,
+                                                refresh=args.refresh)
+                source = 'cached' if cached else f"evaluated in {result['eval_seconds']:.1f}s"
+                print(f"{q_table_file} seed {seed}: mean queue {result['mean_queue']:.2f}, "
+                      f"mean reward {result['mean_reward']:.2f} ({source})")
+    elif args.command == 'list':
+        for key, entry in sorted(cache.index.items(), key=lambda item: item[1]['created']):
+            policy = ', '.join(entry['inputs']['files']['policy'])
+            print(f"{key[:12]}  {policy}  seed {entry['inputs']['seed']}  {entry['inputs']['params']}  "
+                  f"mean queue {entry['result']['mean_queue']:.2f}")
+    else:
+        removed = cache.invalidate(key=args.key, path=args.path, everything=args.all)
+        print(f"Removed {removed} cached result(s)")
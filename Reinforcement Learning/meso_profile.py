@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import argparse
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+import numpy as np
+import traci
+import traci.constants as tc
+
+# -------------------------
+# Simulation profiles
+# -------------------------
+# 'micro' is the full microscopic model TraciQL has always trained on.
+# 'meso' runs the same scenario through SUMO's mesoscopic model (RL.meso.sumocfg
+# next to the micro config) for cheap pretraining runs.
+MICRO_STEP_LENGTH = 0.10
+MESO_STEP_LENGTH = 1.0
+PROFILES = ('micro', 'meso')
+
+
+def meso_config_path(sumocfg):
+    """
+    Returns the mesoscopic profile config that lives next to a micro .sumocfg
+    (e.g. RML/RL.sumocfg -> RML/RL.meso.sumocfg).
+    """
+    root, ext = os.path.splitext(sumocfg)
+    return root + '.meso' + ext
+
+
+def demand_inputs(sumocfg):
+    """
+    The network and route files a config loads, as normalized paths:
+    {'net-file': [...], 'route-files': [...]}. Calibration compares the two
+    profiles of a scenario only if these are the same.
+    """
+    config_dir = os.path.dirname(sumocfg)
+    inputs = {'net-file': [], 'route-files': []}
+    for element in ET.parse(sumocfg).getroot().iter():
+        if element.tag in inputs:
+            inputs[element.tag] += [os.path.normpath(os.path.join(config_dir, name.strip()))
+                                    for name in element.get('value').split(',') if name.strip()]
+    return inputs
+
+
+def build_sumo_command(sumocfg, profile='micro', binary='sumo'):
+    """
+    Builds the SUMO command line for a scenario in the requested profile.
+    The micro profile keeps the options TraciQL has always used; the meso
+    profile takes its step length and junction/TLS model from RL.meso.sumocfg.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown simulation profile '{profile}', expected one of {PROFILES}")
+
+    if profile == 'meso':
+        cmd = [binary, '-c', meso_config_path(sumocfg)]
+    else:
+        cmd = [
+            binary,
+            '-c', sumocfg,
+            '--step-length', f'{MICRO_STEP_LENGTH:.2f}',
+            '--lateral-resolution', '0'
+        ]
+    if binary.endswith('sumo-gui'):
+        cmd += ['--delay', '0']
+    return cmd
+
+
+def steps_for_profile(micro_steps, profile):
+    """
+    Converts a duration given in micro steps (e.g. MIN_GREEN_STEPS) into the
+    number of steps that covers the same simulated time in `profile`.
+    """
+    if profile == 'meso':
+        return max(1, int(round(micro_steps * MICRO_STEP_LENGTH / MESO_STEP_LENGTH)))
+    return micro_steps
+
+
+# -------------------------
+# Scenario geometry
+# -------------------------
+def load_detector_geometry(additional_file):
+    """
+    Reads every laneAreaDetector from an additional file.
+    Returns {detector_id: (lane_id, pos, length)}.
+    """
+    detectors = {}
+    for det in ET.parse(additional_file).getroot().iter('laneAreaDetector'):
+        detectors[det.get('id')] = (det.get('lane'), float(det.get('pos', 0.0)), float(det.get('length', 0.0)))
+    return detectors
+
+
+def load_lane_geometry(net_file):
+    """
+    Reads the normal (non-internal) lanes of a network.
+    Returns ({lane_id: (edge_id, length)}, {edge_id: number_of_lanes}).
+    """
+    lanes = {}
+    lanes_per_edge = {}
+    for edge in ET.parse(net_file).getroot().iter('edge'):
+        if edge.get('function') == 'internal':
+            continue
+        edge_lanes = edge.findall('lane')
+        lanes_per_edge[edge.get('id')] = len(edge_lanes)
+        for lane in edge_lanes:
+            lanes[lane.get('id')] = (edge.get('id'), float(lane.get('length')))
+    return lanes, lanes_per_edge
+
+
+def detector_groups_by_edge(additional_file, net_file):
+    """
+    Groups the detectors of a scenario by the edge they sit on. Used for the
+    multi-junction maps (e.g. map5) that have no hand-written direction groups.
+    """
+    lanes, _ = load_lane_geometry(net_file)
+    groups = defaultdict(list)
+    for det_id, (lane_id, _, _) in sorted(load_detector_geometry(additional_file).items()):
+        groups[lanes[lane_id][0]].append(det_id)
+    return dict(groups)
+
+
+# -------------------------
+# Observation adapter
+# -------------------------
+class MesoObservationAdapter:
+    """
+    Maps mesoscopic edge aggregates onto the detector-based observation vector
+    the agent is trained on.
+
+    Meso has no positions inside an edge, so each detector group is estimated
+    as a weighted sum of edge vehicle counts. The weight of an edge is the
+    share of its lanes covered by the group's detectors, each lane scaled by
+    the fraction of its length the detector spans.
+    """
+
+    def __init__(self, additional_file, net_file, detector_groups, connection=None):
+        self.conn = connection or traci
+        self.group_names = list(detector_groups)
+        detectors = load_detector_geometry(additional_file)
+        lanes, lanes_per_edge = load_lane_geometry(net_file)
+
+        self.edge_weights = []
+        for name in self.group_names:
+            weights = defaultdict(float)
+            for det_id in detector_groups[name]:
+                lane_id, _, det_length = detectors[det_id]
+                edge_id, lane_length = lanes[lane_id]
+                coverage = min(det_length / lane_length, 1.0) if lane_length > 0 else 1.0
+                weights[edge_id] += coverage / lanes_per_edge[edge_id]
+            self.edge_weights.append(dict(weights))
+        self.edges = sorted({e for weights in self.edge_weights for e in weights})
+
+    def subscribe(self):
+        """
+        Subscribes to the vehicle count of every edge the observation needs, so
+        the values arrive with each simulationStep instead of one call per edge.
+        """
+        for edge_id in self.edges:
+            self.conn.edge.subscribe(edge_id, [tc.LAST_STEP_VEHICLE_NUMBER])
+
+    def observe(self):
+        """
+        Returns the estimated detector queue of every group, in group order.
+        """
+        results = self.conn.edge.getAllSubscriptionResults()
+        counts = {}
+        for edge_id in self.edges:
+            if edge_id in results:
+                counts[edge_id] = results[edge_id][tc.LAST_STEP_VEHICLE_NUMBER]
+            else:
+                counts[edge_id] = self.conn.edge.getLastStepVehicleNumber(edge_id)
+        return [sum(w * counts[e] for e, w in weights.items()) for weights in self.edge_weights]
+
+    def get_state(self, tls_id):
+        """
+        Same layout as TraciQL.get_state(): (current_phase, q_group_0, q_group_1, ...).
+        Queue estimates are rounded so meso states share the micro state space.
+        """
+        phase = self.conn.trafficlight.getPhase(tls_id)
+        return (phase,) + tuple(int(round(q)) for q in self.observe())
+
+
+# -------------------------
+# Calibration: meso vs micro
+# -------------------------
+def _record_micro(sumocfg, detector_groups, tls_id, duration, label):
+    traci.start(build_sumo_command(sumocfg, 'micro'), label=label)
+    conn = traci.getConnection(label)
+    names = list(detector_groups)
+    observations, phases = [], []
+    steps = 0
+    next_sample = 1.0
+    start = time.perf_counter()
+    while conn.simulation.getTime() < duration:
+        conn.simulationStep()
+        steps += 1
+        if conn.simulation.getTime() + 1e-6 >= next_sample:
+            observations.append([sum(conn.lanearea.getLastStepVehicleNumber(d) for d in detector_groups[n])
+                                 for n in names])
+            phases.append(conn.trafficlight.getPhase(tls_id) if tls_id else -1)
+            next_sample += 1.0
+    wall = time.perf_counter() - start
+    conn.close()
+    return np.array(observations, dtype=float), np.array(phases), steps, wall
+
+
+def _record_meso(sumocfg, additional_file, net_file, detector_groups, tls_id, duration, label):
+    traci.start(build_sumo_command(sumocfg, 'meso'), label=label)
+    conn = traci.getConnection(label)
+    adapter = MesoObservationAdapter(additional_file, net_file, detector_groups, connection=conn)
+    adapter.subscribe()
+    observations, phases = [], []
+    steps = 0
+    next_sample = 1.0
+    start = time.perf_counter()
+    while conn.simulation.getTime() < duration:
+        conn.simulationStep()
+        steps += 1
+        if conn.simulation.getTime() + 1e-6 >= next_sample:
+            observations.append(adapter.observe())
+            phases.append(conn.trafficlight.getPhase(tls_id) if tls_id else -1)
+            next_sample += 1.0
+    wall = time.perf_counter() - start
+    conn.close()
+    return np.array(observations, dtype=float), np.array(phases), steps, wall
+
+
+def calibrate(sumocfg, additional_file, net_file, detector_groups, tls_id=None,
+              duration=3600, report_file='meso_calibration.json'):
+    """
+    Runs the scenario once in each profile under its fixed-time program and
+    compares the observations sample by sample (one sample per simulated
+    second). Writes a JSON report with per-group error statistics and the
+    step throughput of both profiles.
+
+    Raises ValueError when the two configs load a different network or
+    different routes: their observations would not be comparable.
+    """
+    micro_inputs, meso_inputs = demand_inputs(sumocfg), demand_inputs(meso_config_path(sumocfg))
+    if micro_inputs != meso_inputs:
+        raise ValueError(f"{sumocfg} and {meso_config_path(sumocfg)} load different inputs "
+                         f"({micro_inputs} vs {meso_inputs}); give both profiles the same net and route files")
+    micro_obs, micro_phases, micro_steps, micro_wall = _record_micro(
+        sumocfg, detector_groups, tls_id, duration, 'calib-micro')
+    meso_obs, meso_phases, meso_steps, meso_wall = _record_meso(
+        sumocfg, additional_file, net_file, detector_groups, tls_id, duration, 'calib-meso')
+
+    n = min(len(micro_obs), len(meso_obs))
+    micro_obs, meso_obs = micro_obs[:n], meso_obs[:n]
+    error = meso_obs - micro_obs
+
+    groups = {}
+    for i, name in enumerate(detector_groups):
+        micro_col, meso_col = micro_obs[:, i], meso_obs[:, i]
+        if micro_col.std() > 0 and meso_col.std() > 0:
+            corr = float(np.corrcoef(micro_col, meso_col)[0, 1])
+        else:
+            corr = None
+        groups[name] = {
+            'micro_mean': float(micro_col.mean()),
+            'meso_mean': float(meso_col.mean()),
+            'bias': float(error[:, i].mean()),
+            'mae': float(np.abs(error[:, i]).mean()),
+            'rmse': float(np.sqrt((error[:, i] ** 2).mean())),
+            'correlation': corr,
+        }
+
+    report = {
+        'scenario': sumocfg,
+        'meso_config': meso_config_path(sumocfg),
+        'simulated_seconds': n,
+        'groups': groups,
+        'total_queue_mae': float(np.abs(error.sum(axis=1)).mean()) if n else None,
+        'phase_agreement': float((micro_phases[:n] == meso_phases[:n]).mean()) if tls_id and n else None,
+        'throughput': {
+            'micro_steps': micro_steps,
+            'micro_wall_seconds': micro_wall,
+            'micro_sim_seconds_per_wall_second': n / micro_wall if micro_wall > 0 else None,
+            'meso_steps': meso_steps,
+            'meso_wall_seconds': meso_wall,
+            'meso_sim_seconds_per_wall_second': n / meso_wall if meso_wall > 0 else None,
+            'speedup': micro_wall / meso_wall if meso_wall > 0 else None,
+        },
+    }
+
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    print(f"\nMeso calibration over {n} simulated seconds ({sumocfg}):")
+    for name, stats in groups.items():
+        print(f"   {name}: micro {stats['micro_mean']:.2f}, meso {stats['meso_mean']:.2f}, "
+              f"MAE {stats['mae']:.2f}, corr {stats['correlation']}")
+    print(f"Speedup (wall clock): {report['throughput']['speedup']}")
+    print(f"Calibration report has been saved to {report_file}")
+    return report
+
+
+if __name__ == '__main__':
+    if 'SUMO_HOME' in os.environ:
+        tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+        sys.path.append(tools)
+    else:
+        sys.exit("Please declare environment variable 'SUMO_HOME'")
+
+    parser = argparse.ArgumentParser(description="Compare mesoscopic and microscopic observations of a scenario.")
+    parser.add_argument('--sumocfg', default='Reinforcement Learning/RML/RL.sumocfg')
+    parser.add_argument('--tls', default=None, help="Traffic light whose phase is compared as well")
+    parser.add_argument('--duration', type=float, default=3600, help="Simulated seconds per profile")
+    parser.add_argument('--report', default='meso_calibration.json')
+    args = parser.parse_args()
+
+    scenario_dir = os.path.dirname(args.sumocfg)
+    add_file = os.path.join(scenario_dir, 'RL.add.xml')
+    net_file = os.path.join(scenario_dir, 'RL.net.xml')
+    try:
+        calibrate(args.sumocfg, add_file, net_file, detector_groups_by_edge(add_file, net_file),
+                  tls_id=args.tls, duration=args.duration, report_file=args.report)
+    except ValueError as e:
+        sys.exit(str(e))
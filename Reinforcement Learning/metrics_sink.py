@@ -0,0 +1,93 @@
+import os
+import glob
+import json
+import time
+import itertools
+import numpy as np
+
+CHUNK_ROWS = 100000 # Rows buffered in memory before a chunk is written
+
+_run_ids = itertools.count()
+
+
+class MetricsSink:
+    """
+    Append-only, columnar per-step metrics of a training run.
+
+    Rows are buffered per column and written every CHUNK_ROWS rows as
+    run_dir/metrics_00000.npz, metrics_00001.npz, ... so memory stays flat on
+    runs with millions of steps. Columns may be added mid-run; rows without a
+    value for a column hold NaN. meta.json lists the columns and row count.
+    """
+
+    def __init__(self, run_dir, chunk_rows=CHUNK_ROWS, meta=None):
+        self.run_dir = run_dir
+        self.chunk_rows = chunk_rows
+        self.meta = dict(meta or {})
+        self.meta.setdefault('created', time.time())
+        self.columns = {}
+        self.buffered = 0
+        self.rows = 0
+        self.chunks = 0
+        os.makedirs(run_dir, exist_ok=True)
+
+    def record(self, **values):
+        for name, value in values.items():
+            if name not in self.columns:
+                self.columns[name] = [np.nan] * self.buffered
+            self.columns[name].append(value)
+        self.buffered += 1
+        for column in self.columns.values():
+            if len(column) < self.buffered:
+                column.append(np.nan)
+        if self.buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.buffered:
+            return
+        arrays = {name: np.array(values, dtype=float) for name, values in self.columns.items()}
+        np.savez(os.path.join(self.run_dir, f'metrics_{self.chunks:05d}.npz'), **arrays)
+        self.rows += self.buffered
+        self.chunks += 1
+        self.columns = {name: [] for name in self.columns}
+        self.buffered = 0
+        self._write_meta()
+
+    def _write_meta(self):
+        self.meta.update({'columns': sorted(self.columns), 'rows': self.rows, 'chunks': self.chunks})
+        with open(os.path.join(self.run_dir, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+    def close(self):
+        self.flush()
+        self._write_meta()
+
+
+def new_run_dir(root='runs', prefix='run'):
+    """
+    runs/run_<date>_<time>_<pid>_<n>: the pid and a per-process counter keep
+    runs started within the same second apart.
+    """
+    return os.path.join(root, time.strftime(f'{prefix}_%Y%m%d_%H%M%S') + f'_{os.getpid()}_{next(_run_ids)}')
+
+
+def load_metrics(run_dir, columns=None):
+    """
+    Reads a run back as {column: np.array}. Only the requested columns are
+    loaded; a column missing from some chunks is NaN for their rows.
+    """
+    chunk_files = sorted(glob.glob(os.path.join(run_dir, 'metrics_*.npz')))
+    if not chunk_files:
+        raise FileNotFoundError(f"No metrics chunks in {run_dir}")
+    loaded, lengths = [], []
+    for chunk_file in chunk_files:
+        with np.load(chunk_file) as chunk:
+            names = chunk.files if columns is None else [c for c in columns if c in chunk.files]
+            loaded.append({name: chunk[name] for name in names})
+            lengths.append(len(chunk[chunk.files[0]]))
+    names = columns or sorted(set().union(*loaded))
+    return {
+        name: np.concatenate([part.get(name, np.full(n, np.nan)) for part, n in zip(loaded, lengths)])
+        for name in names
+    }
@@ -0,0 +1,415 @@
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import socket
+import uuid
+import struct
+import argparse
+import threading
+import socketserver
+from collections import defaultdict
+import numpy as np
+
+from discretizer import Discretizer, identity, load_for_q_table
+from qtable import ACTIONS, load_q_table, save_q_table
+
+# ---- Reinforcement Learning Hyperparameters (same as TraciQL) ----
+ALPHA = 0.1
+GAMMA = 0.9
+EPSILON = 0.1
+
+HOST = '127.0.0.1'
+PORT = 9998
+NUM_SHARDS = 16
+REPORT_INTERVAL = 10.0 # Seconds between throughput reports on the server
+SNAPSHOT_INTERVAL = 300.0 # Seconds between Q-table snapshots on the server
+PUSH_EVERY = 200 # Actor steps between pushes of accumulated deltas
+PULL_EVERY = 200 # Actor steps between refreshes of the visited rows
+SESSION_TTL = 3600.0 # Seconds the server remembers a session without pushes (an actor that died without 'bye')
+
+
+# -------------------------
+# Wire format: 4-byte length + zlib-compressed JSON
+# -------------------------
+def send_message(sock, message):
+    payload = zlib.compress(json.dumps(message, separators=(',', ':')).encode())
+    sock.sendall(struct.pack('!I', len(payload)) + payload)
+
+
+def _recv_exact(sock, n):
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        data += chunk
+    return data
+
+
+def recv_message(sock):
+    (length,) = struct.unpack('!I', _recv_exact(sock, 4))
+    return json.loads(zlib.decompress(_recv_exact(sock, length)))
+
+
+# -------------------------
+# Server
+# -------------------------
+class ShardedQTable:
+    """
+    Q-table split into shards by state hash, each with its own lock, so pushes
+    and pulls from different actors mostly touch different shards.
+    """
+
+    def __init__(self, num_shards=NUM_SHARDS):
+        self.shards = [{} for _ in range(num_shards)]
+        self.locks = [threading.Lock() for _ in range(num_shards)]
+
+    def _shard(self, state):
+        return hash(state) % len(self.shards)
+
+    def apply_deltas(self, deltas):
+        by_shard = defaultdict(list)
+        for state, action, delta in deltas:
+            state = tuple(state)
+            by_shard[self._shard(state)].append((state, action, delta))
+        for index, items in by_shard.items():
+            shard = self.shards[index]
+            with self.locks[index]:
+                for state, action, delta in items:
+                    if state not in shard:
+                        shard[state] = np.zeros(len(ACTIONS))
+                    shard[state][action] += delta
+        return len(deltas)
+
+    def get_rows(self, states):
+        rows = []
+        for state in states:
+            state = tuple(state)
+            index = self._shard(state)
+            with self.locks[index]:
+                q_values = self.shards[index].get(state)
+                rows.append(q_values.tolist() if q_values is not None else [0.0] * len(ACTIONS))
+        return rows
+
+    def all_rows(self):
+        states, rows = [], []
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                for state, q_values in shard.items():
+                    states.append(list(state))
+                    rows.append(q_values.tolist())
+        return states, rows
+
+    def load(self, Q_table):
+        for state, q_values in Q_table.items():
+            self.shards[self._shard(state)][state] = np.array(q_values, dtype=float)
+
+    def to_dict(self):
+        Q_table = {}
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                Q_table.update({state: q_values.copy() for state, q_values in shard.items()})
+        return Q_table
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+
+class ParameterServer(socketserver.ThreadingTCPServer):
+    """
+    Holds the sharded Q-table and serves any number of actors, one thread per
+    connection. Actors may join and leave at any time.
+
+    Every push carries the actor's session and a sequence number; a push
+    whose number was already applied for that session (an actor resending
+    after a lost reply) is acknowledged without being applied again. A
+    session is forgotten when its actor says 'bye', or after session_ttl
+    seconds without a push.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, num_shards=NUM_SHARDS, discretizer=None, session_ttl=SESSION_TTL):
+        super().__init__(address, ActorHandler)
+        self.table = ShardedQTable(num_shards)
+        self.discretizer = discretizer or identity() # The table's bins; sent to every actor on hello
+        self.actors = {}
+        self.actors_lock = threading.Lock()
+        self.updates = 0
+        self.updates_lock = threading.Lock()
+        self.push_seqs = {} # session -> last applied push sequence number
+        self.push_locks = {} # session -> lock held while a push is checked and applied
+        self.push_times = {} # session -> time of its last push
+        self.session_ttl = session_ttl
+        self.last_expiry = time.monotonic()
+
+    def apply_push(self, session, seq, deltas):
+        """
+        Applies a push once; returns the number of deltas applied (0 for a
+        duplicate).
+        """
+        if session is None or seq is None:
+            return self.table.apply_deltas(deltas)
+        now = time.monotonic()
+        with self.actors_lock:
+            lock = self.push_locks.setdefault(session, threading.Lock())
+            self.push_times[session] = now
+            if now - self.last_expiry >= self.session_ttl / 10:
+                self._expire_sessions(now)
+        with lock:
+            if seq <= self.push_seqs.get(session, 0):
+                return 0
+            applied = self.table.apply_deltas(deltas)
+            self.push_seqs[session] = seq
+        return applied
+
+    def _expire_sessions(self, now):
+        # Called with actors_lock held; a session with a push in flight was just seen
+        for session, last_push in list(self.push_times.items()):
+            if now - last_push > self.session_ttl:
+                self._forget(session)
+        self.last_expiry = now
+
+    def _forget(self, session):
+        self.push_seqs.pop(session, None)
+        self.push_locks.pop(session, None)
+        self.push_times.pop(session, None)
+
+    def end_session(self, session):
+        with self.actors_lock:
+            self._forget(session)
+
+    def count_updates(self, n):
+        with self.updates_lock:
+            self.updates += n
+
+    def stats(self):
+        with self.actors_lock:
+            actors = {actor_id: dict(info) for actor_id, info in self.actors.items()}
+        return {'states': len(self.table), 'updates': self.updates, 'actors': actors}
+
+
+class ActorHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        server = self.server
+        actor_id = f'{self.client_address[0]}:{self.client_address[1]}'
+        try:
+            while True:
+                message = recv_message(self.request)
+                op = message.get('op')
+                if op == 'hello':
+                    actor_id = message.get('actor', actor_id)
+                    with server.actors_lock:
+                        server.actors[actor_id] = {'joined': time.time(), 'updates': 0}
+                    print(f"[PS] Actor {actor_id} joined")
+                    send_message(self.request, {'ok': True, 'shards': len(server.table.shards),
+                                                 'bins': server.discretizer.to_dict()})
+                elif op == 'push':
+                    applied = server.apply_push(message.get('session'), message.get('seq'), message['deltas'])
+                    server.count_updates(applied)
+                    with server.actors_lock:
+                        if actor_id in server.actors:
+                            server.actors[actor_id]['updates'] += applied
+                    send_message(self.request, {'ok': True, 'applied': applied})
+                elif op == 'pull':
+                    send_message(self.request, {'rows': server.table.get_rows(message['states'])})
+                elif op == 'pull_all':
+                    states, rows = server.table.all_rows()
+                    send_message(self.request, {'states': states, 'rows': rows})
+                elif op == 'stats':
+                    send_message(self.request, server.stats())
+                elif op == 'bye':
+                    if message.get('session') is not None:
+                        server.end_session(message['session'])
+                    break
+                else:
+                    send_message(self.request, {'ok': False, 'error': f"Unknown op '{op}'"})
+        except (ConnectionError, OSError, struct.error, zlib.error, json.JSONDecodeError) as e:
+            print(f"[PS] Connection to actor {actor_id} lost: {e}")
+        finally:
+            with server.actors_lock:
+                if server.actors.pop(actor_id, None) is not None:
+                    print(f"[PS] Actor {actor_id} left")
+
+
+def serve(host, port, q_table_file, num_shards=NUM_SHARDS):
+    server = ParameterServer((host, port), num_shards, load_for_q_table(q_table_file))
+    server.table.load(load_q_table(q_table_file))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[PS] Parameter server listening on {host}:{port} with {num_shards} shards")
+
+    last_updates, last_report = 0, time.perf_counter()
+    last_snapshot = last_report
+    try:
+        while True:
+            time.sleep(REPORT_INTERVAL)
+            now = time.perf_counter()
+            updates = server.updates
+            print(f"[PS] {(updates - last_updates) / (now - last_report):.0f} updates/s, "
+                  f"{len(server.actors)} actors, {len(server.table)} states")
+            last_updates, last_report = updates, now
+            if now - last_snapshot >= SNAPSHOT_INTERVAL:
+                save_q_table(server.table.to_dict(), q_table_file)
+                last_snapshot = now
+    except KeyboardInterrupt:
+        print("\n[PS] Shutting down")
+    finally:
+        server.shutdown()
+        server.server_close()
+        save_q_table(server.table.to_dict(), q_table_file)
+        print(f"[PS] Q-table has been saved to {q_table_file}")
+
+
+# -------------------------
+# Actor side
+# -------------------------
+class ParameterServerClient:
+    """
+    Connection from an actor to the parameter server. Reconnects with backoff
+    when the server goes away; deltas that could not be pushed are kept and
+    sent after reconnecting. Pushes are numbered within a random session, so
+    resending one whose reply was lost does not apply it twice.
+    """
+
+    def __init__(self, host=HOST, port=PORT, actor_id=None, max_backoff=30.0):
+        self.address = (host, port)
+        self.actor_id = actor_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.max_backoff = max_backoff
+        self.sock = None
+        self.session = f'{self.actor_id}-{uuid.uuid4().hex}'
+        self.push_seq = 0
+        self.discretizer = None # The server's bins, known after connecting
+
+    def _connect(self):
+        backoff = 0.5
+        while True:
+            try:
+                self.sock = socket.create_connection(self.address, timeout=10)
+                send_message(self.sock, {'op': 'hello', 'actor': self.actor_id})
+                reply = recv_message(self.sock)
+                self.discretizer = Discretizer.from_dict(reply['bins']) if 'bins' in reply else identity()
+                return
+            except OSError as e:
+                print(f"[Actor {self.actor_id}] Parameter server unreachable ({e}); retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def request(self, message):
+        while True:
+            if self.sock is None:
+                self._connect()
+            try:
+                send_message(self.sock, message)
+                return recv_message(self.sock)
+            except (OSError, ConnectionError):
+                self.sock.close()
+                self.sock = None
+
+    def push(self, deltas):
+        self.push_seq += 1
+        return self.request({'op': 'push', 'session': self.session, 'seq': self.push_seq, 'deltas': deltas})
+
+    def pull(self, states):
+        return self.request({'op': 'pull', 'states': states})['rows']
+
+    def pull_all(self):
+        reply = self.request({'op': 'pull_all'})
+        return {tuple(state): np.array(row) for state, row in zip(reply['states'], reply['rows'])}
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                send_message(self.sock, {'op': 'bye', 'session': self.session})
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = None
+
+
+def run_actor(host, port, steps, profile='micro', seed=None, actor_id=None):
+    """
+    TraciQL's online loop against the parameter server: Q-values come from a
+    local cache of pulled rows, TD deltas are accumulated per (state, action)
+    and pushed in batches.
+
+    The cache starts as a copy of the whole table (one request). A state
+    missing from it has no row on the server either, as of the last pull, so
+    it starts at zeros locally and is fetched with the next batched refresh
+    of the visited rows instead of with a request of its own.
+    """
+    from traci_env import TraciEnv
+
+    client = ParameterServerClient(host, port, actor_id)
+    cache = client.pull_all() # Connects, which also fetches the table's bins
+    env = TraciEnv(label=client.actor_id, profile=profile, seed=seed, discretizer=client.discretizer)
+    pending = defaultdict(float)
+    visited = set()
+
+    def q_values(state):
+        if state not in cache:
+            cache[state] = np.zeros(len(ACTIONS))
+        return cache[state]
+
+    try:
+        state = env.reset()
+        for step in range(steps):
+            if random.random() < EPSILON:
+                action = random.choice(ACTIONS)
+            else:
+                action = int(np.argmax(q_values(state)))
+            new_state, reward = env.step(action)
+
+            old_q = q_values(state)[action]
+            delta = ALPHA * (reward + GAMMA * np.max(q_values(new_state)) - old_q)
+            cache[state][action] += delta
+            pending[(state, action)] += delta
+            visited.update((state, new_state))
+            state = new_state
+
+            if (step + 1) % PUSH_EVERY == 0 and pending:
+                client.push([[list(s), a, d] for (s, a), d in pending.items()])
+                pending.clear()
+            if (step + 1) % PULL_EVERY == 0 and visited:
+                states = list(visited)
+                for s, row in zip(states, client.pull([list(s) for s in states])):
+                    cache[s] = np.array(row)
+                visited.clear()
+        if pending:
+            client.push([[list(s), a, d] for (s, a), d in pending.items()])
+    finally:
+        env.close()
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parameter server for distributed Q-learning.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help="Run the parameter server")
+    serve_parser.add_argument('--host', default=HOST)
+    serve_parser.add_argument('--port', type=int, default=PORT)
+    serve_parser.add_argument('--shards', type=int, default=NUM_SHARDS)
+    serve_parser.add_argument('--q-table', default='q_table.txt')
+
+    actor_parser = sub.add_parser('actor', help="Run one SUMO actor against a parameter server")
+    actor_parser.add_argument('--host', default=HOST)
+    actor_parser.add_argument('--port', type=int, default=PORT)
+    actor_parser.add_argument('--steps', type=int, default=50000)
+    actor_parser.add_argument('--profile', choices=['micro', 'meso'], default='micro')
+    actor_parser.add_argument('--seed', type=int, default=None)
+    actor_parser.add_argument('--id', default=None)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.host, args.port, args.q_table, args.shards)
+    else:
+        if 'SUMO_HOME' in os.environ:
+            tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+            sys.path.append(tools)
+        else:
+            sys.exit("Please declare environment variable 'SUMO_HOME'")
+        run_actor(args.host, args.port, args.steps, args.profile, args.seed, args.id)
@@ -0,0 +1,267 @@
+import json
+import time
+import socket
+import asyncio
+import argparse
+import numpy as np
+
+from qtable import DenseQTable, load_q_table
+from discretizer import load_for_q_table
+
+HOST = '127.0.0.1'
+PORT = 9997
+BATCH_WINDOW = 0.002 # Seconds a batch stays open for more requests after its first one
+MAX_BATCH = 1024 # Requests answered by one vectorized lookup at most
+LATENCY_SAMPLES = 10000 # Most recent request latencies kept for the percentiles
+REPORT_INTERVAL = 10.0 # Seconds between stats reports (printed and written to the stats file)
+MAX_VALUE = np.iinfo(np.int64).max # Largest phase / queue count an observation may hold
+
+
+class ServingStats:
+    """
+    Per-request latency (queueing + lookup, measured on the server) and
+    throughput of the policy server.
+    """
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.latencies = np.zeros(samples)
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.unknown_states = 0
+        self.start = time.perf_counter()
+        self.last_report = (self.start, 0)
+
+    def record_batch(self, latencies, unknown):
+        for latency in latencies:
+            self.latencies[self.requests % len(self.latencies)] = latency
+            self.requests += 1
+        self.batches += 1
+        self.unknown_states += int(unknown)
+
+    def snapshot(self):
+        now = time.perf_counter()
+        last_time, last_requests = self.last_report
+        self.last_report = (now, self.requests)
+        recent = self.latencies[:min(self.requests, len(self.latencies))]
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99]) * 1000 if len(recent) else (0.0, 0.0, 0.0)
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'unknown_states': self.unknown_states,
+            'errors': self.errors,
+            'requests_per_s': (self.requests - last_requests) / max(now - last_time, 1e-9),
+            'requests_per_s_total': self.requests / max(now - self.start, 1e-9),
+            'latency_ms': {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)},
+        }
+
+
+class PolicyServer:
+    """
+    Serves greedy actions of a trained Q-table to many intersections.
+
+    Clients send one JSON line per decision, {"id": ..., "observation":
+    [phase, q_EB, q_SB, q_WB, q_NB]} with raw queue counts, and get back
+    {"id": ..., "action": 0|1, "known": bool}. Requests arriving within
+    BATCH_WINDOW of each other are discretized with the table's bins and
+    answered by one vectorized lookup. The table is never modified; unknown
+    states keep the phase, as in TraciQL. A {"stats": true} line returns the
+    current serving stats.
+    """
+
+    def __init__(self, q_table_file, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.table = DenseQTable.from_dict(load_q_table(q_table_file))
+        self.discretizer = load_for_q_table(q_table_file)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.stats = ServingStats()
+        self.pending = None # asyncio.Queue, created on the server's loop
+
+    def act(self, observations):
+        """
+        Vectorized greedy lookup: (n, 5) raw observations -> (actions, known).
+        """
+        observations = np.asarray(observations, dtype=np.int64).reshape(-1, self.table.state_dim)
+        states = np.column_stack([observations[:, 0], self.discretizer.transform(observations[:, 1:])])
+        rows = self.table.rows(states, insert=False)
+        return self.table.greedy(rows), rows >= 0
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.pending.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.pending.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            observations, futures, received = zip(*batch)
+            try:
+                actions, known = self.act(observations)
+            except Exception as e:
+                # Only this batch's requests fail; the batcher keeps serving
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            now = time.perf_counter()
+            for future, action, is_known in zip(futures, actions.tolist(), known.tolist()):
+                if not future.done():
+                    future.set_result((action, is_known))
+            self.stats.record_batch([now - t for t in received], (~known).sum())
+
+    async def decide(self, observation):
+        # Validate here so a malformed request can't fail the batch it would join
+        observation = [int(x) for x in observation]
+        if len(observation) != self.table.state_dim:
+            raise ValueError(f"expected {self.table.state_dim} values, got {len(observation)}")
+        if any(x < 0 or x > MAX_VALUE for x in observation):
+            raise ValueError(f"observation values must be between 0 and {MAX_VALUE}")
+        future = asyncio.get_running_loop().create_future()
+        await self.pending.put((observation, future, time.perf_counter()))
+        return await future
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request must be a JSON object")
+                    if request.get('stats'):
+                        response = self.stats.snapshot()
+                    else:
+                        action, known = await self.decide(request['observation'])
+                        response = {'id': request.get('id'), 'action': action, 'known': known}
+                except (ValueError, KeyError, TypeError) as e:
+                    self.stats.errors += 1
+                    response = {'error': f"Invalid request: {e}"}
+                except Exception as e:
+                    self.stats.errors += 1
+                    response = {'error': f"Lookup failed: {e}"}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _report(self, stats_file):
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            stats = self.stats.snapshot()
+            print(f"Requests: {stats['requests']}, {stats['requests_per_s']:.0f}/s, "
+                  f"mean batch {stats['mean_batch_size']:.1f}, "
+                  f"latency p50/p99: {stats['latency_ms']['p50']:.2f}/{stats['latency_ms']['p99']:.2f} ms")
+            if stats_file:
+                with open(stats_file, 'w') as f:
+                    json.dump(stats, f, indent=2)
+
+    async def serve(self, host=HOST, port=PORT, stats_file='policy_server_stats.json'):
+        self.pending = asyncio.Queue()
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f"\nPolicy server listening on {host}:{port} "
+              f"({self.table.size} states, {self.discretizer.kind} bins, batch window {self.batch_window * 1000:.1f} ms)")
+        tasks = [asyncio.create_task(self._batcher()), asyncio.create_task(self._report(stats_file))]
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class PolicyClient:
+    """
+    Blocking client for one intersection controller.
+    """
+
+    def __init__(self, host=HOST, port=PORT, intersection_id=None):
+        self.intersection_id = intersection_id
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile('rwb')
+
+    def request(self, message):
+        self.file.write(json.dumps(message).encode() + b'\n')
+        self.file.flush()
+        return json.loads(self.file.readline())
+
+    def act(self, observation):
+        response = self.request({'id': self.intersection_id, 'observation': [int(x) for x in observation]})
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['action']
+
+    def stats(self):
+        return self.request({'stats': True})
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+async def benchmark(host, port, intersections, decisions, seed=None):
+    """
+    Simulates many intersections asking for a decision at once, each over its
+    own connection, and prints the client-side latency.
+    """
+    rng = np.random.default_rng(seed)
+    latencies = []
+
+    async def intersection(index):
+        reader, writer = await asyncio.open_connection(host, port)
+        for _ in range(decisions):
+            observation = [int(rng.integers(0, 4))] + rng.integers(0, 30, 4).tolist()
+            start = time.perf_counter()
+            writer.write(json.dumps({'id': index, 'observation': observation}).encode() + b'\n')
+            await writer.drain()
+            await reader.readline()
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(intersection(i) for i in range(intersections)))
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{len(latencies)} decisions for {intersections} intersections in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f}/s), client latency p50/p99: {p50:.2f}/{p99:.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batched greedy-policy inference for many intersections.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help="Serve a trained Q-table")
+    serve_parser.add_argument('--host', default=HOST)
+    serve_parser.add_argument('--port', type=int, default=PORT)
+    serve_parser.add_argument('--q-table', default='q_table.txt')
+    serve_parser.add_argument('--batch-window-ms', type=float, default=BATCH_WINDOW * 1000)
+    serve_parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    serve_parser.add_argument('--stats-file', default='policy_server_stats.json')
+
+    bench_parser = sub.add_parser('bench', help="Load-test a running policy server")
+    bench_parser.add_argument('--host', default=HOST)
+    bench_parser.add_argument('--port', type=int, default=PORT)
+    bench_parser.add_argument('--intersections', type=int, default=200)
+    bench_parser.add_argument('--decisions', type=int, default=100, help="Decisions per intersection")
+    bench_parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'serve':
+            server = PolicyServer(args.q_table, args.batch_window_ms / 1000, args.max_batch)
+            asyncio.run(server.serve(args.host, args.port, args.stats_file))
+        else:
+            asyncio.run(benchmark(args.host, args.port, args.intersections, args.decisions, args.seed))
+    except KeyboardInterrupt:
+        print("\nPolicy server stopped.")
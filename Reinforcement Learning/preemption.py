@@ -0,0 +1,161 @@
+import time
+import traci
+import traci.constants as tc
+import numpy as np
+
+DETECTION_RADIUS = 200.0 # Metres around the junction in which emergency vehicles are detected
+HOLD_SECONDS = 5.0 # Green is extended by this much at every step an emergency vehicle still approaches
+EMERGENCY_VCLASS = 'emergency'
+
+CONTEXT_VARS = [tc.VAR_LANE_ID, tc.VAR_LANEPOSITION, tc.VAR_VEHICLECLASS]
+
+
+def _has_green(state):
+    return 'G' in state or 'g' in state
+
+
+class PreemptionController:
+    """
+    Emergency-vehicle preemption for one traffic light.
+
+    Vehicles are detected with a context subscription around the junction,
+    filtered to vClass 'emergency', so detection costs nothing per step until
+    an emergency vehicle is within DETECTION_RADIUS and happens in the step it
+    arrives. For every incoming lane the phase that gives it green is computed
+    once from the signal program. While an emergency vehicle approaches, the
+    controller drives the light to that phase - through the program's own
+    yellow/all-red clearance when another approach has green - and holds it
+    until the vehicle has passed.
+
+    Reaction latency (first detection to green for the vehicle's approach, in
+    simulated seconds) and the wall-clock cost of each control() call are
+    recorded; see stats().
+    """
+
+    def __init__(self, tls_id, junction_id=None, radius=DETECTION_RADIUS, hold=HOLD_SECONDS, connection=None):
+        self.conn = connection or traci
+        self.tls_id = tls_id
+        self.junction_id = junction_id or tls_id
+        self.radius = radius
+        self.hold = hold
+        self.green_phase = {} # incoming lane -> phase giving it green
+        self.lane_length = {}
+        self.phase_has_green = []
+        self.active = False
+        self.first_seen = {} # emergency vehicle -> simulation time it was first detected
+        self.served = set()
+        self.latencies = []
+        self.control_seconds = 0.0
+        self.control_calls = 0
+        self.preempted_steps = 0
+
+    # -------------------------
+    # Setup
+    # -------------------------
+    def subscribe(self):
+        self.conn.junction.subscribeContext(self.junction_id, tc.CMD_GET_VEHICLE_VARIABLE, self.radius, CONTEXT_VARS)
+        try:
+            # Only emergency vehicles are reported; without filter support the
+            # vClass is checked on the (few) vehicles in range instead
+            self.conn.junction.addSubscriptionFilterVClass([EMERGENCY_VCLASS])
+        except (AttributeError, traci.TraCIException):
+            pass
+        self._plan_phases()
+
+    def _plan_phases(self):
+        """
+        For every incoming lane, the phase with the most green links from that
+        lane (priority green 'G' preferred over 'g').
+        """
+        program = self.conn.trafficlight.getAllProgramLogics(self.tls_id)[0]
+        states = [phase.state for phase in program.phases]
+        self.phase_has_green = [_has_green(state) for state in states]
+        links = self.conn.trafficlight.getControlledLinks(self.tls_id)
+        lane_links = {}
+        for index, link_group in enumerate(links):
+            for in_lane, _, _ in link_group:
+                lane_links.setdefault(in_lane, []).append(index)
+        for lane, indices in lane_links.items():
+            scores = [sum(2 if state[i] == 'G' else 1 if state[i] == 'g' else 0 for i in indices) for state in states]
+            if max(scores) > 0:
+                self.green_phase[lane] = int(np.argmax(scores))
+                self.lane_length[lane] = self.conn.lane.getLength(lane)
+
+    # -------------------------
+    # Per step
+    # -------------------------
+    def _approaching(self):
+        """
+        Emergency vehicles within range on an incoming lane, as
+        (distance to stop line, vehicle, lane), nearest first.
+        """
+        results = self.conn.junction.getContextSubscriptionResults(self.junction_id) or {}
+        approaching = []
+        for veh_id, values in results.items():
+            if values.get(tc.VAR_VEHICLECLASS, EMERGENCY_VCLASS) != EMERGENCY_VCLASS:
+                continue
+            lane = values[tc.VAR_LANE_ID]
+            if lane not in self.green_phase:
+                continue # Already in or past the junction
+            distance = self.lane_length[lane] - values[tc.VAR_LANEPOSITION]
+            approaching.append((distance, veh_id, lane))
+        return sorted(approaching)
+
+    def control(self, now=None):
+        """
+        Call once per step before the agent's action is applied. Returns True
+        while preemption overrides the light, in which case the agent's action
+        must not be applied (and the transition not learned from).
+        """
+        start = time.perf_counter()
+        try:
+            approaching = self._approaching()
+            if not approaching:
+                if self.active:
+                    self.active = False
+                    self.first_seen.clear()
+                    self.served.clear()
+                return False
+
+            now = self.conn.simulation.getTime() if now is None else now
+            self.active = True
+            self.preempted_steps += 1
+            in_range = {veh_id for _, veh_id, _ in approaching}
+            for veh_id in in_range:
+                self.first_seen.setdefault(veh_id, now)
+            self.first_seen = {v: t for v, t in self.first_seen.items() if v in in_range}
+
+            _, veh_id, lane = approaching[0]
+            target = self.green_phase[lane]
+            phase = self.conn.trafficlight.getPhase(self.tls_id)
+            if phase == target:
+                self.conn.trafficlight.setPhaseDuration(self.tls_id, self.hold)
+                if veh_id not in self.served:
+                    self.served.add(veh_id)
+                    self.latencies.append(now - self.first_seen[veh_id])
+            elif self.phase_has_green[phase]:
+                # Another approach has green: start the program's clearance, or
+                # go straight to the target when no clearance phase follows
+                next_phase = (phase + 1) % len(self.phase_has_green)
+                self.conn.trafficlight.setPhase(self.tls_id, target if self.phase_has_green[next_phase] else next_phase)
+            else:
+                # In clearance: jump to the target instead of the program's next
+                # green once the last clearance phase ends during this step
+                next_phase = (phase + 1) % len(self.phase_has_green)
+                step_length = self.conn.simulation.getDeltaT()
+                if self.phase_has_green[next_phase] and self.conn.trafficlight.getNextSwitch(self.tls_id) - now <= step_length:
+                    self.conn.trafficlight.setPhase(self.tls_id, target)
+            return True
+        finally:
+            self.control_seconds += time.perf_counter() - start
+            self.control_calls += 1
+
+    def stats(self):
+        latencies = np.array(self.latencies)
+        return {
+            'preemptions': len(latencies),
+            'preempted_steps': self.preempted_steps,
+            'latency_mean_s': float(latencies.mean()) if len(latencies) else None,
+            'latency_max_s': float(latencies.max()) if len(latencies) else None,
+            'control_us_per_step': 1e6 * self.control_seconds / max(self.control_calls, 1),
+        }
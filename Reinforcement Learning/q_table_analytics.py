@@ -0,0 +1,156 @@
+import os
+import json
+import argparse
+import numpy as np
+
+from qtable import load_q_table, load_visit_counts, visits_file_for
+from discretizer import load_for_q_table
+
+STATE_NAMES = ['phase', 'q_EB', 'q_SB', 'q_WB', 'q_NB']
+
+
+def load_arrays(q_table_file, visits_file=None):
+    """
+    Loads a saved Q-table and its visit counts as aligned arrays:
+    states (n, state_dim) int, values (n, n_actions), visits (n,).
+    States that were only ever bootstrapped (never acted in) have 0 visits.
+    """
+    Q_table = load_q_table(q_table_file)
+    visit_counts = load_visit_counts(visits_file or visits_file_for(q_table_file))
+    states = list(Q_table.keys())
+    if not states:
+        raise ValueError(f"{q_table_file} holds no states")
+    return (np.array(states, dtype=np.int64),
+            np.array([Q_table[s] for s in states], dtype=float),
+            np.array([visit_counts.get(s, 0) for s in states], dtype=np.int64))
+
+
+def visit_histogram(visits):
+    """
+    Number of states per visit-count bucket [0], [1], [2-3], [4-7], ...
+    """
+    buckets = np.where(visits > 0, np.floor(np.log2(np.maximum(visits, 1))).astype(int) + 1, 0)
+    counts = np.bincount(buckets)
+    labels = ['0'] + [f'{1 << (b - 1)}-{(1 << b) - 1}' if b > 1 else '1' for b in range(1, len(counts))]
+    return dict(zip(labels, counts.tolist()))
+
+
+def marginals(states, visits):
+    """
+    Per state dimension: distinct states and visits for every value it takes.
+    """
+    result = {}
+    for d in range(states.shape[1]):
+        name = STATE_NAMES[d] if d < len(STATE_NAMES) else f'dim_{d}'
+        result[name] = {
+            'states': np.bincount(states[:, d]),
+            'visits': np.bincount(states[:, d], weights=visits).astype(np.int64),
+        }
+    return result
+
+
+def coverage(states, visits, n_bins=None):
+    """
+    Coverage of the state grid (phase x queue bin per direction): the
+    fraction of grid cells ever visited, and for every pair of queue
+    dimensions a 2D map of visits so unvisited regions stand out. States
+    are already bin indices (raw counts for identity tables); n_bins, the
+    discretizer's bins per queue dimension, extends the grid to bins no
+    state reached.
+    """
+    shape = [int(x) + 1 for x in states.max(axis=0)]
+    for d, bins in enumerate(n_bins or []):
+        shape[d + 1] = max(shape[d + 1], bins)
+    shape = tuple(shape)
+    visited = states[visits > 0]
+    cells = np.unique(np.ravel_multi_index(visited.T, shape)) if len(visited) else np.zeros(0)
+    pair_maps = {}
+    for i in range(1, states.shape[1]):
+        for j in range(i + 1, states.shape[1]):
+            grid = np.zeros((shape[i], shape[j]), dtype=np.int64)
+            np.add.at(grid, (states[:, i], states[:, j]), visits)
+            pair_maps[f'{STATE_NAMES[i]}__{STATE_NAMES[j]}'] = grid
+    return {
+        'grid_shape': shape,
+        'grid_cells': int(np.prod(shape)),
+        'visited_cells': int(len(cells)),
+        'visited_fraction': float(len(cells) / np.prod(shape)),
+        'pair_maps': pair_maps,
+    }
+
+
+def greedy_policy_map(states, values, visits):
+    """
+    Share of visits whose greedy action is 'switch', per phase and sum of
+    the queue bins. Cells with no visits are NaN.
+    """
+    greedy = np.argmax(values, axis=1)
+    total_bin = states[:, 1:].sum(axis=1)
+    shape = (int(states[:, 0].max()) + 1, int(total_bin.max()) + 1)
+    weight = np.maximum(visits, 1) # Unvisited states still count once
+    switch = np.zeros(shape)
+    total = np.zeros(shape)
+    np.add.at(switch, (states[:, 0], total_bin), weight * (greedy == 1))
+    np.add.at(total, (states[:, 0], total_bin), weight)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, switch / total, np.nan)
+
+
+def analyze(q_table_file, visits_file=None, out_dir='q_table_analytics'):
+    """
+    Writes summary.json (compact headline numbers) and analytics.npz (the
+    histograms, marginals, coverage maps and greedy-policy map) to out_dir.
+    The grid is the one of the bins saved next to the Q-table.
+    """
+    states, values, visits = load_arrays(q_table_file, visits_file)
+    discretizer = load_for_q_table(q_table_file)
+    os.makedirs(out_dir, exist_ok=True)
+
+    margs = marginals(states, visits)
+    cov = coverage(states, visits, discretizer.n_bins())
+    policy = greedy_policy_map(states, values, visits)
+
+    arrays = {'policy_switch_share': policy}
+    for name, m in margs.items():
+        arrays[f'marginal_states__{name}'] = m['states']
+        arrays[f'marginal_visits__{name}'] = m['visits']
+    for name, grid in cov['pair_maps'].items():
+        arrays[f'coverage__{name}'] = grid
+    np.savez_compressed(os.path.join(out_dir, 'analytics.npz'), **arrays)
+
+    summary = {
+        'q_table': q_table_file,
+        'bins': discretizer.kind,
+        'states': int(len(states)),
+        'visited_states': int((visits > 0).sum()),
+        'never_visited_states': int((visits == 0).sum()),
+        'visited_once_states': int((visits == 1).sum()),
+        'total_visits': int(visits.sum()),
+        'q_table_file_bytes': os.path.getsize(q_table_file),
+        'dense_array_bytes': int(values.nbytes + states.nbytes),
+        'visit_histogram': visit_histogram(visits),
+        'max_per_dimension': {name: int(len(m['states']) - 1) for name, m in margs.items()},
+        'coverage': {k: v for k, v in cov.items() if k != 'pair_maps'},
+        'greedy_switch_share': float(np.argmax(values, axis=1).mean()),
+        'top_states': [
+            {'state': states[i].tolist(), 'visits': int(visits[i]), 'q_values': values[i].tolist()}
+            for i in np.argsort(visits)[::-1][:10]
+        ],
+    }
+    with open(os.path.join(out_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\nQ-table: {summary['states']} states, {summary['visited_states']} visited, "
+          f"{summary['visited_once_states']} visited only once")
+    print(f"State grid coverage ({discretizer.kind} bins): {cov['visited_cells']}/{cov['grid_cells']} cells ({cov['visited_fraction']:.2%})")
+    print(f"Analytics have been saved to {out_dir}/summary.json and {out_dir}/analytics.npz")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Coverage and state-space analytics of a saved Q-table.")
+    parser.add_argument('--q-table', default='q_table.txt')
+    parser.add_argument('--visits', default=None, help="Visit counts file (default: next to the Q-table)")
+    parser.add_argument('--out', default='q_table_analytics')
+    args = parser.parse_args()
+    analyze(args.q_table, args.visits, args.out)
@@ -0,0 +1,180 @@
+import os
+import ast # To safely convert string keys back to tuples
+import json
+import numpy as np
+
+ACTIONS = [0, 1] # 0 = keep phase, 1 = switch phase
+
+# Each state component is packed into this many bits of an int64 key, so a
+# (phase, q_EB, q_SB, q_WB, q_NB) state fits in one integer (5 * 12 = 60 bits).
+STATE_BITS = 12
+
+
+def load_q_table(path):
+    """
+    Loads a Q-table saved by save_q_table().
+    Returns an empty table if the file is missing or unreadable.
+    """
+    if not os.path.exists(path):
+        print(f"\n{path} not found. Starting with an empty Q-table.")
+        return {}
+    try:
+        with open(path, 'r') as f:
+            Q_table_serializable = json.load(f)
+            # Convert string keys back to tuples and lists back to numpy arrays
+            Q_table = {ast.literal_eval(k): np.array(v) for k, v in Q_table_serializable.items()}
+        print(f"\nLoaded existing Q-table from {path}. Size: {len(Q_table)}")
+        return Q_table
+    except (IOError, json.JSONDecodeError) as e:
+        print(f"\nError loading Q-table file: {e}. Starting with an empty Q-table.")
+        return {}
+
+
+def save_q_table(Q_table, path):
+    """
+    Saves a Q-table as JSON. The keys of the dictionary must be strings for
+    JSON serialization, and the numpy arrays are converted to lists.
+    """
+    Q_table_serializable = {str(k): np.asarray(v).tolist() for k, v in Q_table.items()}
+    with open(path, 'w') as f:
+        json.dump(Q_table_serializable, f, indent=4)
+
+
+def visits_file_for(q_table_file):
+    """
+    Visit counts are stored next to the Q-table: q_table.txt -> q_table.visits.txt.
+    """
+    root, ext = os.path.splitext(q_table_file)
+    return root + '.visits' + ext
+
+
+def load_visit_counts(path):
+    """
+    Loads {state_tuple: visits} saved by save_visit_counts(); empty if missing.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return {ast.literal_eval(k): int(v) for k, v in json.load(f).items()}
+    except (IOError, json.JSONDecodeError) as e:
+        print(f"\nError loading visit counts file: {e}. Starting with empty visit counts.")
+        return {}
+
+
+def save_visit_counts(visit_counts, path):
+    with open(path, 'w') as f:
+        json.dump({str(k): int(v) for k, v in visit_counts.items()}, f)
+
+
+def encode_states(states, bits=STATE_BITS):
+    """
+    Packs an (n, state_dim) array of non-negative integer states into int64 keys.
+    Components are clipped to the range a component can hold.
+    """
+    states = np.asarray(states, dtype=np.int64)
+    if states.ndim == 1:
+        states = states[None, :]
+    if states.shape[1] * bits > 63:
+        raise ValueError(f"A {states.shape[1]}-component state does not fit in 63 bits at {bits} bits per component")
+    clipped = np.clip(states, 0, (1 << bits) - 1)
+    shifts = np.arange(states.shape[1] - 1, -1, -1, dtype=np.int64) * bits
+    return np.bitwise_or.reduce(clipped << shifts, axis=1)
+
+
+class DenseQTable:
+    """
+    Q-table stored as one contiguous (capacity, n_actions) array, with a sorted
+    key index so whole batches of states are looked up and updated with a few
+    vectorized NumPy calls instead of one dictionary access per state.
+    """
+
+    def __init__(self, state_dim=5, n_actions=len(ACTIONS), capacity=1024):
+        self.state_dim = state_dim
+        self.n_actions = n_actions
+        self.size = 0
+        self.values = np.zeros((capacity, n_actions))
+        self.states = np.zeros((capacity, state_dim), dtype=np.int64)
+        # Sorted packed keys and the row each key lives in
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._key_rows = np.zeros(0, dtype=np.int64)
+
+    def _grow(self, needed):
+        capacity = len(self.values)
+        while capacity < needed:
+            capacity *= 2
+        if capacity != len(self.values):
+            self.values = np.resize(self.values, (capacity, self.n_actions))
+            self.values[self.size:] = 0.0
+            self.states = np.resize(self.states, (capacity, self.state_dim))
+
+    def _find(self, keys):
+        if len(self._keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64), np.zeros(len(keys), dtype=bool)
+        pos = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        found = self._keys[pos] == keys
+        return np.where(found, self._key_rows[pos], -1), found
+
+    def rows(self, states, insert=True):
+        """
+        Returns the row of every state in `states` (an (n, state_dim) array).
+        Unknown states get fresh zero rows, or -1 when insert is False.
+        """
+        states = np.asarray(states, dtype=np.int64).reshape(-1, self.state_dim)
+        keys = encode_states(states)
+        rows, found = self._find(keys)
+        if insert and not found.all():
+            new_keys, first = np.unique(keys[~found], return_index=True)
+            new_rows = np.arange(self.size, self.size + len(new_keys))
+            self._grow(self.size + len(new_keys))
+            self.states[new_rows] = states[~found][first]
+            self.values[new_rows] = 0.0
+            self.size += len(new_keys)
+
+            all_keys = np.concatenate([self._keys, new_keys])
+            all_rows = np.concatenate([self._key_rows, new_rows])
+            order = np.argsort(all_keys, kind='stable')
+            self._keys, self._key_rows = all_keys[order], all_rows[order]
+            rows, _ = self._find(keys)
+        return rows
+
+    def greedy(self, rows):
+        """
+        Greedy action for each row; unknown states (row -1) keep the phase.
+        """
+        rows = np.asarray(rows)
+        actions = np.argmax(self.values[np.maximum(rows, 0)], axis=1)
+        return np.where(rows >= 0, actions, 0)
+
+    def batch_update(self, rows, actions, rewards, next_rows, alpha, gamma):
+        """
+        Applies the Q-learning update of TraciQL.update_Q_table to a batch of
+        transitions at once. A (state, action) pair seen k times in the batch
+        is updated once, with its mean TD error and the step
+        1 - (1 - alpha)^k that k sequential updates toward the same target
+        would take, so duplicates never overshoot the target.
+        Returns the TD errors.
+        """
+        rows, actions = np.asarray(rows), np.asarray(actions)
+        best_future_q = self.values[next_rows].max(axis=1)
+        td = rewards + gamma * best_future_q - self.values[rows, actions]
+        pairs, inverse, counts = np.unique(rows * self.n_actions + actions, return_inverse=True, return_counts=True)
+        mean_td = np.bincount(inverse.reshape(-1), weights=td, minlength=len(pairs)) / counts
+        step = 1.0 - (1.0 - alpha) ** counts
+        self.values[pairs // self.n_actions, pairs % self.n_actions] += step * mean_td
+        return td
+
+    def to_dict(self):
+        """
+        Converts to the {state_tuple: np.array} layout used by TraciQL.
+        """
+        return {tuple(int(x) for x in self.states[i]): self.values[i].copy() for i in range(self.size)}
+
+    @classmethod
+    def from_dict(cls, Q_table, state_dim=5, n_actions=len(ACTIONS)):
+        table = cls(state_dim=state_dim, n_actions=n_actions, capacity=max(1024, len(Q_table)))
+        if Q_table:
+            states = np.array(list(Q_table.keys()), dtype=np.int64)
+            rows = table.rows(states)
+            table.values[rows] = np.array([Q_table[k] for k in Q_table])
+        return table
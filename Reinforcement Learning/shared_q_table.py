@@ -0,0 +1,236 @@
+import os
+import sys
+import time
+import random
+import argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+from qtable import ACTIONS, load_q_table, save_q_table
+from discretizer import load_for_q_table
+
+# ---- Reinforcement Learning Hyperparameters (same as TraciQL) ----
+ALPHA = 0.1
+GAMMA = 0.9
+EPSILON = 0.1
+
+SNAPSHOT_INTERVAL = 60.0 # Seconds between consistent snapshots to disk (0 = only at the end)
+MAX_LOAD_FACTOR = 0.9 # Refuse new states beyond this share of the capacity
+
+
+class SharedQTable:
+    """
+    Q-table living in one multiprocessing.shared_memory block, shared by many
+    training processes.
+
+    The block holds an open-addressing hash index (a `used` flag and the state
+    tuple per slot) next to the (capacity, n_actions) Q-value array. Reads and
+    Q-value updates never take a lock (Hogwild!: a rare lost update between two
+    workers is accepted). Only claiming a slot for a state nobody has seen yet
+    goes through `insert_lock`, which also lets snapshot() copy a table whose
+    index and values agree.
+    """
+
+    def __init__(self, shm, capacity, state_dim, n_actions, insert_lock, owner=False):
+        self.shm = shm
+        self.capacity = capacity
+        self.state_dim = state_dim
+        self.n_actions = n_actions
+        self.insert_lock = insert_lock
+        self.owner = owner
+
+        offset = 0
+        self.size = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 8
+        self.used = np.ndarray((capacity,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 8 * capacity
+        self.states = np.ndarray((capacity, state_dim), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 8 * capacity * state_dim
+        self.values = np.ndarray((capacity, n_actions), dtype=np.float64, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def _nbytes(capacity, state_dim, n_actions):
+        return 8 * (1 + capacity + capacity * state_dim + capacity * n_actions)
+
+    @classmethod
+    def create(cls, capacity=1 << 18, state_dim=5, n_actions=len(ACTIONS)):
+        """
+        Allocates a new zeroed table. The creating process owns (and unlinks) the block.
+        """
+        shm = shared_memory.SharedMemory(create=True, size=cls._nbytes(capacity, state_dim, n_actions))
+        shm.buf[:] = b'\x00' * shm.size
+        return cls(shm, capacity, state_dim, n_actions, mp.Lock(), owner=True)
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        Opens a table in a worker process from the spec returned by describe().
+        """
+        name, capacity, state_dim, n_actions, insert_lock = spec
+        return cls(shared_memory.SharedMemory(name=name), capacity, state_dim, n_actions, insert_lock)
+
+    def describe(self):
+        """
+        Everything a worker process needs to attach to this table.
+        """
+        return (self.shm.name, self.capacity, self.state_dim, self.n_actions, self.insert_lock)
+
+    # -------------------------
+    # State index
+    # -------------------------
+    def _probe(self, state):
+        """
+        Returns (slot, found): the slot holding `state`, or the first free slot
+        of its probe sequence.
+        """
+        slot = hash(state) % self.capacity
+        while self.used[slot]:
+            if tuple(self.states[slot]) == state:
+                return slot, True
+            slot = (slot + 1) % self.capacity
+        return slot, False
+
+    def slot(self, state):
+        """
+        Slot of `state`, inserting it with zero Q-values if it is new.
+        """
+        state = tuple(int(x) for x in state)
+        slot, found = self._probe(state)
+        if found:
+            return slot
+        with self.insert_lock:
+            # Another worker may have inserted it while we waited for the lock
+            slot, found = self._probe(state)
+            if not found:
+                if self.size[0] >= MAX_LOAD_FACTOR * self.capacity:
+                    raise RuntimeError(f"Shared Q-table is full ({self.size[0]} states); increase its capacity")
+                self.states[slot] = state
+                self.values[slot] = 0.0
+                self.used[slot] = 1 # Publish the slot only once it is filled in
+                self.size[0] += 1
+        return slot
+
+    # -------------------------
+    # Q-learning (lock-free)
+    # -------------------------
+    def get_action(self, state, epsilon=EPSILON):
+        """
+        Epsilon-greedy action, as TraciQL.get_action_from_policy().
+        """
+        if random.random() < epsilon:
+            return random.choice(ACTIONS)
+        return int(np.argmax(self.values[self.slot(state)]))
+
+    def update(self, state, action, reward, new_state, alpha=ALPHA, gamma=GAMMA):
+        """
+        Q-learning update of TraciQL.update_Q_table, applied in place without locking.
+        """
+        old_slot = self.slot(state)
+        best_future_q = np.max(self.values[self.slot(new_state)])
+        old_q = self.values[old_slot, action]
+        self.values[old_slot, action] = old_q + alpha * (reward + gamma * best_future_q - old_q)
+
+    # -------------------------
+    # Persistence
+    # -------------------------
+    def load(self, Q_table):
+        for state, q_values in Q_table.items():
+            self.values[self.slot(state)] = q_values
+
+    def snapshot(self, path):
+        """
+        Writes a consistent copy of the table in the q_table.txt format. Holding
+        the insert lock means no state is half-inserted while the index is copied.
+        The file is replaced atomically so readers never see a partial table.
+        """
+        with self.insert_lock:
+            used = self.used.astype(bool)
+            states = self.states[used].copy()
+            values = self.values[used].copy()
+        Q_table = {tuple(int(x) for x in s): v for s, v in zip(states, values)}
+        tmp_path = path + '.tmp'
+        save_q_table(Q_table, tmp_path)
+        os.replace(tmp_path, path)
+        return len(Q_table)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# -------------------------
+# Multi-process training
+# -------------------------
+def run_worker(index, spec, steps, seed, profile, step_counts, discretizer=None):
+    """
+    One training process: its own SUMO instance, the shared Q-table.
+    """
+    from traci_env import TraciEnv
+
+    table = SharedQTable.attach(spec)
+    env = TraciEnv(label=f'worker-{index}', profile=profile, seed=seed, discretizer=discretizer)
+    random.seed(seed)
+    try:
+        state = env.reset()
+        for step in range(steps):
+            action = table.get_action(state)
+            new_state, reward = env.step(action)
+            table.update(state, action, reward, new_state)
+            state = new_state
+            step_counts[index] = step + 1 # One writer per entry, no lock needed
+    finally:
+        env.close()
+        table.close()
+
+
+if __name__ == '__main__':
+    if 'SUMO_HOME' in os.environ:
+        tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+        sys.path.append(tools)
+    else:
+        sys.exit("Please declare environment variable 'SUMO_HOME'")
+
+    parser = argparse.ArgumentParser(description="Hogwild! Q-learning with many SUMO workers and one shared Q-table.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--steps', type=int, default=50000, help="Simulation steps per worker")
+    parser.add_argument('--capacity', type=int, default=1 << 18, help="Maximum number of states")
+    parser.add_argument('--profile', choices=['micro', 'meso'], default='micro')
+    parser.add_argument('--q-table', default='q_table.txt')
+    parser.add_argument('--snapshot-interval', type=float, default=SNAPSHOT_INTERVAL)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    table = SharedQTable.create(capacity=args.capacity)
+    table.load(load_q_table(args.q_table))
+    discretizer = load_for_q_table(args.q_table) # Workers keep the table's state space
+    step_counts = mp.Array('q', args.workers, lock=False)
+
+    workers = [
+        mp.Process(target=run_worker,
+                   args=(i, table.describe(), args.steps, args.seed + i, args.profile, step_counts, discretizer))
+        for i in range(args.workers)
+    ]
+    print(f"\n=== Starting Hogwild! training with {args.workers} workers ===")
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    last_snapshot = time.perf_counter()
+    while any(worker.is_alive() for worker in workers):
+        time.sleep(1.0)
+        elapsed = time.perf_counter() - start
+        total_steps = sum(step_counts)
+        print(f"Samples: {total_steps}, Samples/s: {total_steps / elapsed:.0f}, Q-table size: {table.size[0]}")
+        if args.snapshot_interval > 0 and time.perf_counter() - last_snapshot >= args.snapshot_interval:
+            size = table.snapshot(args.q_table)
+            print(f"Snapshot of {size} states saved to {args.q_table}")
+            last_snapshot = time.perf_counter()
+
+    for worker in workers:
+        worker.join()
+
+    size = table.snapshot(args.q_table)
+    print(f"\nTraining completed. Q-table ({size} states) has been saved to {args.q_table}")
+    table.close()
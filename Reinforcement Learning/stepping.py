@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run_steps(steps, observed, act, simulate, learn, pipelined=False):
+    """
+    Runs TraciQL's control loop for at most `steps` steps and returns the
+    number of steps taken.
+
+    Each step calls act(step, observed), which chooses and applies the action
+    from what the previous step observed and returns the step's decision, then
+    simulate(), which advances SUMO and returns what it observed, then
+    learn(step, decision, observed), which updates the Q-table and returns
+    True to stop. `observed` seeds the first act(). act and simulate are the
+    only callbacks allowed to use TraCI.
+
+    Pipelined, SUMO computes step t on a TraCI I/O thread while the caller's
+    thread learns from transition t-1. The action for step t is still chosen
+    from the observation after step t-1; only the Q-update of that last
+    transition lands one step later. TraCI is never used from both threads at
+    once: act runs before the step is submitted, and nothing else touches
+    TraCI until the step's result has been collected.
+    """
+    if not pipelined:
+        for step in range(steps):
+            decision = act(step, observed)
+            observed = simulate()
+            if learn(step, decision, observed):
+                return step + 1
+        return steps
+
+    taken = 0
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='traci-io') as traci_io:
+        pending = None
+        for step in range(steps):
+            decision = act(step, observed)
+            future = traci_io.submit(simulate)
+            stop = pending is not None and learn(*pending)
+            observed = future.result()
+            pending = (step, decision, observed)
+            taken = step + 1
+            if stop:
+                break
+        if pending is not None:
+            learn(*pending)
+    return taken
@@ -0,0 +1,357 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import socketserver
+import traci
+
+HOST = '127.0.0.1'
+PORT = 9996
+POOL_ENV = 'SUMO_POOL' # "host:port" of a running pool; connect() falls back to traci.start without it
+POOL_SIZE = 2 # Idle instances kept per command
+HEALTH_INTERVAL = 1.0 # Seconds between health checks / top-ups
+REQUEST_TIMEOUT = 2.0
+STARTUP_TIMEOUT = 60.0 # Seconds an instance may take to load before its TraCI port must be open
+INIT_RETRIES = 20 # Seconds connect() waits for a pooled instance's port before giving up on it
+ACQUIRE_ATTEMPTS = 2 # Pooled instances connect() tries before starting SUMO itself
+
+
+# -------------------------
+# Commands and ports
+# -------------------------
+def normalize_command(cmd):
+    """
+    Makes file arguments absolute so a command means the same scenario to the
+    pool and to a client started from another directory.
+    """
+    return [os.path.abspath(arg) if os.path.exists(arg) else arg for arg in cmd]
+
+
+def command_key(cmd):
+    return json.dumps(normalize_command(cmd))
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def _input_mtimes(cmd):
+    """
+    Modification time of every file the command loads: the files named on
+    the command line and, for a .sumocfg, the net, route and additional
+    files it lists (None for a missing one).
+    """
+    from eval_cache import scenario_files # eval_cache imports traci_env, which imports this module
+    files = [arg for arg in cmd if os.path.isfile(arg)]
+    for arg in list(files):
+        if arg.endswith('.sumocfg'):
+            files += scenario_files(arg)
+    return {path: os.path.getmtime(path) if os.path.exists(path) else None for path in files}
+
+
+class SumoInstance:
+    """
+    One pre-launched SUMO process: the network and routes are loaded and it
+    waits at time 0 (or at the time of its --load-state snapshot) for a TraCI
+    client on its port.
+    """
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.port = free_port()
+        self.mtimes = _input_mtimes(cmd)
+        self.process = subprocess.Popen(
+            cmd + ['--remote-port', str(self.port), '--num-clients', '1'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.started = time.time()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def listening(self):
+        """
+        True while SUMO holds its TraCI port. Connecting to find out would use
+        up the one client the instance accepts, so this tries to bind the
+        port instead, which only fails while it is taken.
+        """
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind((HOST, self.port))
+            except OSError:
+                return True
+        return False
+
+    def healthy(self):
+        """
+        Running and, once it has had STARTUP_TIMEOUT to load, listening: a
+        wedged process whose port closed would hang every client it is
+        handed to.
+        """
+        return self.alive() and (time.time() - self.started < STARTUP_TIMEOUT or self.listening())
+
+    def stale(self):
+        """
+        True when a scenario file (the config or anything it loads) changed
+        after the instance loaded it.
+        """
+        try:
+            return _input_mtimes(self.cmd) != self.mtimes
+        except OSError:
+            return True
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+
+
+# -------------------------
+# Pool server
+# -------------------------
+class SumoPool:
+    """
+    Keeps `size` idle SUMO instances per command. acquire() hands one out
+    (its port) and immediately launches a replacement; the client connects
+    with traci.init and the instance exits when the client closes, or
+    discard()s it when it can't connect. A health check reaps finished
+    instances and replaces idle ones that died, stopped listening or whose
+    scenario files changed.
+    """
+
+    def __init__(self, commands, size=POOL_SIZE):
+        self.size = size
+        self.idle = {command_key(cmd): [] for cmd in commands}
+        self.commands = {command_key(cmd): normalize_command(cmd) for cmd in commands}
+        self.leased = []
+        self.lock = threading.Lock()
+        self.stats = {'acquired': 0, 'misses': 0, 'replaced': 0, 'discarded': 0}
+        self.running = True
+
+    def top_up(self):
+        with self.lock:
+            for key, instances in self.idle.items():
+                healthy = []
+                for instance in instances:
+                    if instance.healthy() and not instance.stale():
+                        healthy.append(instance)
+                    else:
+                        instance.kill()
+                        self.stats['replaced'] += 1
+                while len(healthy) < self.size:
+                    healthy.append(SumoInstance(self.commands[key]))
+                self.idle[key] = healthy
+            # Leased instances exit when their client closes; reap them
+            self.leased = [instance for instance in self.leased if instance.alive()]
+
+    def acquire(self, cmd):
+        """
+        Returns the port of an idle instance for `cmd`, or None if the pool
+        does not serve this command (the client then starts SUMO itself).
+        """
+        key = command_key(cmd)
+        with self.lock:
+            instances = self.idle.get(key)
+            if not instances:
+                self.stats['misses'] += 1
+                return None
+            # Oldest first: it has had the most time to finish loading
+            instance = instances.pop(0)
+            self.leased.append(instance)
+            self.stats['acquired'] += 1
+        # Launch the replacement outside the lock so other acquires don't wait on it
+        replacement = SumoInstance(self.commands[key])
+        with self.lock:
+            self.idle[key].append(replacement)
+        return instance.port
+
+    def discard(self, port):
+        """
+        Kills the leased instance on `port` after its client failed to
+        connect to it. Returns False if no leased instance has that port.
+        """
+        with self.lock:
+            instance = next((instance for instance in self.leased if instance.port == port), None)
+            if instance is None:
+                return False
+            self.leased.remove(instance)
+            self.stats['discarded'] += 1
+        instance.kill()
+        return True
+
+    def status(self):
+        with self.lock:
+            return {
+                'idle': {key: len(instances) for key, instances in self.idle.items()},
+                'leased': len(self.leased),
+                **self.stats,
+            }
+
+    def health_loop(self):
+        while self.running:
+            self.top_up()
+            time.sleep(HEALTH_INTERVAL)
+
+    def shutdown(self):
+        self.running = False
+        with self.lock:
+            for instances in self.idle.values():
+                for instance in instances:
+                    instance.kill()
+            for instance in self.leased:
+                instance.kill()
+
+
+class PoolHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if 'acquire' in request:
+                    response = {'port': self.server.pool.acquire(request['acquire'])}
+                elif 'discard' in request:
+                    response = {'discarded': self.server.pool.discard(int(request['discard']))}
+                else:
+                    response = self.server.pool.status()
+            except (ValueError, KeyError, TypeError) as e:
+                response = {'error': f"Invalid request: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class PoolServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, pool):
+        super().__init__(address, PoolHandler)
+        self.pool = pool
+
+
+def serve(commands, size=POOL_SIZE, host=HOST, port=PORT):
+    pool = SumoPool(commands, size)
+    pool.top_up()
+    threading.Thread(target=pool.health_loop, daemon=True).start()
+    server = PoolServer((host, port), pool)
+    print(f"\nSUMO pool listening on {host}:{port}: {size} idle instance(s) for each of {len(commands)} command(s)")
+    print(f"Set {POOL_ENV}={host}:{port} for clients to use it")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown()
+        print("\nSUMO pool stopped.")
+
+
+# -------------------------
+# Client
+# -------------------------
+def pool_request(address, message, timeout=REQUEST_TIMEOUT):
+    host, port = address.rsplit(':', 1)
+    with socket.create_connection((host, int(port)), timeout=timeout) as sock:
+        sock.sendall(json.dumps(message).encode() + b'\n')
+        return json.loads(sock.makefile('rb').readline())
+
+
+def connect(cmd, label='default', address=None):
+    """
+    Drop-in for traci.start(cmd, label=label): takes a pre-launched instance
+    of exactly this command from the pool at `address` (default: $SUMO_POOL)
+    when one is available, otherwise starts SUMO as usual. An instance that
+    doesn't accept the connection is discarded and the next one tried, up
+    to ACQUIRE_ATTEMPTS. Either way the connection becomes the current one
+    and is returned.
+    """
+    address = address or os.environ.get(POOL_ENV)
+    for _ in range(ACQUIRE_ATTEMPTS if address else 0):
+        try:
+            port = pool_request(address, {'acquire': normalize_command(cmd)}).get('port')
+        except (OSError, ValueError) as e:
+            print(f"SUMO pool at {address} unavailable ({e}); starting SUMO directly.")
+            break
+        if not port:
+            break
+        try:
+            traci.init(port, numRetries=INIT_RETRIES, label=label)
+            return traci.getConnection(label)
+        except (traci.FatalTraCIError, traci.TraCIException, OSError) as e:
+            print(f"Pooled SUMO on port {port} did not accept the connection ({e}); discarding it.")
+            try:
+                pool_request(address, {'discard': port})
+            except (OSError, ValueError):
+                pass
+    traci.start(cmd, label=label)
+    return traci.getConnection(label)
+
+
+def save_warm_state(cmd, until, state_file):
+    """
+    Runs `cmd` up to simulation time `until` and saves the state, so pooled
+    instances can start from a warmed-up network with --load-state.
+    """
+    traci.start(cmd, label='warm-state')
+    conn = traci.getConnection('warm-state')
+    try:
+        while conn.simulation.getTime() < until:
+            conn.simulationStep()
+        conn.simulation.saveState(state_file)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if 'SUMO_HOME' in os.environ:
+        tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+        sys.path.append(tools)
+    else:
+        sys.exit("Please declare environment variable 'SUMO_HOME'")
+
+    from meso_profile import build_sumo_command
+    from traci_env import SUMO_CFG
+
+    parser = argparse.ArgumentParser(description="Pool of pre-launched SUMO instances.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help="Run the pool")
+    serve_parser.add_argument('--host', default=HOST)
+    serve_parser.add_argument('--port', type=int, default=PORT)
+    serve_parser.add_argument('--size', type=int, default=POOL_SIZE, help="Idle instances per command")
+    serve_parser.add_argument('--sumocfg', nargs='+', default=[SUMO_CFG])
+    serve_parser.add_argument('--profile', choices=['micro', 'meso'], default='micro')
+    serve_parser.add_argument('--binary', default='sumo')
+    serve_parser.add_argument('--seeds', type=int, nargs='*', default=[], help="Pool one command per seed")
+    serve_parser.add_argument('--load-state', default=None, help="Warm-start snapshot every instance loads")
+    serve_parser.add_argument('--cmd', action='append', default=[],
+                              help="Additional raw command to pool, e.g. \"sumo -c map2/RL.sumocfg\"")
+
+    warm_parser = sub.add_parser('warm-state', help="Save a warm-start snapshot")
+    warm_parser.add_argument('--sumocfg', default=SUMO_CFG)
+    warm_parser.add_argument('--profile', choices=['micro', 'meso'], default='micro')
+    warm_parser.add_argument('--until', type=float, default=600.0, help="Simulation time of the snapshot (s)")
+    warm_parser.add_argument('--out', default='warm_state.xml')
+
+    status_parser = sub.add_parser('status', help="Show the state of a running pool")
+    status_parser.add_argument('--address', default=f'{HOST}:{PORT}')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        commands = []
+        for sumocfg in args.sumocfg:
+            base = build_sumo_command(sumocfg, args.profile, binary=args.binary)
+            if args.load_state:
+                base += ['--load-state', args.load_state]
+            commands += [base + ['--seed', str(seed)] for seed in args.seeds] or [base]
+        commands += [cmd.split() for cmd in args.cmd]
+        serve(commands, args.size, args.host, args.port)
+    elif args.command == 'warm-state':
+        save_warm_state(build_sumo_command(args.sumocfg, args.profile), args.until, args.out)
+        print(f"Warm-start state at t={args.until}s has been saved to {args.out}")
+    else:
+        print(json.dumps(pool_request(args.address, {'status': True}), indent=2))
@@ -0,0 +1,26 @@
+import queue
+import types
+
+import numpy as np
+
+from actor_learner import LEARNER_BATCH, run_learner
+from qtable import DenseQTable
+
+
+def test_learner_stays_bounded_on_repeated_transitions():
+    # SUMO actors keep reporting the same few discretized states
+    transitions = queue.Queue()
+    state, other = (0, 1, 1, 0, 2), (1, 1, 1, 0, 2)
+    batch = [(state, 0, -6.0, state), (state, 1, -6.0, other), (other, 0, -4.0, state)] * (LEARNER_BATCH // 3)
+    for _ in range(40):
+        transitions.put((0, 0, batch))
+    transitions.put((0, None, None))
+    policy_queue = queue.Queue()
+
+    q_table = run_learner(DenseQTable(), transitions, [policy_queue], types.SimpleNamespace(value=0), n_actors=1)
+    values = q_table.values[:q_table.size]
+    assert q_table.size == 2
+    assert np.isfinite(values).all()
+    # Rewards of -6 and -4 discounted by 0.9 can't go below -60
+    assert values.min() >= -60.0 and values.max() <= 0.0
+    assert not policy_queue.empty()
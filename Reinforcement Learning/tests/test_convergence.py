@@ -0,0 +1,45 @@
+import numpy as np
+
+from convergence import ConvergenceMonitor
+
+
+def run(monitor, steps, q_delta, q_value, reward, Q_table):
+    rng = np.random.default_rng(0)
+    for step in range(1, steps + 1):
+        monitor.record(q_delta(rng), reward(rng, step), q_value)
+        if monitor.due():
+            stop, _ = monitor.check(step, Q_table, 0.1)
+            if stop:
+                return step
+    return None
+
+
+def test_noisy_rewards_converge_with_a_relative_tolerance(tmp_path):
+    # -sum(queues) rewards: |ΔQ| stays around 0.1 forever, far above an absolute 1e-3
+    monitor = ConvergenceMonitor(window=500, check_every=100, patience=2, log_file=str(tmp_path / 'log.jsonl'))
+    Q_table = {(0, q): np.array([-40.0, -45.0]) for q in range(20)}
+    stopped = run(monitor, 10000, lambda rng: rng.normal(0, 0.1), -40.0,
+                  lambda rng, step: -4.0 + rng.normal(0, 0.5), Q_table)
+    assert stopped is not None
+    assert monitor.history[-1]['mean_abs_q_delta'] > 0.05
+
+
+def test_drifting_values_do_not_converge(tmp_path):
+    monitor = ConvergenceMonitor(window=500, check_every=100, patience=2, log_file=str(tmp_path / 'log.jsonl'))
+    Q_table = {(0, q): np.array([-40.0, -45.0]) for q in range(20)}
+    stopped = run(monitor, 10000, lambda rng: 2.0, -40.0, lambda rng, step: -4.0 - step / 1000, Q_table)
+    assert stopped is None
+
+
+def test_windows_slide(tmp_path):
+    monitor = ConvergenceMonitor(window=500, check_every=100, log_file=str(tmp_path / 'log.jsonl'))
+    checks = []
+    for step in range(1, 1001):
+        monitor.record(0.0, -1.0, -10.0)
+        if monitor.due():
+            monitor.check(step, {(0,): np.array([0.0, 1.0])}, 0.1)
+            checks.append(step)
+    # A check every 100 steps once the first window is full, each over the last 500 steps
+    assert checks == [500, 600, 700, 800, 900, 1000]
+    monitor.record(0.0, -3.0, -10.0)
+    assert monitor._reward_means()[1] == (-1.0 * 499 - 3.0) / 500
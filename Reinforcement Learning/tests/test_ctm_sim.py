@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('traci')
+
+from ctm_sim import VectorIntersectionEnv, load_intersection
+
+RML = os.path.join(os.path.dirname(__file__), '..', 'RML')
+
+
+def approach(name, served):
+    return {'name': name, 'edge': name, 'lanes': 2, 'length': 100.0,
+            'detector_spans': [(0.0, 100.0)], 'served': served}
+
+
+def two_phase_env(**kwargs):
+    # Phase 0 serves EB only, phase 1 serves NB only; both last longer than the test
+    phases = [(1e6, 'Gr'), (1e6, 'rG')]
+    approaches = [approach('EB', [1.0, 0.0]), approach('NB', [0.0, 1.0])]
+    return VectorIntersectionEnv(phases, approaches, [0.3, 0.3], n_envs=64, demand_jitter=0.0, seed=0,
+                                 min_green_steps=50, **kwargs)
+
+
+def test_scenario_approaches_each_get_one_green_phase():
+    phases, approaches = load_intersection(os.path.join(RML, 'RL.net.xml'), os.path.join(RML, 'RL.add.xml'))
+    assert [a['name'] for a in approaches] == ['EB', 'SB', 'WB', 'NB']
+    for a in approaches:
+        assert sorted(a['served'])[-2:] == [0.0, 1.0]
+        assert all(0.0 <= start < end <= a['length'] for start, end in a['detector_spans'])
+    assert len(phases) == len(approaches[0]['served'])
+
+
+def test_red_approach_queues_and_green_drains_it():
+    env = two_phase_env()
+    for _ in range(600):
+        states, rewards = env.step(np.zeros(env.n_envs, dtype=np.int64))
+    assert (states[:, 0] == 0).all()
+    assert states[:, 2].mean() > 3 * max(states[:, 1].mean(), 1.0)
+    assert (env.cells >= 0).all() and (env.cells <= env.max_vehicles + 1e-9).all()
+    assert np.array_equal(rewards, -states[:, 1:].sum(axis=1).astype(float))
+
+    red_queue = states[:, 2].mean()
+    states, _ = env.step(np.ones(env.n_envs, dtype=np.int64))
+    assert (states[:, 0] == 1).all()
+    for _ in range(300):
+        states, _ = env.step(np.zeros(env.n_envs, dtype=np.int64))
+    assert states[:, 2].mean() < red_queue / 2
+
+
+def test_switch_waits_for_minimum_green():
+    env = two_phase_env()
+    env.step(np.ones(env.n_envs, dtype=np.int64))
+    assert (env.phase == 1).all()
+    for _ in range(env.min_green_steps - 1):
+        env.step(np.ones(env.n_envs, dtype=np.int64))
+        assert (env.phase == 1).all()
+    env.step(np.ones(env.n_envs, dtype=np.int64))
+    assert (env.phase == 0).all()
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from discretizer import (bins_file_for, fixed_bins, identity, load_for_q_table, resolve_for_q_table,
+                         save_for_q_table)
+from qtable import save_q_table
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'discretizer.py')
+
+
+def fit(q_table, *extra):
+    # The table check comes before the metrics run is read, so the run need not exist
+    return subprocess.run([sys.executable, SCRIPT, 'no-such-run', '--q-table', str(q_table), *extra],
+                          capture_output=True, text=True, cwd=os.path.dirname(SCRIPT))
+
+
+def test_fitting_refuses_to_rebin_a_trained_table(tmp_path):
+    q_table = tmp_path / 'q_table.txt'
+    save_q_table({(0, 1, 2, 3, 4): np.array([1.0, 2.0])}, str(q_table))
+    save_for_q_table(fixed_bins(5, 60), str(q_table))
+    result = fit(q_table)
+    assert result.returncode != 0
+    assert 'already holds states' in result.stderr
+    assert load_for_q_table(str(q_table)) == fixed_bins(5, 60)
+
+
+def test_fitting_is_allowed_for_a_new_table(tmp_path):
+    result = fit(tmp_path / 'q_table.txt')
+    # Gets past the table check and fails on the missing run instead
+    assert 'already holds states' not in result.stderr
+    assert not os.path.exists(bins_file_for(str(tmp_path / 'q_table.txt')))
+
+
+def test_saved_bins_survive_a_restart_before_the_first_update(tmp_path):
+    q_table = str(tmp_path / 'q_table.txt')
+    save_for_q_table(fixed_bins(5, 60), q_table) # Fitted, nothing trained yet
+    assert resolve_for_q_table(identity(), q_table, table_has_states=False) == fixed_bins(5, 60)
+
+
+def test_configured_bins_are_used_without_a_bins_file(tmp_path):
+    q_table = str(tmp_path / 'q_table.txt')
+    assert resolve_for_q_table(fixed_bins(5, 60), q_table, table_has_states=False) == fixed_bins(5, 60)
+    with pytest.raises(ValueError):
+        resolve_for_q_table(fixed_bins(5, 60), q_table, table_has_states=True) # Trained on raw counts
@@ -0,0 +1,57 @@
+import types
+
+import pytest
+
+pytest.importorskip('traci')
+
+from emissions import EMISSION_VARS, EmissionsMeter
+
+CO2, FUEL, NOX = (EMISSION_VARS[name] for name in ('co2_mg_s', 'fuel_mg_s', 'nox_mg_s'))
+
+
+class FakeConnection:
+    """
+    Two controlled lanes, one of which feeds two signal links.
+    """
+
+    def __init__(self):
+        self.subscribed = {}
+        self.results = {}
+        self.polled = []
+        self.trafficlight = types.SimpleNamespace(getControlledLanes=lambda tls: ['a_0', 'a_0', 'b_0'])
+        self.lane = types.SimpleNamespace(
+            subscribe=lambda lane_id, variables: self.subscribed.__setitem__(lane_id, variables),
+            getAllSubscriptionResults=lambda: self.results,
+            getCO2Emission=self._poll(500.0), getFuelConsumption=self._poll(200.0), getNOxEmission=self._poll(1.0),
+        )
+
+    def _poll(self, value):
+        def getter(lane_id):
+            self.polled.append(lane_id)
+            return value
+        return getter
+
+
+def test_rates_come_from_subscriptions_and_integrate_over_the_step():
+    conn = FakeConnection()
+    meter = EmissionsMeter('Node2', step_length=0.5, connection=conn)
+    meter.subscribe()
+    assert meter.lanes == ['a_0', 'b_0']
+    assert set(conn.subscribed) == {'a_0', 'b_0'}
+
+    conn.results = {'a_0': {CO2: 1000.0, FUEL: 400.0, NOX: 2.0}, 'b_0': {CO2: 3000.0, FUEL: 600.0, NOX: 4.0}}
+    for _ in range(4):
+        rates = meter.read()
+    assert rates == {'co2_mg_s': 4000.0, 'fuel_mg_s': 1000.0, 'nox_mg_s': 6.0}
+    assert conn.polled == []
+    # 4 steps of 0.5 s at 4000 mg/s
+    assert meter.totals_g() == {'co2_g': 8.0, 'fuel_g': 2.0, 'nox_g': 0.012}
+
+
+def test_lane_missing_from_the_results_is_polled():
+    conn = FakeConnection()
+    meter = EmissionsMeter('Node2', step_length=1.0, connection=conn)
+    meter.subscribe()
+    conn.results = {'a_0': {CO2: 1000.0, FUEL: 400.0, NOX: 2.0}}
+    assert meter.read() == {'co2_mg_s': 1500.0, 'fuel_mg_s': 600.0, 'nox_mg_s': 3.0}
+    assert conn.polled == ['b_0'] * 3
@@ -0,0 +1,80 @@
+import pytest
+
+pytest.importorskip('traci')
+
+import eval_cache
+from eval_cache import EvalCache, cache_key
+from qtable import save_q_table
+
+CONFIG = """<configuration>
+    <input>
+        <net-file value="net.xml"/>
+        <route-files value="a.rou.xml, b.rou.xml"/>
+    </input>
+</configuration>
+"""
+
+
+@pytest.fixture
+def scenario(tmp_path, monkeypatch):
+    (tmp_path / 'sim.sumocfg').write_text(CONFIG)
+    for name in ('net.xml', 'a.rou.xml', 'b.rou.xml'):
+        (tmp_path / name).write_text(f'<{name}/>')
+    q_table_file = str(tmp_path / 'q_table.txt')
+    save_q_table({(0, 1, 2, 3, 4): [0.0, 1.0]}, q_table_file)
+    monkeypatch.setattr(eval_cache, 'sumo_version', lambda binary='sumo': 'Eclipse SUMO sumo Version 1.24.0')
+
+    runs = []
+
+    def fake_evaluate(q_table_file, sumocfg, seed, steps, profile, binary):
+        runs.append((q_table_file, seed))
+        return {'mean_queue': float(len(runs)), 'mean_reward': -float(len(runs))}
+
+    monkeypatch.setattr(eval_cache, 'evaluate', fake_evaluate)
+    return tmp_path, q_table_file, runs
+
+
+def test_unchanged_inputs_reuse_the_result(scenario):
+    tmp_path, q_table_file, runs = scenario
+    cache = EvalCache(str(tmp_path / 'cache'))
+    sumocfg = str(tmp_path / 'sim.sumocfg')
+
+    first, cached = cache.evaluate(q_table_file, sumocfg, seed=1, steps=100)
+    assert not cached
+    # A fresh process reads the same index
+    again, cached = EvalCache(str(tmp_path / 'cache')).evaluate(q_table_file, sumocfg, seed=1, steps=100)
+    assert cached and again == first
+    _, cached = cache.evaluate(q_table_file, sumocfg, seed=2, steps=100)
+    assert not cached
+    assert len(runs) == 2
+
+
+def test_editing_an_input_changes_the_key(scenario):
+    tmp_path, q_table_file, _ = scenario
+    sumocfg = str(tmp_path / 'sim.sumocfg')
+    key, inputs = cache_key(q_table_file, sumocfg, 1, {'steps': 100})
+    assert set(inputs['files']['scenario']) == {str(tmp_path / n) for n in
+                                                ('sim.sumocfg', 'net.xml', 'a.rou.xml', 'b.rou.xml')}
+
+    (tmp_path / 'b.rou.xml').write_text('<routes><vehicle id="v"/></routes>')
+    route_key, _ = cache_key(q_table_file, sumocfg, 1, {'steps': 100})
+    save_q_table({(0, 1, 2, 3, 4): [1.0, 0.0]}, q_table_file)
+    policy_key, _ = cache_key(q_table_file, sumocfg, 1, {'steps': 100})
+    assert len({key, route_key, policy_key}) == 3
+
+
+def test_invalidate_by_path_drops_only_entries_using_it(scenario):
+    tmp_path, q_table_file, runs = scenario
+    other_q_table = str(tmp_path / 'other.txt')
+    save_q_table({(1, 1, 1, 1, 1): [0.0, 0.0]}, other_q_table)
+    cache = EvalCache(str(tmp_path / 'cache'))
+    sumocfg = str(tmp_path / 'sim.sumocfg')
+    cache.evaluate(q_table_file, sumocfg, steps=100)
+    cache.evaluate(other_q_table, sumocfg, steps=100)
+
+    assert cache.invalidate(path=q_table_file) == 1
+    _, cached = cache.evaluate(other_q_table, sumocfg, steps=100)
+    assert cached
+    _, cached = cache.evaluate(q_table_file, sumocfg, steps=100)
+    assert not cached
+    assert cache.invalidate(everything=True) == 2
@@ -0,0 +1,45 @@
+import os
+import types
+
+import pytest
+
+pytest.importorskip('traci')
+
+import traci.constants as tc
+
+from meso_profile import (MesoObservationAdapter, build_sumo_command, demand_inputs, meso_config_path,
+                          steps_for_profile)
+from traci_env import DETECTOR_IDS
+
+RML = os.path.join(os.path.dirname(__file__), '..', 'RML')
+
+
+def test_profiles_share_the_scenario_but_not_the_step_length():
+    sumocfg = os.path.join(RML, 'RL.sumocfg')
+    assert meso_config_path(sumocfg) == os.path.join(RML, 'RL.meso.sumocfg')
+    assert demand_inputs(meso_config_path(sumocfg)) == demand_inputs(sumocfg)
+    assert build_sumo_command(sumocfg, 'meso', 'sumo-gui') == ['sumo-gui', '-c', meso_config_path(sumocfg), '--delay', '0']
+    assert '--step-length' in build_sumo_command(sumocfg)
+    with pytest.raises(ValueError):
+        build_sumo_command(sumocfg, 'macro')
+    # 10 s of minimum green in both profiles
+    assert (steps_for_profile(100, 'micro'), steps_for_profile(100, 'meso')) == (100, 10)
+
+
+def test_adapter_estimates_detector_queues_from_edge_counts():
+    counts = {}
+    conn = types.SimpleNamespace(edge=types.SimpleNamespace(
+        subscribe=lambda edge_id, variables: counts.setdefault(edge_id, 0),
+        getAllSubscriptionResults=lambda: {e: {tc.LAST_STEP_VEHICLE_NUMBER: n} for e, n in counts.items()},
+    ), trafficlight=types.SimpleNamespace(getPhase=lambda tls_id: 3))
+    adapter = MesoObservationAdapter(os.path.join(RML, 'RL.add.xml'), os.path.join(RML, 'RL.net.xml'),
+                                     DETECTOR_IDS, connection=conn)
+    adapter.subscribe()
+    assert len(adapter.edges) == len(DETECTOR_IDS) == len(counts)
+
+    # Every lane of the EB edge covered almost end to end: the estimate is close to the edge count
+    eb_edge = next(iter(adapter.edge_weights[0]))
+    counts[eb_edge] = 10
+    state = adapter.get_state('Node2')
+    assert state[0] == 3
+    assert 9 <= state[1] <= 10 and state[2:] == (0, 0, 0)
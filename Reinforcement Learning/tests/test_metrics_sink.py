@@ -0,0 +1,40 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from metrics_sink import MetricsSink, load_metrics, new_run_dir
+
+
+def test_chunks_round_trip_with_columns_added_mid_run(tmp_path):
+    sink = MetricsSink(str(tmp_path / 'run'), chunk_rows=4, meta={'sim_profile': 'micro'})
+    for step in range(10):
+        values = {'step': step, 'reward': -step}
+        if step >= 6:
+            values['co2_mg_s'] = 100.0 + step
+        sink.record(**values)
+    sink.close()
+
+    assert sorted(os.listdir(tmp_path / 'run')) == ['meta.json', 'metrics_00000.npz',
+                                                    'metrics_00001.npz', 'metrics_00002.npz']
+    with open(tmp_path / 'run' / 'meta.json') as f:
+        meta = json.load(f)
+    assert (meta['rows'], meta['chunks'], meta['sim_profile']) == (10, 3, 'micro')
+
+    metrics = load_metrics(str(tmp_path / 'run'))
+    assert np.array_equal(metrics['step'], np.arange(10))
+    assert np.isnan(metrics['co2_mg_s'][:6]).all()
+    assert np.array_equal(metrics['co2_mg_s'][6:], [106.0, 107.0, 108.0, 109.0])
+    assert set(load_metrics(str(tmp_path / 'run'), ['reward'])) == {'reward'}
+
+
+def test_missing_run_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_metrics(str(tmp_path))
+
+
+def test_run_dirs_started_in_the_same_second_differ(tmp_path):
+    run_dirs = {new_run_dir(str(tmp_path)) for _ in range(5)}
+    assert len(run_dirs) == 5
+    assert all(f'_{os.getpid()}_' in os.path.basename(run_dir) for run_dir in run_dirs)
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from discretizer import fixed_bins
+from param_server import ParameterServer, ParameterServerClient, send_message, recv_message
+
+
+@pytest.fixture
+def server():
+    server = ParameterServer(('127.0.0.1', 0), num_shards=4)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_resent_push_is_applied_once(server):
+    client = ParameterServerClient(*server.server_address, actor_id='a1')
+    client.push([[[0, 1, 2], 1, 0.5]])
+    # The reply to the next push is lost: the client reconnects and sends it again
+    message = {'op': 'push', 'session': client.session, 'seq': client.push_seq + 1, 'deltas': [[[0, 1, 2], 1, 0.25]]}
+    assert client.request(message)['applied'] == 1
+    client.sock.close()
+    client.sock = None
+    assert client.request(message)['applied'] == 0
+    client.push_seq += 1
+    client.push([[[0, 1, 2], 0, 1.0]])
+    assert client.pull([[0, 1, 2]]) == [[1.0, 0.75]]
+    assert server.updates == 3
+    client.close()
+
+
+def test_sessions_are_independent(server):
+    first = ParameterServerClient(*server.server_address, actor_id='same-id')
+    second = ParameterServerClient(*server.server_address, actor_id='same-id') # e.g. a restarted actor
+    first.push([[[5], 0, 1.0]])
+    second.push([[[5], 0, 1.0]])
+    assert first.pull([[5]]) == [[2.0, 0.0]]
+    first.close()
+    second.close()
+
+
+def test_pull_all_prefetches_the_table(server):
+    server.table.load({(1, 2): [0.5, -1.0], (3, 4): [2.0, 0.0]})
+    client = ParameterServerClient(*server.server_address)
+    rows = client.pull_all()
+    assert set(rows) == {(1, 2), (3, 4)}
+    np.testing.assert_array_equal(rows[(1, 2)], [0.5, -1.0])
+    client.close()
+
+
+def test_unnumbered_pushes_still_apply(server):
+    client = ParameterServerClient(*server.server_address)
+    client._connect()
+    send_message(client.sock, {'op': 'push', 'deltas': [[[7], 1, 1.0]]})
+    assert recv_message(client.sock)['applied'] == 1
+    assert client.pull([[7]]) == [[0.0, 1.0]]
+    client.close()
+
+
+def test_actors_get_the_table_bins():
+    server = ParameterServer(('127.0.0.1', 0), num_shards=4, discretizer=fixed_bins(5, 60))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = ParameterServerClient(*server.server_address)
+    client.pull_all()
+    assert client.discretizer == fixed_bins(5, 60)
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_sessions_are_forgotten_on_bye_and_when_idle():
+    server = ParameterServer(('127.0.0.1', 0), num_shards=4, session_ttl=0.2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    leaving = ParameterServerClient(*server.server_address, actor_id='leaving')
+    leaving.push([[[1], 0, 1.0]])
+    leaving.close()
+    crashed = ParameterServerClient(*server.server_address, actor_id='crashed')
+    crashed.push([[[1], 0, 1.0]])
+    crashed.sock.close() # Dies without saying bye
+    deadline = time.monotonic() + 2.0
+    while leaving.session in server.push_seqs and time.monotonic() < deadline:
+        time.sleep(0.01) # 'bye' is handled on the leaving actor's connection thread
+    assert set(server.push_seqs) == {crashed.session}
+
+    time.sleep(0.3)
+    active = ParameterServerClient(*server.server_address, actor_id='active')
+    active.push([[[1], 0, 1.0]])
+    assert set(server.push_seqs) == set(server.push_locks) == set(server.push_times) == {active.session}
+    assert active.pull([[1]]) == [[3.0, 0.0]]
+    active.close()
+    server.shutdown()
+    server.server_close()
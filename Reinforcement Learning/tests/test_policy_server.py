@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from policy_server import PolicyServer
+from qtable import save_q_table
+
+
+@pytest.fixture
+def q_table(tmp_path):
+    path = tmp_path / 'q_table.txt'
+    save_q_table({(0, 1, 2, 3, 4): np.array([0.0, 1.0]), (1, 0, 0, 0, 0): np.array([1.0, 0.0])}, str(path))
+    return str(path)
+
+
+def exchange(server, lines):
+    """
+    Sends the JSON lines over one connection to a running server and returns
+    the responses; fails instead of hanging when one never comes.
+    """
+    async def run():
+        server.pending = asyncio.Queue()
+        batcher = asyncio.create_task(server._batcher())
+        listener = await asyncio.start_server(server._handle, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+        responses = []
+        for line in lines:
+            writer.write((line if isinstance(line, str) else json.dumps(line)).encode() + b'\n')
+            await writer.drain()
+            responses.append(json.loads(await asyncio.wait_for(reader.readline(), 5)))
+        writer.close()
+        listener.close()
+        batcher.cancel()
+        return responses
+    return asyncio.run(run())
+
+
+def test_out_of_range_observation_does_not_stop_the_batcher(q_table):
+    responses = exchange(PolicyServer(q_table), [
+        {'id': 1, 'observation': [0, 10 ** 30, 2, 3, 4]},
+        {'id': 2, 'observation': [0, 1, 2, 3, 4]},
+        {'id': 3, 'observation': [1, 0, 0, 0, -1]},
+        {'id': 4, 'observation': [1, 0, 0, 0, 0]},
+    ])
+    assert 'error' in responses[0] and 'error' in responses[2]
+    assert responses[1] == {'id': 2, 'action': 1, 'known': True}
+    assert responses[3] == {'id': 4, 'action': 0, 'known': True}
+
+
+def test_non_object_requests_are_rejected(q_table):
+    responses = exchange(PolicyServer(q_table), ['[0, 1, 2, 3, 4]', '"stats"', {'id': 5, 'observation': [0, 1, 2, 3, 4]}])
+    assert all('error' in response for response in responses[:2])
+    assert responses[2]['action'] == 1
+
+
+def test_a_failing_lookup_only_fails_its_batch(q_table):
+    server = PolicyServer(q_table)
+    act = server.act
+    calls = []
+
+    def flaky(observations):
+        calls.append(observations)
+        if len(calls) == 1:
+            raise OverflowError("boom")
+        return act(observations)
+
+    server.act = flaky
+    responses = exchange(server, [{'id': 1, 'observation': [0, 1, 2, 3, 4]}, {'id': 2, 'observation': [0, 1, 2, 3, 4]}])
+    assert 'boom' in responses[0]['error']
+    assert responses[1]['action'] == 1
+    assert server.stats.errors == 1
@@ -0,0 +1,94 @@
+import types
+
+import pytest
+
+pytest.importorskip('traci')
+
+import traci.constants as tc
+
+from preemption import PreemptionController
+
+
+class FakeLight:
+    """
+    One traffic light: a_0 is green in phase 0, b_0 in phase 2, each followed by a yellow phase.
+    """
+
+    def __init__(self):
+        self.phase = 0
+        self.time = 100.0
+        self.next_switch = 130.0
+        self.vehicles = {}
+        self.durations = []
+        program = types.SimpleNamespace(phases=[types.SimpleNamespace(state=s) for s in ('Gr', 'yr', 'rG', 'ry')])
+        self.trafficlight = types.SimpleNamespace(
+            getAllProgramLogics=lambda tls: [program],
+            getControlledLinks=lambda tls: [[('a_0', 'out_0', ':j_0')], [('b_0', 'out_1', ':j_1')]],
+            getPhase=lambda tls: self.phase,
+            setPhase=self._set_phase,
+            setPhaseDuration=lambda tls, duration: self.durations.append(duration),
+            getNextSwitch=lambda tls: self.next_switch,
+        )
+        self.junction = types.SimpleNamespace(
+            subscribeContext=lambda *args: None,
+            addSubscriptionFilterVClass=lambda classes: None,
+            getContextSubscriptionResults=lambda junction: self.vehicles,
+        )
+        self.lane = types.SimpleNamespace(getLength=lambda lane: 100.0)
+        self.simulation = types.SimpleNamespace(getTime=lambda: self.time, getDeltaT=lambda: 1.0)
+
+    def _set_phase(self, tls, phase):
+        self.phase = phase
+
+    def approach(self, veh_id, lane, position, vclass='emergency'):
+        self.vehicles = {veh_id: {tc.VAR_LANE_ID: lane, tc.VAR_LANEPOSITION: position, tc.VAR_VEHICLECLASS: vclass}}
+
+
+@pytest.fixture
+def light():
+    light = FakeLight()
+    controller = PreemptionController('j', connection=light)
+    controller.subscribe()
+    return light, controller
+
+
+def test_phases_planned_per_incoming_lane(light):
+    _, controller = light
+    assert controller.green_phase == {'a_0': 0, 'b_0': 2}
+    assert controller.phase_has_green == [True, False, True, False]
+
+
+def test_emergency_vehicle_gets_green_through_clearance(light):
+    light, controller = light
+    light.approach('ambulance', 'b_0', 20.0)
+    assert controller.control()
+    assert light.phase == 1 # Yellow before switching away from a_0
+
+    light.time = 101.0
+    light.next_switch = 104.0
+    assert controller.control()
+    assert light.phase == 1 # Yellow not over yet
+
+    light.time = 103.0
+    assert controller.control()
+    assert light.phase == 2
+
+    light.time = 104.0
+    assert controller.control()
+    assert light.durations == [controller.hold]
+    assert controller.latencies == [4.0]
+
+    light.vehicles = {}
+    assert not controller.control()
+    assert not controller.active
+    stats = controller.stats()
+    assert (stats['preemptions'], stats['preempted_steps']) == (1, 4)
+
+
+def test_other_vehicles_and_passed_lanes_are_ignored(light):
+    light, controller = light
+    light.approach('car', 'b_0', 20.0, vclass='passenger')
+    assert not controller.control()
+    light.approach('ambulance', ':j_1', 2.0) # Already inside the junction
+    assert not controller.control()
+    assert light.phase == 0
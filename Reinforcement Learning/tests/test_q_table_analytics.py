@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+
+from discretizer import fixed_bins, save_for_q_table
+from q_table_analytics import analyze, coverage, greedy_policy_map
+from qtable import save_q_table, save_visit_counts, visits_file_for
+
+
+def test_states_are_mapped_as_the_bins_they_already_are():
+    states = np.array([[0, 1, 2, 0, 0], [1, 3, 0, 0, 1]])
+    visits = np.array([4, 1])
+    cov = coverage(states, visits)
+    assert cov['grid_shape'] == (2, 4, 3, 1, 2)
+    assert cov['pair_maps']['q_EB__q_SB'][1, 2] == 4
+    policy = greedy_policy_map(states, np.array([[0.0, 1.0], [1.0, 0.0]]), visits)
+    assert policy[0, 3] == 1.0 and policy[1, 4] == 0.0
+
+
+def test_analyze_uses_the_saved_bins(tmp_path):
+    q_table = str(tmp_path / 'q_table.txt')
+    save_q_table({(0, 1, 2, 0, 0): np.array([0.0, 1.0]), (1, 3, 0, 0, 1): np.array([1.0, 0.0])}, q_table)
+    save_visit_counts({(0, 1, 2, 0, 0): 4, (1, 3, 0, 0, 1): 1}, visits_file_for(q_table))
+    save_for_q_table(fixed_bins(5, 20), q_table) # 5 bins per direction
+
+    summary = analyze(q_table, out_dir=str(tmp_path / 'out'))
+    assert summary['bins'] == 'fixed'
+    assert summary['coverage']['grid_shape'] == (2, 5, 5, 5, 5)
+    assert summary['coverage']['visited_cells'] == 2
+    with open(tmp_path / 'out' / 'summary.json') as f:
+        assert json.load(f)['coverage']['grid_cells'] == 2 * 5 ** 4
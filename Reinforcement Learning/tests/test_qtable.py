@@ -0,0 +1,31 @@
+import numpy as np
+
+from qtable import DenseQTable
+
+
+def sequential_update(values, transitions, alpha, gamma):
+    # TraciQL.update_Q_table, one transition after another
+    for row, action, reward, next_row in transitions:
+        values[row, action] += alpha * (reward + gamma * values[next_row].max() - values[row, action])
+
+
+def test_duplicate_pairs_match_sequential_updates():
+    table = DenseQTable(state_dim=2)
+    rows = table.rows(np.array([[0, 0], [1, 1], [2, 2]]))
+    transitions = [(rows[0], 1, -6.0, rows[1])] * 50 + [(rows[1], 0, -2.0, rows[2])]
+    expected = table.values.copy()
+    sequential_update(expected, transitions, 0.1, 0.9)
+
+    table.batch_update(*map(np.array, zip(*transitions)), 0.1, 0.9)
+    assert np.allclose(table.values, expected)
+
+
+def test_repeated_batches_of_one_state_stay_bounded():
+    table = DenseQTable(state_dim=2)
+    row = table.rows(np.array([[3, 4]]))[0]
+    n = 4096
+    for _ in range(500):
+        table.batch_update(np.full(n, row), np.zeros(n, dtype=int), np.full(n, -6.0), np.full(n, row), 0.1, 0.9)
+    # A fixed point of Q = -6 + 0.9 Q
+    assert np.isfinite(table.values).all()
+    assert -60.0 - 1e-6 <= table.values[row, 0] <= 0.0
@@ -0,0 +1,52 @@
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+
+from qtable import load_q_table
+from shared_q_table import SharedQTable
+
+
+def insert_and_update(spec, states):
+    table = SharedQTable.attach(spec)
+    try:
+        for state in states:
+            table.update(state, 1, -1.0, state, alpha=1.0, gamma=0.0)
+    finally:
+        table.close()
+
+
+@pytest.fixture
+def table():
+    table = SharedQTable.create(capacity=512)
+    yield table
+    table.close()
+
+
+def test_workers_share_one_index(table, tmp_path):
+    # Both workers insert the same states, so they race for every slot
+    states = [(p, q, 0, 0, 0) for p in range(4) for q in range(50)]
+    workers = [mp.Process(target=insert_and_update, args=(table.describe(), states[::step]))
+               for step in (1, -1)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    assert table.size[0] == len(states)
+    path = str(tmp_path / 'q_table.txt')
+    assert table.snapshot(path) == len(states)
+    Q_table = load_q_table(path)
+    assert set(Q_table) == set(states)
+    assert all(np.array_equal(v, [0.0, -1.0]) for v in Q_table.values())
+
+
+def test_load_round_trips_and_full_table_refuses_new_states(table):
+    table.load({(1, 2, 3, 4, 5): np.array([0.5, -0.5])})
+    assert table.get_action((1, 2, 3, 4, 5), epsilon=0.0) == 0
+    assert np.array_equal(table.values[table.slot((1, 2, 3, 4, 5))], [0.5, -0.5])
+
+    with pytest.raises(RuntimeError):
+        for q in range(table.capacity):
+            table.slot((0, q, 0, 0, 0))
@@ -0,0 +1,64 @@
+import threading
+
+from stepping import run_steps
+
+
+class ToyLoop:
+    """
+    A counter standing in for SUMO: the action adds to it, simulate() reads it.
+    """
+
+    def __init__(self, stop_at=None):
+        self.counter = 0
+        self.stop_at = stop_at
+        self.learned = []
+        self.simulate_threads = set()
+        self.learn_threads = set()
+
+    def act(self, step, observed):
+        self.counter += observed % 3 + 1
+        return observed
+
+    def simulate(self):
+        self.simulate_threads.add(threading.current_thread().name)
+        return self.counter
+
+    def learn(self, step, decision, observed):
+        self.learn_threads.add(threading.current_thread().name)
+        self.learned.append((step, decision, observed))
+        return step == self.stop_at
+
+
+def test_pipelined_steps_learn_the_same_transitions():
+    sequential, pipelined = ToyLoop(), ToyLoop()
+    assert run_steps(50, 0, sequential.act, sequential.simulate, sequential.learn) == 50
+    assert run_steps(50, 0, pipelined.act, pipelined.simulate, pipelined.learn, pipelined=True) == 50
+    assert pipelined.learned == sequential.learned
+    assert pipelined.simulate_threads.isdisjoint(pipelined.learn_threads)
+
+
+def test_learning_overlaps_the_next_step():
+    # learn() of step t-1 only returns once simulate() of step t has started
+    started = [threading.Event() for _ in range(6)]
+
+    def simulate_step():
+        started[loop.counter].set()
+        return loop.counter
+
+    def learn(step, decision, observed):
+        if step + 1 < len(started):
+            assert started[step + 1].wait(timeout=5)
+        return False
+
+    loop = ToyLoop()
+    loop.act = lambda step, observed: setattr(loop, 'counter', step)
+    assert run_steps(len(started), 0, loop.act, simulate_step, learn, pipelined=True) == len(started)
+
+
+def test_stop_still_learns_the_last_step():
+    sequential, pipelined = ToyLoop(stop_at=9), ToyLoop(stop_at=9)
+    assert run_steps(50, 0, sequential.act, sequential.simulate, sequential.learn) == 10
+    # The stop comes from step 9's update, which lands while step 10 is simulated
+    assert run_steps(50, 0, pipelined.act, pipelined.simulate, pipelined.learn, pipelined=True) == 11
+    assert pipelined.learned[:10] == sequential.learned
+    assert [step for step, _, _ in pipelined.learned] == list(range(11))
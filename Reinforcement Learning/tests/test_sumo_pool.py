@@ -0,0 +1,96 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+traci = pytest.importorskip('traci')
+
+import sumo_pool
+from sumo_pool import PoolServer, SumoInstance, SumoPool, _input_mtimes, connect, free_port
+
+CONFIG = """<configuration>
+    <input>
+        <net-file value="net.xml"/>
+        <route-files value="a.rou.xml, b.rou.xml"/>
+        <additional-files value="det.add.xml"/>
+    </input>
+</configuration>
+"""
+
+
+def test_inputs_of_the_config_are_watched(tmp_path):
+    config = tmp_path / 'scenario.sumocfg'
+    config.write_text(CONFIG)
+    for name in ('net.xml', 'a.rou.xml', 'b.rou.xml', 'det.add.xml'):
+        (tmp_path / name).write_text('<x/>')
+    cmd = ['sumo', '-c', str(config), '--step-length', '0.1']
+    before = _input_mtimes(cmd)
+    assert set(before) == {str(config)} | {str(tmp_path / n) for n in ('net.xml', 'a.rou.xml', 'b.rou.xml', 'det.add.xml')}
+
+    route = tmp_path / 'b.rou.xml'
+    os.utime(route, (route.stat().st_atime, route.stat().st_mtime + 10))
+    assert _input_mtimes(cmd) != before
+
+
+def test_missing_inputs_do_not_raise(tmp_path):
+    config = tmp_path / 'scenario.sumocfg'
+    config.write_text(CONFIG)
+    mtimes = _input_mtimes(['sumo', '-c', str(config)])
+    assert mtimes[str(tmp_path / 'net.xml')] is None
+
+
+class RunningProcess:
+    # A SUMO process that never exits on its own
+    def __init__(self):
+        self.killed = False
+
+    def poll(self):
+        return 0 if self.killed else None
+
+    def kill(self):
+        self.killed = True
+
+    def wait(self):
+        return 0
+
+
+class WedgedInstance(SumoInstance):
+    # Running, loaded long ago, and nothing listens on its port
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.port = free_port()
+        self.mtimes = _input_mtimes(cmd)
+        self.process = RunningProcess()
+        self.started = time.time() - 2 * sumo_pool.STARTUP_TIMEOUT
+
+
+def test_wedged_instances_are_unhealthy():
+    instance = WedgedInstance(['sumo'])
+    assert instance.alive() and not instance.healthy()
+    with socket.socket() as sock:
+        sock.bind((sumo_pool.HOST, instance.port))
+        sock.listen()
+        assert instance.healthy()
+
+
+def test_connect_discards_instances_that_refuse_and_starts_sumo(monkeypatch):
+    monkeypatch.setattr(sumo_pool, 'SumoInstance', WedgedInstance)
+    monkeypatch.setattr(sumo_pool, 'INIT_RETRIES', 0)
+    started = []
+    monkeypatch.setattr(traci, 'start', lambda cmd, label: started.append(cmd))
+    monkeypatch.setattr(traci, 'getConnection', lambda label: label)
+    pool = SumoPool([['sumo', '-c', 'x.sumocfg']], size=1)
+    pool.top_up()
+    server = PoolServer((sumo_pool.HOST, 0), pool)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        address = f'{sumo_pool.HOST}:{server.server_address[1]}'
+        assert connect(['sumo', '-c', 'x.sumocfg'], label='t', address=address) == 't'
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert started == [['sumo', '-c', 'x.sumocfg']]
+    assert pool.stats['discarded'] == sumo_pool.ACQUIRE_ATTEMPTS
+    assert pool.leased == []
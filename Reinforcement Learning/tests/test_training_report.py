@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+
+from metrics_sink import MetricsSink
+from training_report import decimate, lttb, min_max, render
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(10000, dtype=float)
+    y = np.sin(x / 500)
+    y[4321] = 50.0
+    dx, dy = lttb(x, y, 200)
+    assert len(dx) == 200
+    assert (dx[0], dx[-1]) == (0.0, 9999.0)
+    assert np.all(np.diff(dx) > 0)
+    assert 4321.0 in dx
+
+
+def test_min_max_keeps_every_spike_in_order():
+    x = np.arange(10000, dtype=float)
+    y = np.zeros(10000)
+    spikes = [123, 5000, 9876]
+    y[spikes] = [7.0, -3.0, 9.0]
+    dx, dy = min_max(x, y, 50)
+    assert len(dx) <= 100
+    assert np.all(np.diff(dx) > 0)
+    assert set(spikes) <= set(dx.astype(int))
+
+
+def test_decimate_skips_nan_rows():
+    x = np.arange(100, dtype=float)
+    y = np.where(x % 2 == 0, np.nan, x)
+    dx, dy = decimate(x, y, 1000)
+    assert not np.isnan(dy).any() and len(dx) == 50
+
+
+def test_render_skips_curves_a_run_did_not_record(tmp_path):
+    sink = MetricsSink(str(tmp_path / 'run'), chunk_rows=1000)
+    for step in range(5000):
+        sink.record(step=step, cumulative_reward=-step, total_queue=step % 17)
+    sink.close()
+    saved = render([str(tmp_path / 'run')], str(tmp_path / 'report'), width_px=400)
+    assert sorted(os.path.basename(p) for p in saved) == ['cumulative_reward.png', 'total_queue.png']
+    assert all(os.path.getsize(p) > 0 for p in saved)
@@ -0,0 +1,116 @@
+import os
+import traci
+
+import meso_profile
+import sumo_pool
+from discretizer import identity
+
+# Scenario TraciQL trains on
+SUMO_CFG = 'Reinforcement Learning/RML/RL.sumocfg'
+TLS_ID = "Node2"
+
+# Detector IDs per approach of the controlled junction
+DETECTOR_IDS = {
+    'EB': ["Node1_2_EB_0", "Node1_2_EB_1", "Node1_2_EB_2"],
+    'SB': ["Node2_7_SB_0", "Node2_7_SB_1", "Node2_7_SB_2"],
+    'WB': ["Node2_3_WB_0", "Node2_3_WB_1", "Node2_3_WB_2"],
+    'NB': ["Node2_5_NB_0", "Node2_5_NB_1", "Node2_5_NB_2"] # Example NB detectors
+}
+
+
+class TraciEnv:
+    """
+    One SUMO instance behind a labelled TraCI connection, with TraciQL's
+    state/action/reward interface. Lets several training processes (or
+    several simulations in one process) run side by side.
+
+    States are discretized with the given discretizer (raw counts by default);
+    the reward always uses the raw queues.
+    """
+
+    def __init__(self, label='default', sumocfg=SUMO_CFG, profile='micro', binary='sumo',
+                 tls_id=TLS_ID, detector_ids=DETECTOR_IDS, min_green_steps=100, seed=None,
+                 discretizer=None):
+        self.label = label
+        self.sumocfg = sumocfg
+        self.profile = profile
+        self.binary = binary
+        self.tls_id = tls_id
+        self.detector_ids = detector_ids
+        self.min_green_steps = meso_profile.steps_for_profile(min_green_steps, profile)
+        self.seed = seed
+        self.discretizer = discretizer or identity()
+        self.conn = None
+        self.meso_adapter = None
+
+    def start(self):
+        cmd = meso_profile.build_sumo_command(self.sumocfg, self.profile, binary=self.binary)
+        if self.seed is not None:
+            cmd += ['--seed', str(self.seed)]
+        self.conn = sumo_pool.connect(cmd, self.label) # A pre-launched instance when a pool is running
+        if self.profile == 'meso':
+            scenario_dir = os.path.dirname(self.sumocfg)
+            self.meso_adapter = meso_profile.MesoObservationAdapter(
+                os.path.join(scenario_dir, 'RL.add.xml'),
+                os.path.join(scenario_dir, 'RL.net.xml'),
+                self.detector_ids,
+                connection=self.conn
+            )
+            self.meso_adapter.subscribe()
+
+    def reset(self):
+        """
+        Starts the simulation (if needed) and returns the first state.
+        """
+        if self.conn is None:
+            self.start()
+        self.step_count = 0
+        self.last_switch_step = -self.min_green_steps
+        return self.get_state()
+
+    def get_observation(self):
+        """
+        (current_phase, q_EB, q_SB, q_WB, q_NB), as in TraciQL.get_observation().
+        """
+        if self.meso_adapter is not None:
+            return self.meso_adapter.get_state(self.tls_id)
+        queues = tuple(
+            sum(self.conn.lanearea.getLastStepVehicleNumber(det_id) for det_id in det_ids)
+            for det_ids in self.detector_ids.values()
+        )
+        return (self.conn.trafficlight.getPhase(self.tls_id),) + queues
+
+    def get_state(self, observation=None):
+        if observation is None:
+            observation = self.get_observation()
+        return (observation[0],) + self.discretizer(observation[1:])
+
+    @staticmethod
+    def get_reward(observation):
+        return -float(sum(observation[1:]))
+
+    def apply_action(self, action):
+        """
+        Action 0 keeps the phase, action 1 switches to the next phase once the
+        minimum green time has passed.
+        """
+        if action == 1 and self.step_count - self.last_switch_step >= self.min_green_steps:
+            program = self.conn.trafficlight.getAllProgramLogics(self.tls_id)[0]
+            next_phase = (self.conn.trafficlight.getPhase(self.tls_id) + 1) % len(program.phases)
+            self.conn.trafficlight.setPhase(self.tls_id, next_phase)
+            self.last_switch_step = self.step_count
+
+    def step(self, action):
+        """
+        Applies the action, advances one simulation step and returns (new_state, reward).
+        """
+        self.apply_action(action)
+        self.conn.simulationStep()
+        self.step_count += 1
+        observation = self.get_observation()
+        return self.get_state(observation), self.get_reward(observation)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,127 @@
+import os
+import argparse
+import numpy as np
+import matplotlib
+matplotlib.use('Agg') # Render straight to files, no display needed
+import matplotlib.pyplot as plt
+
+from metrics_sink import load_metrics
+
+WIDTH_PX = 1600 # Target plot width; series are decimated to about one point per pixel
+DPI = 100
+
+# Curves rendered from every run: (column, y label, title)
+CURVES = [
+    ('cumulative_reward', "Cumulative Reward", "RL Training: Cumulative Reward over Steps"),
+    ('total_queue', "Total Queue Length", "RL Training: Queue Length over Steps"),
+    ('avg_wait_time', "Average Wait Time (s)", "RL Training: Average Wait Time over Steps"),
+    ('co2_mg_s', "CO2 (mg/s)", "RL Training: CO2 on the Controlled Approaches over Steps"),
+]
+
+
+# -------------------------
+# Decimation
+# -------------------------
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point and, from
+    each of n_out - 2 equal buckets in between, the point forming the largest
+    triangle with the previously kept point and the mean of the next bucket.
+    Preserves the visual shape of the curve with n_out points.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def min_max(x, y, n_buckets):
+    """
+    Keeps the minimum and maximum of every bucket, in their original order,
+    so spikes survive the decimation. Returns at most 2 * n_buckets points.
+    """
+    n = len(x)
+    if 2 * n_buckets >= n:
+        return x, y
+    starts = np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(n_buckets), np.diff(np.append(starts, n)))
+    # Sorting by (bucket, value) puts each bucket's min first and max last
+    order = np.lexsort((y, bucket))
+    ends = np.append(starts[1:], n) - 1
+    keep = np.unique(np.concatenate([order[starts], order[ends]]))
+    return x[keep], y[keep]
+
+
+def decimate(x, y, n_out, method='lttb'):
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if method == 'minmax':
+        return min_max(x, y, max(n_out // 2, 1))
+    return lttb(x, y, n_out)
+
+
+# -------------------------
+# Rendering
+# -------------------------
+def render(run_dirs, out_dir='training_report', width_px=WIDTH_PX, method='lttb', labels=None):
+    """
+    Renders every curve in CURVES for one or more metrics runs (overlaid when
+    several runs are given) and saves them as PNGs in out_dir.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    labels = labels or [os.path.basename(os.path.normpath(run_dir)) for run_dir in run_dirs]
+    columns = ['step'] + [column for column, _, _ in CURVES]
+    runs = [load_metrics(run_dir, columns) for run_dir in run_dirs]
+    saved = []
+
+    for column, ylabel, title in CURVES:
+        fig, ax = plt.subplots(figsize=(width_px / DPI, 6), dpi=DPI)
+        plotted = 0
+        for metrics, label in zip(runs, labels):
+            y = metrics[column]
+            if np.isnan(y).all():
+                continue
+            x, y = decimate(metrics['step'], y, width_px, method)
+            ax.plot(x, y, linewidth=0.8, label=f"{label} ({len(metrics['step']):,} steps)")
+            plotted += 1
+        if not plotted:
+            plt.close(fig)
+            continue
+        ax.set_xlabel("Simulation Step")
+        ax.set_ylabel(ylabel)
+        ax.set_title(title if len(runs) == 1 else title + f" ({len(runs)} runs)")
+        ax.legend()
+        ax.grid(True)
+        path = os.path.join(out_dir, f'{column}.png')
+        fig.savefig(path, bbox_inches='tight')
+        plt.close(fig)
+        saved.append(path)
+    return saved
+
+
+if __name__ == '__main__':
+    import time
+
+    parser = argparse.ArgumentParser(description="Render training curves from recorded TraciQL metrics runs.")
+    parser.add_argument('run_dirs', nargs='+', help="Metrics run directories (runs/run_...); several are overlaid")
+    parser.add_argument('--out', default='training_report')
+    parser.add_argument('--width', type=int, default=WIDTH_PX, help="Plot width in pixels")
+    parser.add_argument('--method', choices=['lttb', 'minmax'], default='lttb')
+    parser.add_argument('--labels', nargs='+', default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    saved = render(args.run_dirs, args.out, args.width, args.method, args.labels)
+    print(f"Rendered {len(saved)} plots to {args.out} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,361 @@
+"""
+Server-side traffic analytics for the Analysis dashboard.
+
+summarize() reduces the history store's columns (see history_store) to the
+summaries the Analysis page shows: network totals, hourly and weekday
+profiles, per-intersection and per-side statistics, light-state counts,
+congestion classes, trends and a decimated chart series. Every reduction is
+a NumPy operation over the time axis. Rollup rows (1 min, 15 min) are
+weighted by the number of snapshots they stand for. That makes the means,
+maxima and minima of the totals exact at every resolution. Per-snapshot
+distributions (congestion classes, minimum congestion) and the time spent
+per light state are exact at raw resolution and use bucket means above it.
+
+AnalyticsCache keeps the columns and the result of each (window,
+resolution) it served. A refresh reads only the rows newer than the cached
+ones, drops the rows a sliding window left behind, and re-reduces.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from history_store import (HISTORY_DIR, LEVELS, LIGHTS, HistoryStore, _congestion, date_window,
+                           historical_data, merge_columns)
+
+CHART_POINTS = 200 # Points of the traffic flow series at most; neighbouring rows are averaged into one
+TOP_HOURS = 3 # Peak / off-peak hours listed in the flow patterns
+CONGESTION_CLASSES = (("low", 20.0), ("medium", 50.0), ("high", float('inf'))) # Upper bounds, in %
+CACHE_ENTRIES = 32 # (window, resolution) results kept
+REFRESH_SECONDS = 5.0 # A result younger than this is served without looking at the store
+DAY_NAMES = ('Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+
+ID_COLUMNS = ('int_ids', 'side_int', 'side_name')
+
+
+def _r(value, digits: int = 2) -> float:
+    return round(float(value), digits)
+
+
+def _iso(ts: float) -> str:
+    created = datetime.datetime.fromtimestamp(float(ts), datetime.timezone.utc)
+    return created.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _rows(columns: Dict[str, Any], mask: np.ndarray) -> Dict[str, Any]:
+    return {name: (values if name in ID_COLUMNS or np.ndim(values) == 0 else values[mask])
+            for name, values in columns.items()}
+
+
+def _weighted_mean(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # Mean over axis 0 that skips NaN cells; NaN where nothing was present
+    present = ~np.isnan(values)
+    w = weights.reshape((-1,) + (1,) * (values.ndim - 1)) * present
+    n = w.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, (np.where(present, values, 0.0) * w).sum(axis=0) / np.where(n > 0, n, 1), np.nan)
+
+
+def _local_calendar(ts: np.ndarray, tz_offset: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Hour of day and weekday (0 = Sunday, as JavaScript's getDay) in the viewer's time zone.
+    # tz_offset is JavaScript's getTimezoneOffset(): minutes to add to local time to get UTC
+    local = np.floor((ts - 60.0 * tz_offset) / 3600.0).astype(np.int64)
+    return local % 24, (local // 24 + 4) % 7 # 1970-01-01 was a Thursday
+
+
+def _grouped(keys: np.ndarray, size: int, weights: np.ndarray, total: np.ndarray, congestion: np.ndarray,
+             total_max: np.ndarray, total_min: np.ndarray) -> Dict[int, Dict[str, float]]:
+    """
+    Snapshot-weighted means and extremes of the network totals per key
+    (hour of day, weekday); keys without rows are left out.
+    """
+    n = np.bincount(keys, weights=weights, minlength=size)
+    vehicles = np.bincount(keys, weights=weights * total, minlength=size)
+    congested = np.bincount(keys, weights=weights * congestion, minlength=size)
+    peak = np.full(size, -np.inf)
+    np.maximum.at(peak, keys, total_max)
+    low = np.full(size, np.inf)
+    np.minimum.at(low, keys, total_min)
+    return {int(k): {
+        "avgVehicles": _r(vehicles[k] / n[k]),
+        "avgCongestion": _r(congested[k] / n[k]),
+        "totalSnapshots": int(n[k]),
+        "peakVehicles": _r(peak[k]),
+        "minVehicles": _r(low[k]),
+    } for k in np.flatnonzero(n)}
+
+
+def _light_counts(counts: np.ndarray) -> Dict[str, int]:
+    return {light: int(counts[LIGHTS.index(light)]) for light in ("red", "green", "yellow")}
+
+
+def _intersections(columns: Dict[str, Any], weights: np.ndarray) -> list:
+    """
+    Per-intersection statistics with their road sides, in store column order.
+    """
+    int_ids = [str(i) for i in columns['int_ids']]
+    avg_vehicles = _weighted_mean(columns['int_total'], weights)
+    avg_halting = _weighted_mean(columns['int_halting'], weights)
+    avg_congestion = _weighted_mean(columns['int_congestion'], weights)
+    max_vehicles = np.fmax.reduce(columns['int_total_max'], axis=0)
+    min_vehicles = np.fmin.reduce(columns['int_total_min'], axis=0)
+    max_congestion = np.fmax.reduce(columns['int_congestion_max'], axis=0)
+    min_congestion = np.fmin.reduce(columns['int_congestion'], axis=0)
+
+    side_vehicles = _weighted_mean(columns['side_vehicles'], weights)
+    side_max = np.fmax.reduce(columns['side_vehicles_max'], axis=0)
+    side_lights = columns['side_lights'].sum(axis=0)
+    # Light states of an intersection are those of its sides
+    side_owner = np.array([int_ids.index(str(i)) for i in columns['side_int']], dtype=np.int64)
+    int_lights = np.zeros((len(int_ids), len(LIGHTS)), dtype=np.int64)
+    np.add.at(int_lights, side_owner, side_lights)
+
+    result = []
+    for i, int_id in enumerate(int_ids):
+        if np.isnan(avg_vehicles[i]):
+            continue # No reading in this window
+        sides = [{
+            "id": str(columns['side_name'][s]),
+            "avgVehicles": _r(side_vehicles[s]),
+            "maxVehicles": _r(side_max[s]),
+            "lightDistribution": _light_counts(side_lights[s]),
+        } for s in np.flatnonzero(side_owner == i) if not np.isnan(side_vehicles[s])]
+        result.append({
+            "id": int_id,
+            "avgVehicles": _r(avg_vehicles[i]),
+            "avgHalting": _r(avg_halting[i]),
+            "avgCongestion": _r(avg_congestion[i]),
+            "maxVehicles": _r(max_vehicles[i]),
+            "maxCongestion": _r(max_congestion[i]),
+            "minVehicles": _r(min_vehicles[i]),
+            "minCongestion": _r(min_congestion[i]),
+            "lightDistribution": _light_counts(int_lights[i]),
+            "roadSides": sides,
+            "efficiency": _r(100.0 - avg_congestion[i]),
+        })
+    return result
+
+
+def _chart_series(columns: Dict[str, Any], weights: np.ndarray, hours: np.ndarray, days: np.ndarray,
+                  points: int) -> list:
+    """
+    The traffic flow series, oldest first, with runs of neighbouring rows
+    averaged so that at most `points` remain.
+    """
+    n = len(weights)
+    starts = np.unique(np.linspace(0, n, min(points, n) + 1).astype(np.int64)[:-1])
+    ends = np.append(starts[1:], n) - 1
+    w = np.add.reduceat(weights, starts)
+
+    def mean(name):
+        return np.add.reduceat(weights * columns[name], starts) / w
+
+    vehicles, halting, congestion = mean('total'), mean('halting'), mean('congestion')
+    return [{
+        "index": k,
+        "time": _r(columns['sim_time'][ends[k]]),
+        "timestamp": _iso(columns['ts'][first]),
+        "totalVehicles": _r(vehicles[k]),
+        "totalHalting": _r(halting[k]),
+        "congestionRate": _r(congestion[k]),
+        "hour": int(hours[first]),
+        "dayOfWeek": int(days[first]),
+    } for k, first in enumerate(starts)]
+
+
+def summarize(columns: Dict[str, Any], date: Optional[str] = None, tz_offset: int = 0,
+              chart_points: int = CHART_POINTS) -> Dict[str, Any]:
+    """
+    {analytics, chartData} of HistoryStore.query() columns, in the shape
+    the Analysis page renders; both are None for an empty window.
+    """
+    ts = columns['ts']
+    if not len(ts):
+        return {"analytics": None, "chartData": None}
+    weights = columns['count'].astype(np.float64)
+    total = columns['total'].astype(np.float64)
+    halting = columns['halting'].astype(np.float64)
+    congestion = columns['congestion'].astype(np.float64)
+    total_max = columns['total_max'].astype(np.float64)
+    total_min = columns['total_min'].astype(np.float64)
+    snapshots = weights.sum()
+
+    avg_vehicles = (weights * total).sum() / snapshots
+    avg_halting = (weights * halting).sum() / snapshots
+    avg_congestion = float(_congestion(avg_vehicles, avg_halting))
+    avg_rate = (weights * congestion).sum() / snapshots # Mean of the per-snapshot rates
+    peak = int(np.argmax(total_max))
+
+    hours, days = _local_calendar(ts, tz_offset)
+    hourly = _grouped(hours, 24, weights, total, congestion, total_max, total_min)
+    daily = _grouped(days, 7, weights, total, congestion, total_max, total_min)
+    hourly_stats = {hour: {k: v for k, v in stats.items() if k != "minVehicles"} for hour, stats in hourly.items()}
+    daily_stats = {day: {"name": DAY_NAMES[day], **{k: v for k, v in stats.items() if k != "minVehicles"}}
+                   for day, stats in daily.items()}
+    by_volume = sorted(hourly_stats.items(), key=lambda item: item[1]["avgVehicles"])
+
+    intersections = _intersections(columns, weights)
+    present = ~np.isnan(columns['int_total'])
+
+    lights = columns['side_lights'].sum(axis=(0, 1))
+    # side_time is the side's mean time to switch; weight it by how often each light was seen
+    light_time = (columns['side_lights'] * np.nan_to_num(columns['side_time'])[:, :, None]).sum(axis=(0, 1))
+    lighting_stats = {light: {"count": int(lights[LIGHTS.index(light)]),
+                              "totalTime": _r(light_time[LIGHTS.index(light)])}
+                      for light in ("red", "green", "yellow")}
+
+    classes, lower = {}, -np.inf
+    for name, upper in CONGESTION_CLASSES:
+        classes[name] = int(weights[(congestion >= lower) & (congestion < upper)].sum())
+        lower = upper
+
+    first_total = total[0]
+    series = _chart_series(columns, weights, hours, days, chart_points)
+    analytics = {
+        "summary": {
+            "totalSnapshots": int(snapshots),
+            "avgVehicles": _r(avg_vehicles, 1),
+            "avgHalting": _r(avg_halting, 1),
+            "avgCongestion": _r(avg_congestion, 1),
+            "peakVehicles": _r(total_max[peak]),
+            "peakTime": _iso(ts[peak]),
+            "dateRange": date or 'all',
+            "intersectionCount": len(intersections),
+            "systemEfficiency": _r(100.0 - avg_congestion, 1),
+            # Share of the intersection readings present in the window
+            "dataQuality": round(100.0 * present.mean()) if present.size else 0,
+        },
+        "intersectionAnalytics": intersections,
+        "hourlyStats": hourly_stats,
+        "dailyStats": daily_stats,
+        "lightingStats": lighting_stats,
+        "flowPatterns": {
+            "peakHours": [{"hour": hour, **stats} for hour, stats in by_volume[::-1][:TOP_HOURS]],
+            "offPeakHours": [{"hour": hour, **stats} for hour, stats in by_volume[:TOP_HOURS]],
+        },
+        "congestionDistribution": classes,
+        "trends": {
+            "vehicleTrend": _r(100.0 * (total[-1] - first_total) / first_total) if len(ts) > 1 and first_total > 0 else 0.0,
+            "congestionTrend": _r(congestion[-1] - congestion[0]) if len(ts) > 1 else 0.0,
+        },
+    }
+    chart_data = {
+        "timeSeriesData": series,
+        "hourlyAverages": [{"hour": hour, "avgVehicles": stats["avgVehicles"], "avgCongestion": stats["avgCongestion"],
+                            "maxVehicles": stats["peakVehicles"], "minVehicles": stats["minVehicles"]}
+                           for hour, stats in sorted(hourly.items())],
+        # Scale of the plotted (averaged) series
+        "maxVehicles": max(point["totalVehicles"] for point in series),
+        "maxCongestion": max(point["congestionRate"] for point in series),
+        "avgVehicles": _r(avg_vehicles),
+        "avgCongestion": _r(avg_rate),
+    }
+    return {"analytics": analytics, "chartData": chart_data}
+
+
+# -------------------------
+# Cache
+# -------------------------
+class AnalyticsCache:
+    """
+    The /analytics results per (window, resolution, time zone).
+
+    An entry keeps the columns it was computed from. When it is older than
+    refresh_seconds, get() asks the store only for rows after the newest
+    cached one, drops rows that fell out of a sliding window (last 24 hours,
+    ...), and summarizes again only if either changed. An entry is rebuilt
+    from scratch when the window's automatic resolution changes or when it
+    reaches further back than the cached rows.
+    """
+
+    def __init__(self, store: HistoryStore, entries: int = CACHE_ENTRIES, refresh_seconds: float = REFRESH_SECONDS):
+        self.store = store
+        self.max_entries = entries
+        self.refresh_seconds = refresh_seconds
+        self.entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.stats = {'hits': 0, 'refreshes': 0, 'rebuilds': 0, 'rows_read': 0}
+
+    def get(self, date: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None,
+            resolution: Optional[str] = None, tz_offset: int = 0) -> Dict[str, Any]:
+        if resolution is not None and resolution not in dict(LEVELS):
+            raise ValueError(f"Unknown resolution '{resolution}', expected one of {[name for name, _ in LEVELS]}")
+        key = (date, start, end, resolution, tz_offset) if date == 'custom' else (date, None, None, resolution, tz_offset)
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            if now - entry['checked'] < self.refresh_seconds:
+                self.stats['hits'] += 1
+                return entry['result']
+
+        lo, hi = date_window(date, start, end, now)
+        bounds = self.store.time_range()
+        if bounds is None:
+            return {"analytics": None, "chartData": None, "resolution": None, "bucketSeconds": None}
+        if lo is None:
+            lo, hi = bounds
+        level = resolution or self.store.pick_level(lo, hi)
+        bucket = dict(LEVELS)[level]
+
+        if entry is None or entry['level'] != level or lo < entry['lo']:
+            columns = self.store.query(lo, hi, level)
+            self.stats['rebuilds'] += 1
+            self.stats['rows_read'] += len(columns['ts'])
+            changed = True
+        else:
+            columns = entry['columns']
+            changed = False
+            newest = columns['ts'][-1] if len(columns['ts']) else lo - bucket
+            if hi > newest:
+                fresh = self.store.query(newest, hi, level)
+                fresh = _rows(fresh, fresh['ts'] > newest)
+                if len(fresh['ts']):
+                    columns = merge_columns([columns, fresh])
+                    self.stats['rows_read'] += len(fresh['ts'])
+                    changed = True
+            stale = columns['ts'] + bucket <= lo
+            if stale.any():
+                columns = _rows(columns, ~stale)
+                changed = True
+            self.stats['refreshes'] += 1
+
+        if changed:
+            result = summarize(columns, date, tz_offset)
+            result.update({"resolution": level, "bucketSeconds": bucket})
+        else:
+            result = entry['result']
+        self.entries[key] = {'level': level, 'lo': lo, 'columns': columns, 'result': result, 'checked': now}
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the /analytics computation on a history directory.")
+    parser.add_argument('--dir', default=HISTORY_DIR)
+    parser.add_argument('--date', default='last7days', help="all, last24hours, last7days or last30days")
+    args = parser.parse_args()
+    if not os.path.isdir(args.dir):
+        sys.exit(f"No history at {args.dir}")
+
+    store = HistoryStore(args.dir, read_only=True)
+    date = None if args.date == 'all' else args.date
+    cache = AnalyticsCache(store, refresh_seconds=0.0)
+    for attempt in ("cold", "refresh"):
+        start = time.perf_counter()
+        result = cache.get(date)
+        print(f"{attempt:<8} {1000 * (time.perf_counter() - start):7.1f} ms  {len(json.dumps(result)):>9,} bytes  "
+              f"({result['resolution']})")
+    # What the page used to download and reduce itself
+    start = time.perf_counter()
+    raw = historical_data(store, 1, 500, 'latest', date)
+    print(f"raw page {1000 * (time.perf_counter() - start):7.1f} ms  {len(json.dumps(raw)):>9,} bytes  "
+          f"(500 of {raw['pagination']['totalItems']:,} snapshots)")
@@ -0,0 +1,752 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import datetime
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+HISTORY_DIR = 'history'
+LEVELS = (("raw", 1), ("1min", 60), ("15min", 900)) # Resolution name, bucket seconds
+PARTITIONS = {"raw": '%Y-%m-%d', "1min": '%Y-%m-%d', "15min": '%Y-%m'} # UTC day / month directories
+FLUSH_SECONDS = 60.0 # Wall-clock seconds between writes of the buffered rows
+COMPACT_AT = 16 # More chunk files than this of one generation in a partition are merged into one
+MAX_POINTS = 2000 # Rows a query returns at most when it picks the resolution itself
+CACHE_CHUNKS = 256 # Loaded chunk files kept in memory (they never change once written)
+LOAD_ATTEMPTS = 3 # Listings of a window's chunks tried when a compaction deletes one before it is read
+LIGHTS = ("red", "yellow", "green")
+
+# How every column folds into a coarser bucket
+ROW_AGG = {
+    'total': 'mean', 'total_max': 'max', 'total_min': 'min',
+    'halting': 'mean', 'congestion': 'mean', 'congestion_max': 'max',
+}
+INT_AGG = {
+    'int_total': 'mean', 'int_total_max': 'max', 'int_total_min': 'min',
+    'int_halting': 'mean', 'int_congestion': 'mean', 'int_congestion_max': 'max',
+}
+SIDE_AGG = {'side_vehicles': 'mean', 'side_vehicles_max': 'max', 'side_time': 'mean'}
+
+
+def _congestion(total, halting):
+    # Halting vehicles as a percentage of all vehicles, 0 when there are none
+    total = np.asarray(total, dtype=float)
+    return np.where(total > 0, 100.0 * np.asarray(halting, dtype=float) / np.where(total > 0, total, 1.0), 0.0)
+
+
+def _day(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime('%Y-%m-%d')
+
+
+def _partition(level: str, ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime(PARTITIONS[level])
+
+
+def _partition_bounds(level: str, name: str) -> Tuple[float, float]:
+    first = datetime.datetime.strptime(name, PARTITIONS[level]).replace(tzinfo=datetime.timezone.utc)
+    if PARTITIONS[level] == '%Y-%m':
+        after = (first + datetime.timedelta(days=32)).replace(day=1)
+    else:
+        after = first + datetime.timedelta(days=1)
+    return first.timestamp(), after.timestamp()
+
+
+# -------------------------
+# Schema and rows
+# -------------------------
+class Schema:
+    """
+    Column order of the intersection and side arrays. It only ever grows:
+    an intersection or side seen for the first time gets the next column.
+    """
+
+    def __init__(self):
+        self.int_ids: List[str] = []
+        self.side_keys: List[Tuple[str, str]] = [] # (intersection id, side)
+        self.int_index: Dict[str, int] = {}
+        self.side_index: Dict[Tuple[str, str], int] = {}
+
+    def int_col(self, int_id: str) -> int:
+        if int_id not in self.int_index:
+            self.int_index[int_id] = len(self.int_ids)
+            self.int_ids.append(int_id)
+        return self.int_index[int_id]
+
+    def side_col(self, key: Tuple[str, str]) -> int:
+        if key not in self.side_index:
+            self.side_index[key] = len(self.side_keys)
+            self.side_keys.append(key)
+        return self.side_index[key]
+
+
+def snapshot_row(snapshot: dict, ts: float, schema: Schema) -> Dict[str, Any]:
+    """
+    One raw row from a sumo1.py snapshot: row-level totals, and arrays in
+    schema order (NaN for intersections/sides missing from the snapshot).
+    """
+    int_values, side_values = [], []
+    for intersection in snapshot.get("intersections", []):
+        i = schema.int_col(str(intersection["id"]))
+        int_values.append((i, intersection.get("total-vehicles", 0), intersection.get("halting-vehicles", 0)))
+        for side, values in intersection.get("sides", {}).items():
+            s = schema.side_col((str(intersection["id"]), side))
+            light = LIGHTS.index(values["light"]) if values.get("light") in LIGHTS else -1
+            side_values.append((s, values.get("number-of-vehicles", 0), values.get("time", -1.0), light))
+
+    n_int, n_side = len(schema.int_ids), len(schema.side_keys)
+    int_total = np.full(n_int, np.nan)
+    int_halting = np.full(n_int, np.nan)
+    for i, total, halting in int_values:
+        int_total[i], int_halting[i] = total, halting
+    int_congestion = np.where(np.isnan(int_total), np.nan, _congestion(np.nan_to_num(int_total), np.nan_to_num(int_halting)))
+    side_vehicles = np.full(n_side, np.nan)
+    side_time = np.full(n_side, np.nan)
+    side_lights = np.zeros((n_side, len(LIGHTS)), dtype=np.int32)
+    for s, vehicles, remaining, light in side_values:
+        side_vehicles[s], side_time[s] = vehicles, remaining
+        if light >= 0:
+            side_lights[s, light] = 1
+
+    total = float(np.nansum(int_total))
+    halting = float(np.nansum(int_halting))
+    congestion = float(_congestion(total, halting))
+    return {
+        'ts': ts, 'sim_time': float(snapshot.get("time", 0.0)), 'count': 1,
+        'total': total, 'total_max': total, 'total_min': total,
+        'halting': halting, 'congestion': congestion, 'congestion_max': congestion,
+        'int_total': int_total, 'int_total_max': int_total, 'int_total_min': int_total,
+        'int_halting': int_halting, 'int_congestion': int_congestion, 'int_congestion_max': int_congestion,
+        'side_vehicles': side_vehicles, 'side_vehicles_max': side_vehicles, 'side_time': side_time,
+        'side_lights': side_lights,
+    }
+
+
+def _pad(values: np.ndarray, width: int, fill=np.nan) -> np.ndarray:
+    if values.shape[0] >= width:
+        return values
+    pad_shape = (width - values.shape[0],) + values.shape[1:]
+    return np.concatenate([values, np.full(pad_shape, fill, dtype=values.dtype)])
+
+
+def rows_to_columns(rows: List[Dict[str, Any]], schema: Schema) -> Dict[str, np.ndarray]:
+    """
+    Stacks rows (whose arrays may predate later schema growth) into columns.
+    """
+    n_int, n_side = len(schema.int_ids), len(schema.side_keys)
+    columns = {
+        'ts': np.array([row['ts'] for row in rows], dtype=np.float64),
+        'sim_time': np.array([row['sim_time'] for row in rows], dtype=np.float64),
+        'count': np.array([row['count'] for row in rows], dtype=np.int32),
+    }
+    for name in ROW_AGG:
+        columns[name] = np.array([row[name] for row in rows], dtype=np.float32)
+    for name in INT_AGG:
+        columns[name] = np.array([_pad(row[name], n_int) for row in rows], dtype=np.float32).reshape(len(rows), n_int)
+    for name in SIDE_AGG:
+        columns[name] = np.array([_pad(row[name], n_side) for row in rows], dtype=np.float32).reshape(len(rows), n_side)
+    columns['side_lights'] = np.array([_pad(row['side_lights'], n_side, 0) for row in rows],
+                                      dtype=np.int32).reshape(len(rows), n_side, len(LIGHTS))
+    columns['int_ids'] = np.array(schema.int_ids, dtype=str)
+    columns['side_int'] = np.array([k[0] for k in schema.side_keys], dtype=str)
+    columns['side_name'] = np.array([k[1] for k in schema.side_keys], dtype=str)
+    return columns
+
+
+class Rollup:
+    """
+    Folds raw rows into buckets of `seconds`; add() returns the finished
+    bucket as a row when a row of a later bucket arrives.
+    """
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.bucket: Optional[float] = None
+        self.acc: Dict[str, Any] = {}
+
+    def add(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        bucket = row['ts'] - row['ts'] % self.seconds
+        finished = None
+        if self.bucket is not None and bucket != self.bucket:
+            finished = self.finish()
+        if self.bucket is None:
+            self.bucket = bucket
+            self.acc = {'sim_time': row['sim_time'], 'count': 0}
+        self._fold(row)
+        return finished
+
+    def _fold(self, row: Dict[str, Any]):
+        acc = self.acc
+        acc['sim_time'] = row['sim_time']
+        acc['count'] += row['count']
+        for name, agg in list(ROW_AGG.items()) + list(INT_AGG.items()) + list(SIDE_AGG.items()):
+            value = np.asarray(row[name], dtype=float)
+            if name not in acc:
+                acc[name] = (np.where(np.isnan(value), 0.0, value), (~np.isnan(value)).astype(float)) if agg == 'mean' else value.copy()
+                continue
+            if agg == 'mean':
+                total, n = acc[name]
+                width = max(np.size(total), np.size(value))
+                if value.ndim:
+                    total, n, value = _pad(total, width, 0.0), _pad(n, width, 0.0), _pad(value, width)
+                acc[name] = (total + np.where(np.isnan(value), 0.0, value), n + ~np.isnan(value))
+            else:
+                current = acc[name]
+                if value.ndim:
+                    width = max(current.shape[0], value.shape[0])
+                    current, value = _pad(current, width), _pad(value, width)
+                acc[name] = np.fmax(current, value) if agg == 'max' else np.fmin(current, value)
+        lights = row['side_lights']
+        current = acc.get('side_lights')
+        if current is None:
+            acc['side_lights'] = lights.copy()
+        else:
+            width = max(current.shape[0], lights.shape[0])
+            acc['side_lights'] = _pad(current, width, 0) + _pad(lights, width, 0)
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        if self.bucket is None:
+            return None
+        row = {'ts': self.bucket, 'sim_time': self.acc['sim_time'], 'count': self.acc['count'],
+               'side_lights': self.acc['side_lights']}
+        for name, agg in list(ROW_AGG.items()) + list(INT_AGG.items()) + list(SIDE_AGG.items()):
+            value = self.acc[name]
+            if agg == 'mean':
+                total, n = value
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    value = np.where(n > 0, total / np.where(n > 0, n, 1), np.nan)
+            row[name] = value if np.ndim(value) else float(value)
+        self.bucket, self.acc = None, {}
+        return row
+
+
+# -------------------------
+# Chunk files
+# -------------------------
+def _chunk_name(lo: float, hi: float, n: int, generation: int, serial: str) -> str:
+    return f"{int(np.floor(lo))}_{int(np.ceil(hi))}_{n}_{generation}_{serial}.npz"
+
+
+def _parse_chunk(path: str) -> Tuple[int, int, int, int]:
+    lo, hi, n, generation = os.path.basename(path).split('_')[:4]
+    return int(lo), int(hi), int(n), int(generation)
+
+
+def _write_npz(path: str, columns: Dict[str, np.ndarray]):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **columns)
+    os.replace(tmp, path)
+
+
+def live_chunks(partition_dir: str) -> List[str]:
+    """
+    Chunk files of a partition, minus those a compaction has already merged
+    into a newer-generation file (left behind if it was interrupted, or
+    listed just before it deleted them).
+    """
+    chunks = [(path, _parse_chunk(path)) for path in glob.glob(os.path.join(partition_dir, '*.npz'))]
+    live = []
+    for path, (lo, hi, _, generation) in chunks:
+        superseded = any(g > generation and l <= lo and hi <= h for other, (l, h, _, g) in chunks if other != path)
+        if not superseded:
+            live.append(path)
+    return sorted(live, key=lambda path: _parse_chunk(path)[:2])
+
+
+def merge_columns(parts: Sequence[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Concatenates column sets with different intersection/side schemas onto
+    the union schema, sorted by time.
+    """
+    schema = Schema()
+    for part in parts:
+        for int_id in part['int_ids']:
+            schema.int_col(str(int_id))
+        for key in zip(part['side_int'], part['side_name']):
+            schema.side_col((str(key[0]), str(key[1])))
+    n_int, n_side = len(schema.int_ids), len(schema.side_keys)
+    merged: Dict[str, List[np.ndarray]] = {}
+    for part in parts:
+        n = len(part['ts'])
+        int_cols = np.array([schema.int_index[str(i)] for i in part['int_ids']], dtype=np.int64)
+        side_cols = np.array([schema.side_index[(str(a), str(b))] for a, b in zip(part['side_int'], part['side_name'])], dtype=np.int64)
+        for name in ('ts', 'sim_time', 'count', *ROW_AGG):
+            merged.setdefault(name, []).append(part[name])
+        for name in INT_AGG:
+            block = np.full((n, n_int), np.nan, dtype=np.float32)
+            block[:, int_cols] = part[name]
+            merged.setdefault(name, []).append(block)
+        for name in SIDE_AGG:
+            block = np.full((n, n_side), np.nan, dtype=np.float32)
+            block[:, side_cols] = part[name]
+            merged.setdefault(name, []).append(block)
+        block = np.zeros((n, n_side, len(LIGHTS)), dtype=np.int32)
+        block[:, side_cols] = part['side_lights']
+        merged.setdefault('side_lights', []).append(block)
+
+    if not parts:
+        columns = rows_to_columns([], schema)
+    else:
+        columns = {name: np.concatenate(blocks) for name, blocks in merged.items()}
+    order = np.argsort(columns['ts'], kind='stable')
+    columns = {name: values[order] for name, values in columns.items()}
+    columns['int_ids'] = np.array(schema.int_ids, dtype=str)
+    columns['side_int'] = np.array([k[0] for k in schema.side_keys], dtype=str)
+    columns['side_name'] = np.array([k[1] for k in schema.side_keys], dtype=str)
+    return columns
+
+
+# -------------------------
+# Store
+# -------------------------
+class HistoryStore:
+    """
+    Append-only, time-partitioned columnar history of the dashboard
+    snapshots.
+
+    record() turns every snapshot into one raw row: row-level totals plus
+    per-intersection and per-side arrays. Rollups to 1 min and 15 min buckets
+    (means, maxima, minima, light-state counts) are maintained incrementally
+    as rows arrive. Every FLUSH_SECONDS the buffered rows of each
+    resolution are written as one .npz chunk per partition
+    (<root>/<resolution>/<UTC day, or month for 15 min>/). Chunks are merged
+    in generations: once a partition holds more than COMPACT_AT chunks of one
+    generation they become one chunk of the next, so the file count stays
+    small without rewriting a whole day on every flush.
+
+    Query windows are half-open, [start, end). query() picks the finest
+    resolution that covers the window in at most max_points rows, so a multi-day range reads a few 15 min chunks instead of
+    every raw snapshot. A store opened read-only (e.g. by the history API
+    server) sees everything flushed so far.
+    """
+
+    def __init__(self, root: str = HISTORY_DIR, flush_seconds: float = FLUSH_SECONDS, read_only: bool = False):
+        self.root = root
+        self.flush_seconds = flush_seconds
+        self.read_only = read_only
+        self.schema = Schema()
+        self.buffers: Dict[str, List[Dict[str, Any]]] = {level: [] for level, _ in LEVELS}
+        self.rollups = {level: Rollup(seconds) for level, seconds in LEVELS if seconds > 1}
+        self.last_flush = time.time()
+        self.serial = 0
+        self.cache: "OrderedDict[str, Dict[str, np.ndarray]]" = OrderedDict()
+        self.stats = {'recorded': 0, 'chunks_written': 0, 'compactions': 0}
+        if not read_only:
+            for level, _ in LEVELS:
+                os.makedirs(os.path.join(root, level), exist_ok=True)
+
+    # --- Writing ---
+    def record(self, snapshot: dict, ts: Optional[float] = None):
+        row = snapshot_row(snapshot, time.time() if ts is None else ts, self.schema)
+        self.buffers['raw'].append(row)
+        for level, rollup in self.rollups.items():
+            finished = rollup.add(row)
+            if finished is not None:
+                self.buffers[level].append(finished)
+        self.stats['recorded'] += 1
+        if time.time() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.time()
+        for level, rows in self.buffers.items():
+            if not rows:
+                continue
+            columns = rows_to_columns(rows, self.schema)
+            partitions = np.array([_partition(level, ts) for ts in columns['ts']])
+            for name in np.unique(partitions):
+                mask = partitions == name
+                part = {column: (values[mask] if column not in ('int_ids', 'side_int', 'side_name') else values)
+                        for column, values in columns.items()}
+                self._write_chunk(level, str(name), part)
+                self.compact(level, str(name))
+            self.buffers[level] = []
+
+    def _write_chunk(self, level: str, partition_name: str, columns: Dict[str, np.ndarray], generation: int = 0):
+        partition = os.path.join(self.root, level, partition_name)
+        os.makedirs(partition, exist_ok=True)
+        self.serial += 1
+        ts = columns['ts']
+        path = os.path.join(partition, _chunk_name(ts[0], ts[-1], len(ts), generation, f"{os.getpid()}-{self.serial}"))
+        _write_npz(path, columns)
+        self._remember(path, columns) # Compaction will read it back soon
+        self.stats['chunks_written'] += 1
+
+    def compact(self, level: str, partition_name: str):
+        """
+        Merges every generation of a partition that has more than COMPACT_AT
+        chunks into one chunk of the next generation. The merged file is
+        written before the sources are deleted; readers skip sources it
+        supersedes.
+        """
+        partition = os.path.join(self.root, level, partition_name)
+        generation = 0
+        while True:
+            chunks = live_chunks(partition)
+            if not any(_parse_chunk(path)[3] >= generation for path in chunks):
+                return
+            sources = [path for path in chunks if _parse_chunk(path)[3] == generation]
+            if len(sources) > COMPACT_AT:
+                merged = merge_columns([self._load(path) for path in sources])
+                self._write_chunk(level, partition_name, merged, generation + 1)
+                for path in sources:
+                    os.remove(path)
+                    self.cache.pop(path, None)
+                self.stats['compactions'] += 1
+            generation += 1
+
+    def close(self):
+        for level, rollup in self.rollups.items():
+            finished = rollup.finish()
+            if finished is not None:
+                self.buffers[level].append(finished)
+        self.flush()
+
+    # --- Reading ---
+    def _load(self, path: str) -> Dict[str, np.ndarray]:
+        if path in self.cache:
+            self.cache.move_to_end(path)
+            return self.cache[path]
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files}
+        self._remember(path, columns)
+        return columns
+
+    def _remember(self, path: str, columns: Dict[str, np.ndarray]):
+        self.cache[path] = columns
+        if len(self.cache) > CACHE_CHUNKS:
+            self.cache.popitem(last=False)
+
+    def _chunks(self, level: str, start: float, end: float) -> List[str]:
+        chunks = []
+        for partition in sorted(glob.glob(os.path.join(self.root, level, '*'))):
+            first, after = _partition_bounds(level, os.path.basename(partition))
+            if first >= end or after <= start:
+                continue
+            for path in live_chunks(partition):
+                lo, hi, _, _ = _parse_chunk(path)
+                if lo < end and hi >= start:
+                    chunks.append(path)
+        return chunks
+
+    def _load_chunks(self, level: str, start: float, end: float) -> List[Dict[str, np.ndarray]]:
+        """
+        The columns of every chunk of [start, end). The writer may compact a
+        partition between listing and reading it and delete a listed chunk;
+        the chunks are then listed again, which finds the merged file instead.
+        """
+        return self._relisting(lambda: [self._load(path) for path in self._chunks(level, start, end)])
+
+    @staticmethod
+    def _relisting(read):
+        # Calls read(), which lists and loads chunks, again when a listed chunk vanished
+        for attempt in range(LOAD_ATTEMPTS):
+            try:
+                return read()
+            except FileNotFoundError:
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+
+    def estimate_rows(self, level: str, start: float, end: float) -> float:
+        """
+        Rows of a resolution in [start, end), from the chunk file names only.
+        """
+        rows = 0.0
+        for path in self._chunks(level, start, end):
+            lo, hi, n, _ = _parse_chunk(path)
+            overlap = min(hi, end) - max(lo, start)
+            rows += n if hi <= lo else n * max(overlap, 0) / (hi - lo)
+        rows += sum(1 for row in self.buffers[level] if start <= row['ts'] < end)
+        return rows
+
+    def time_range(self) -> Optional[Tuple[float, float]]:
+        # A [start, end) window holding every row. The 15 min buckets bound
+        # everything; raw rows still buffered may be newer
+        bounds = [_parse_chunk(path)[:2] for level, _ in LEVELS
+                  for partition in glob.glob(os.path.join(self.root, level, '*')) for path in live_chunks(partition)]
+        buffered = [row['ts'] for rows in self.buffers.values() for row in rows]
+        lows = [lo for lo, _ in bounds] + buffered
+        highs = [hi for _, hi in bounds] + buffered
+        return (float(min(lows)), float(max(highs)) + 1.0) if lows else None
+
+    def pick_level(self, start: float, end: float, max_points: int = MAX_POINTS) -> str:
+        for level, _ in LEVELS:
+            if self.estimate_rows(level, start, end) <= max_points:
+                return level
+        return LEVELS[-1][0]
+
+    def query(self, start: float, end: float, resolution: Optional[str] = None, max_points: int = MAX_POINTS,
+              intersections: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Columns of [start, end) (epoch seconds) at `resolution`, or at the
+        finest one that fits in max_points rows. Returns the merge_columns()
+        arrays plus 'resolution' and 'bucket_seconds'; with `intersections`
+        only those intersections (and their sides) are kept.
+        """
+        level = resolution or self.pick_level(start, end, max_points)
+        if level not in dict(LEVELS):
+            raise ValueError(f"Unknown resolution '{level}', expected one of {[name for name, _ in LEVELS]}")
+        parts = self._load_chunks(level, start, end)
+        if self.buffers[level]:
+            parts.append(rows_to_columns(self.buffers[level], self.schema))
+        columns = _in_window(merge_columns(parts), level, start, end)
+        if intersections is not None:
+            wanted = set(map(str, intersections))
+            int_keep = np.array([i in wanted for i in columns['int_ids']], dtype=bool)
+            side_keep = np.array([i in wanted for i in columns['side_int']], dtype=bool)
+            for name in INT_AGG:
+                columns[name] = columns[name][:, int_keep]
+            for name in (*SIDE_AGG, 'side_lights'):
+                columns[name] = columns[name][:, side_keep]
+            columns['int_ids'] = columns['int_ids'][int_keep]
+            columns['side_int'] = columns['side_int'][side_keep]
+            columns['side_name'] = columns['side_name'][side_keep]
+        columns['resolution'] = level
+        columns['bucket_seconds'] = dict(LEVELS)[level]
+        return columns
+
+    def page(self, start: float, end: float, level: str, offset: int, limit: int,
+             newest_first: bool = True) -> Tuple[Dict[str, Any], int]:
+        """
+        Rows offset .. offset + limit of [start, end) at `level`, counted
+        from the newest row when newest_first, in time order, and the number
+        of rows in the window. The chunk file names give the row count of
+        every chunk inside the window, so only the chunks the window's ends
+        cut through and those holding the page are read. Chunks of a level
+        hold consecutive stretches of time (one writer per store).
+        """
+        if level not in dict(LEVELS):
+            raise ValueError(f"Unknown resolution '{level}', expected one of {[name for name, _ in LEVELS]}")
+
+        def read():
+            # (rows in the window, loader of those rows) per chunk, in time order
+            segments = []
+            for path in self._chunks(level, start, end):
+                lo, hi, n, _ = _parse_chunk(path)
+                if start <= lo and hi < end:
+                    segments.append((n, lambda path=path: self._load(path)))
+                else:
+                    columns = _in_window(self._load(path), level, start, end)
+                    segments.append((len(columns['ts']), lambda columns=columns: columns))
+            if self.buffers[level]:
+                columns = _in_window(rows_to_columns(self.buffers[level], self.schema), level, start, end)
+                segments.append((len(columns['ts']), lambda columns=columns: columns))
+            total = sum(n for n, _ in segments)
+            first = max(total - offset - limit, 0) if newest_first else offset
+            after = max(total - offset, 0) if newest_first else min(offset + limit, total)
+            parts, position = [], 0
+            for n, load in segments:
+                if position < after and position + n > first:
+                    columns = load()
+                    parts.append({name: (values if name in ('int_ids', 'side_int', 'side_name')
+                                         else values[max(first - position, 0):after - position])
+                                  for name, values in columns.items()})
+                position += n
+            return merge_columns(parts), total
+
+        columns, total = self._relisting(read)
+        columns['resolution'] = level
+        columns['bucket_seconds'] = dict(LEVELS)[level]
+        return columns, total
+
+
+def _in_window(columns: Dict[str, np.ndarray], level: str, start: float, end: float) -> Dict[str, np.ndarray]:
+    # The rows of buckets overlapping [start, end) (a bucket's ts is its start)
+    mask = (columns['ts'] + dict(LEVELS)[level] > start) & (columns['ts'] < end)
+    return {name: (values if name in ('int_ids', 'side_int', 'side_name') else values[mask])
+            for name, values in columns.items()}
+
+
+# -------------------------
+# Snapshot view (the /historical-data format)
+# -------------------------
+def to_snapshots(columns: Dict[str, Any], rows: Sequence[int]) -> List[dict]:
+    """
+    Rebuilds sumo1.py-style snapshots ({createdAt, time, intersections})
+    for the given row indices; rollup rows carry bucket means and the most
+    frequent light of each side.
+    """
+    raw = columns['resolution'] == 'raw'
+    value = (lambda x: int(x)) if raw else (lambda x: round(float(x), 2))
+    side_by_int: Dict[str, List[int]] = {}
+    for s, int_id in enumerate(columns['side_int']):
+        side_by_int.setdefault(str(int_id), []).append(s)
+
+    snapshots = []
+    for r in rows:
+        intersections = []
+        for i, int_id in enumerate(columns['int_ids']):
+            total = columns['int_total'][r, i]
+            if np.isnan(total):
+                continue
+            sides = {}
+            for s in side_by_int.get(str(int_id), []):
+                vehicles = columns['side_vehicles'][r, s]
+                if np.isnan(vehicles):
+                    continue
+                lights = columns['side_lights'][r, s]
+                sides[str(columns['side_name'][s])] = {
+                    "number-of-vehicles": value(vehicles),
+                    "light": LIGHTS[int(np.argmax(lights))] if lights.sum() else "unknown",
+                    "time": round(float(columns['side_time'][r, s]), 2),
+                }
+            intersections.append({
+                "id": str(int_id),
+                "total-vehicles": value(total),
+                "halting-vehicles": value(columns['int_halting'][r, i]),
+                "sides": sides,
+            })
+        created = datetime.datetime.fromtimestamp(float(columns['ts'][r]), datetime.timezone.utc)
+        snapshots.append({
+            "createdAt": created.isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            "time": round(float(columns['sim_time'][r]), 2),
+            "intersections": intersections,
+        })
+    return snapshots
+
+
+def date_window(date: Optional[str], start: Optional[str] = None, end: Optional[str] = None,
+                now: Optional[float] = None) -> Tuple[Optional[float], Optional[float]]:
+    """
+    The frontend's date filter as epoch seconds; (None, None) for all data.
+    Custom ranges are whole UTC days, end date included.
+    """
+    now = time.time() if now is None else now
+    spans = {'last24hours': 86400, 'last7days': 7 * 86400, 'last30days': 30 * 86400}
+    if date in spans:
+        return now - spans[date], now
+    if date == 'custom' and start and end:
+        first = datetime.datetime.strptime(start, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+        last = datetime.datetime.strptime(end, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+        return first.timestamp(), (last + datetime.timedelta(days=1)).timestamp()
+    return None, None
+
+
+def historical_data(store: HistoryStore, page: int = 1, limit: int = 10, sort: str = 'latest',
+                    date: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None,
+                    intersection_id: Optional[str] = None, resolution: Optional[str] = 'raw') -> dict:
+    """
+    The /historical-data response: {data: [...snapshots], pagination: {...}}.
+    Every recorded snapshot by default; a coarser resolution pages through
+    bucket means instead, and None lets query() pick one. Without an
+    intersection filter only the chunks holding the page are read (see
+    HistoryStore.page); with one, the window is read to find the rows the
+    intersection is present in. Only the requested page is turned into
+    snapshot dicts.
+    """
+    lo, hi = date_window(date, start, end)
+    if lo is None:
+        bounds = store.time_range()
+        if bounds is None:
+            return {"data": [], "pagination": {"currentPage": 1, "totalPages": 1, "totalItems": 0}}
+        lo, hi = bounds
+    limit = max(int(limit), 1)
+    if intersection_id:
+        columns = store.query(lo, hi, resolution, intersections=[intersection_id])
+        present = ~np.isnan(columns['int_total']).all(axis=1) if columns['int_total'].shape[1] else np.zeros(len(columns['ts']), bool)
+        indices = np.flatnonzero(present)
+        if sort == 'latest':
+            indices = indices[::-1]
+        total_items = len(indices)
+        total_pages = max((total_items + limit - 1) // limit, 1)
+        page = min(max(int(page), 1), total_pages)
+        page_rows = indices[(page - 1) * limit:page * limit]
+    else:
+        level = resolution or store.pick_level(lo, hi)
+        newest_first = sort == 'latest'
+        page = max(int(page), 1)
+        columns, total_items = store.page(lo, hi, level, (page - 1) * limit, limit, newest_first)
+        total_pages = max((total_items + limit - 1) // limit, 1)
+        if page > total_pages:
+            page = total_pages # Past the end: the last page
+            columns, total_items = store.page(lo, hi, level, (page - 1) * limit, limit, newest_first)
+        page_rows = np.arange(len(columns['ts']))
+        if newest_first:
+            page_rows = page_rows[::-1]
+    return {
+        "data": to_snapshots(columns, page_rows),
+        "pagination": {"currentPage": page, "totalPages": total_pages, "totalItems": total_items},
+        "resolution": columns['resolution'],
+    }
+
+
+# -------------------------
+# History API server
+# -------------------------
+def create_app(store: HistoryStore):
+    from fastapi import FastAPI, HTTPException
+    from fastapi.middleware.cors import CORSMiddleware
+    from analytics import AnalyticsCache
+
+    analytics = AnalyticsCache(store)
+    app = FastAPI()
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:5173", "http://127.0.0.1:5173"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    @app.get("/historical-data")
+    async def get_historical_data(page: int = 1, limit: int = 10, sort: str = 'latest', date: Optional[str] = None,
+                                  start: Optional[str] = None, end: Optional[str] = None,
+                                  intersectionId: Optional[str] = None, resolution: str = 'raw'):
+        try:
+            return historical_data(store, page, limit, sort, date, start, end, intersectionId, resolution)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get("/analytics")
+    async def get_analytics(date: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None,
+                            resolution: Optional[str] = None, tzOffset: int = 0):
+        """The Analysis page's summaries of a window, computed and cached here (see analytics)."""
+        try:
+            return analytics.get(date, start, end, resolution, tzOffset)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get("/distinct-intersection-ids")
+    async def distinct_intersection_ids():
+        bounds = store.time_range()
+        if bounds is None:
+            return {"intersectionIds": []}
+        columns = store.query(bounds[0], bounds[1], LEVELS[-1][0])
+        return {"intersectionIds": sorted(str(i) for i in columns['int_ids'])}
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Historical dashboard snapshots: API server and inspection.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help="Serve /historical-data and /analytics from a history directory")
+    serve_parser.add_argument('--dir', default=HISTORY_DIR)
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=5000)
+
+    info_parser = sub.add_parser('info', help="Show what a history directory holds")
+    info_parser.add_argument('--dir', default=HISTORY_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        import uvicorn
+        if not os.path.isdir(args.dir):
+            sys.exit(f"No history at {args.dir}; run the simulation server first")
+        print(f"Serving the history in {args.dir} at http://{args.host}:{args.port}/historical-data")
+        uvicorn.run(create_app(HistoryStore(args.dir, read_only=True)), host=args.host, port=args.port)
+    else:
+        store = HistoryStore(args.dir, read_only=True)
+        bounds = store.time_range()
+        if bounds is None:
+            sys.exit(f"No history at {args.dir}")
+        print(f"{_day(bounds[0])} .. {_day(bounds[1] - 1)}")
+        for level, _ in LEVELS:
+            start = time.perf_counter()
+            columns = store.query(bounds[0], bounds[1], level)
+            print(f"  {level:<6} {len(columns['ts']):>9,} rows, {len(columns['int_ids'])} intersections, "
+                  f"read in {1000 * (time.perf_counter() - start):.1f} ms")
@@ -0,0 +1,129 @@
+import time
+import threading
+from typing import Any, Dict, Optional
+
+MODES = ("realtime", "multiplier", "unthrottled")
+DEFAULT_MODE = "realtime" # Demos follow the wall clock; use "unthrottled" for batch what-if runs
+DEFAULT_MULTIPLIER = 1.0
+BROADCAST_INTERVAL = 1.0 # Wall-clock seconds between two broadcasts, whatever the speed
+BROADCAST_SLACK = 0.1 # Share of the interval a step may come before its broadcast slot and still take it
+MAX_BEHIND = 1.0 # Seconds behind schedule after which the pacer stops trying to catch up
+
+
+class Pacer:
+    """
+    Paces the simulation loop against the wall clock and rate-limits the
+    broadcasts.
+
+    - realtime: one simulated second per wall-clock second
+    - multiplier: `multiplier` simulated seconds per wall-clock second
+    - unthrottled: as fast as SUMO steps
+
+    The simulation thread calls wait(sim_time) after every step, which
+    sleeps until the wall clock has caught up with the simulation (and
+    blocks while paused), and should_broadcast(sim_time) to decide whether
+    to publish a snapshot: one per slot of a broadcast_interval wall-clock
+    grid and only when simulated time moved on. The grid keeps its phase,
+    so a step that comes a little early or late doesn't push the following
+    broadcasts back; after a stall longer than an interval it restarts from
+    the next step instead of bursting. pause(), resume() and
+    set_speed() may be called from any thread and take effect immediately.
+    """
+
+    def __init__(self, mode: str = DEFAULT_MODE, multiplier: float = DEFAULT_MULTIPLIER,
+                 broadcast_interval: float = BROADCAST_INTERVAL):
+        self.lock = threading.Lock()
+        self.changed = threading.Event() # Interrupts a pacing sleep when the speed changes
+        self.running = threading.Event()
+        self.running.set()
+        self.broadcast_interval = broadcast_interval
+        self.mode = DEFAULT_MODE
+        self.multiplier = DEFAULT_MULTIPLIER
+        self.set_speed(mode, multiplier)
+        self.anchor: Optional[tuple] = None # (wall clock, simulation time) the schedule is counted from
+        self.sim_time = 0.0
+        self.next_broadcast_wall = float('-inf') # Start of the next broadcast slot
+        self.last_broadcast_sim: Optional[float] = None
+        self.broadcasts = 0
+        self.behind_resets = 0
+
+    # --- Control (any thread) ---
+    def set_speed(self, mode: str, multiplier: Optional[float] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown pacing mode '{mode}', expected one of {MODES}")
+        if multiplier is not None and multiplier <= 0:
+            raise ValueError("The speed multiplier must be positive")
+        with self.lock:
+            self.mode = mode
+            if mode == "realtime":
+                self.multiplier = 1.0
+            elif multiplier is not None:
+                self.multiplier = multiplier
+            self.anchor = None # Count the new speed from now
+        self.changed.set()
+
+    def pause(self):
+        self.running.clear()
+        self.changed.set()
+
+    def resume(self):
+        with self.lock:
+            self.anchor = None # Don't race to catch up on the time spent paused
+        self.running.set()
+        self.changed.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self.running.is_set()
+
+    # --- Simulation thread ---
+    def wait(self, sim_time: float):
+        """
+        Blocks until the simulation may advance past sim_time.
+        """
+        self.sim_time = sim_time
+        while True:
+            self.running.wait()
+            with self.lock:
+                if self.mode == "unthrottled":
+                    return
+                now = time.perf_counter()
+                if self.anchor is None:
+                    self.anchor = (now, sim_time)
+                    return
+                wall_anchor, sim_anchor = self.anchor
+                delay = wall_anchor + (sim_time - sim_anchor) / self.multiplier - now
+                if delay < -MAX_BEHIND:
+                    # SUMO can't keep up with this speed; follow it instead of bursting later
+                    self.anchor = (now, sim_time)
+                    self.behind_resets += 1
+                    return
+                self.changed.clear()
+            if delay <= 0:
+                return
+            if not self.changed.wait(delay) and not self.paused:
+                return
+
+    def should_broadcast(self, sim_time: float) -> bool:
+        now = time.perf_counter()
+        early = self.next_broadcast_wall - now
+        if early > BROADCAST_SLACK * self.broadcast_interval or sim_time == self.last_broadcast_sim:
+            return False
+        if early < -self.broadcast_interval:
+            self.next_broadcast_wall = now + self.broadcast_interval
+        else:
+            self.next_broadcast_wall += self.broadcast_interval
+        self.last_broadcast_sim = sim_time
+        self.broadcasts += 1
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "multiplier": self.multiplier,
+            "paused": self.paused,
+            "sim_time": self.sim_time,
+            "broadcast_interval_s": self.broadcast_interval,
+            "broadcasts": self.broadcasts,
+            "behind_resets": self.behind_resets,
+        }
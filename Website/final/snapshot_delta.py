@@ -0,0 +1,189 @@
+"""
+Delta protocol for the dashboard WebSocket.
+
+Instead of the full snapshot every tick, a client that connects with
+?protocol=delta receives
+
+    {"type": "keyframe", "seq": n, "data": <full snapshot>}
+
+every KEYFRAME_INTERVAL seconds (and whenever it needs one), and in between
+
+    {"type": "delta", "seq": n, "base": n - 1, "patch": {...}}
+
+where patch is a JSON merge patch (RFC 7396) holding only what changed:
+nested objects are merged key by key, null deletes a key and anything else
+replaces the value, e.g.
+
+    {"time": 42.0, "intersections": {"<id>": {"total-vehicles": 7,
+        "sides": {"side-<x>": {"light": "red", "time": 75.0}}}}}
+
+Patches are computed on the snapshot's keyed form:
+
+- Lists of objects with an "id" (the intersections) become objects keyed
+  by id, so an intersection appearing or disappearing doesn't touch any
+  other one (one added by a delta goes to the end of the list).
+- Every side's "time" countdown becomes the absolute simulation time of
+  the switch (snapshot time + countdown; negative "unknown" values are kept
+  as they are). A countdown changes every tick, its switch time only when
+  the light does, so a steady light costs nothing in a delta. The client
+  turns them back into countdowns from the snapshot's "time".
+
+Snapshots never contain null, so it always means a deletion. A client that
+sees a delta whose base isn't the last seq it applied has missed a message:
+it drops deltas and sends {"type": "keyframe_request"} until the next
+keyframe arrives. DeltaDecoder below is the reference implementation of
+the client side.
+"""
+
+import copy
+from typing import Any, Dict, Optional
+
+KEYFRAME_INTERVAL = 10.0 # Seconds between periodic keyframes
+KEYED_LISTS = ("intersections",) # Top-level lists addressed by their items' "id"
+
+Patch = Dict[str, Any]
+
+
+# -------------------------
+# Keyed form
+# -------------------------
+def _switch_times(intersection: dict, now: float, sign: int) -> dict:
+    # Countdowns to absolute switch times (sign=1) and back (sign=-1)
+    sides = intersection.get("sides")
+    if not isinstance(sides, dict):
+        return intersection
+    converted = {}
+    for name, side in sides.items():
+        countdown = side.get("time") if isinstance(side, dict) else None
+        if isinstance(countdown, (int, float)) and not isinstance(countdown, bool) and countdown >= 0:
+            side = {**side, "time": round(countdown + sign * now, 2)}
+        converted[name] = side
+    return {**intersection, "sides": converted}
+
+
+def index_snapshot(snapshot: dict) -> dict:
+    """
+    Copy of a snapshot in keyed form (see above), the form patches are
+    computed on and applied to. The input isn't modified.
+    """
+    indexed = dict(snapshot)
+    now = indexed.get("time")
+    for key in KEYED_LISTS:
+        items = indexed.get(key)
+        if isinstance(items, list) and all(isinstance(item, dict) and 'id' in item for item in items):
+            if isinstance(now, (int, float)):
+                items = [_switch_times(item, now, 1) for item in items]
+            indexed[key] = {str(item['id']): item for item in items}
+    return indexed
+
+
+def unindex_snapshot(indexed: dict) -> dict:
+    snapshot = dict(indexed)
+    now = snapshot.get("time")
+    for key in KEYED_LISTS:
+        if isinstance(snapshot.get(key), dict):
+            items = list(snapshot[key].values())
+            if isinstance(now, (int, float)):
+                items = [_switch_times(item, now, -1) for item in items]
+            snapshot[key] = items
+    return snapshot
+
+
+# -------------------------
+# Encoding
+# -------------------------
+def diff(prev: dict, curr: dict) -> Patch:
+    """
+    Merge patch that turns prev into curr. Objects on both sides are
+    compared key by key; anything else that differs is sent whole.
+    """
+    patch = {}
+    for key, value in curr.items():
+        if key not in prev:
+            patch[key] = value
+        elif prev[key] != value:
+            if isinstance(prev[key], dict) and isinstance(value, dict):
+                patch[key] = diff(prev[key], value)
+            else:
+                patch[key] = value
+    for key in prev:
+        if key not in curr:
+            patch[key] = None
+    return patch
+
+
+def snapshot_patch(prev: dict, curr: dict) -> Patch:
+    return diff(index_snapshot(prev), index_snapshot(curr))
+
+
+def keyframe_message(seq: int, snapshot: dict) -> dict:
+    return {"type": "keyframe", "seq": seq, "data": snapshot}
+
+
+def delta_message(seq: int, base: int, patch: Patch) -> dict:
+    return {"type": "delta", "seq": seq, "base": base, "patch": patch}
+
+
+# -------------------------
+# Decoding
+# -------------------------
+def apply_patch(target: dict, patch: Patch) -> dict:
+    """
+    Applies a merge patch in place to a snapshot in keyed form and returns
+    it. Objects in the patch are copied, never shared with the result.
+    """
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict):
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = target[key] = {}
+            apply_patch(child, value)
+        else:
+            target[key] = value
+    return target
+
+
+class DeltaDecoder:
+    """
+    Reference client for the delta protocol. feed() takes every decoded
+    message and returns the current full snapshot, or None while it is
+    waiting for a keyframe after a gap (then keyframe_request() is the
+    message to send).
+    """
+
+    def __init__(self):
+        self.seq: Optional[int] = None
+        self.state: Optional[dict] = None # Keyed form
+        self.waiting = True
+        self.keyframes = 0
+        self.deltas = 0
+        self.gaps = 0
+
+    def feed(self, message: dict) -> Optional[dict]:
+        if message.get("type") == "keyframe":
+            self.state = index_snapshot(copy.deepcopy(message["data"]))
+            self.seq = message["seq"]
+            self.waiting = False
+            self.keyframes += 1
+            return self.snapshot()
+        if message.get("type") != "delta":
+            raise ValueError(f"Unknown message type: {message.get('type')}")
+        if self.waiting:
+            return None
+        if message["base"] != self.seq:
+            self.gaps += 1
+            self.waiting = True
+            return None
+        apply_patch(self.state, message["patch"])
+        self.seq = message["seq"]
+        self.deltas += 1
+        return self.snapshot()
+
+    def snapshot(self) -> Optional[dict]:
+        return unindex_snapshot(self.state) if self.state is not None else None
+
+    @staticmethod
+    def keyframe_request() -> dict:
+        return {"type": "keyframe_request"}
@@ -0,0 +1,71 @@
+"""
+Topic subscriptions for the sumo1.py dashboard WebSocket.
+
+A client narrows what it receives by sending
+
+    {"type": "subscribe", "intersections": ["J12", "J13"], "fields": ["lights", "counts"]}
+
+where either key may be left out (or null) for "all". The pair of
+intersection set and field groups is the client's topic; the broadcaster
+projects each snapshot once per topic, and clients on the same topic share
+the encoded payload.
+"""
+
+from typing import Dict, FrozenSet, Optional, Tuple
+
+# Field group -> fields kept on the intersection and on each of its sides
+FIELD_GROUPS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "lights": {"intersection": (), "sides": ("light", "time")},
+    "counts": {"intersection": ("total-vehicles",), "sides": ("number-of-vehicles",)},
+    "halting": {"intersection": ("halting-vehicles",), "sides": ()},
+}
+ALWAYS = ("id", "roads") # Kept whatever the field groups
+
+Topic = Tuple[Optional[FrozenSet[str]], Optional[FrozenSet[str]]] # (intersection ids, field groups); None = all
+ALL: Topic = (None, None)
+
+
+def parse_subscription(request: dict) -> Topic:
+    """
+    Topic of a subscribe message. Raises ValueError on a malformed one.
+    """
+    intersections = request.get("intersections")
+    fields = request.get("fields")
+    if intersections is not None:
+        if not isinstance(intersections, list):
+            raise ValueError("'intersections' must be a list of intersection ids")
+        intersections = frozenset(str(i) for i in intersections)
+    if fields is not None:
+        if not isinstance(fields, list) or any(f not in FIELD_GROUPS for f in fields):
+            raise ValueError(f"'fields' must be a list of {sorted(FIELD_GROUPS)}")
+        fields = frozenset(fields)
+        if fields == frozenset(FIELD_GROUPS):
+            fields = None
+    return intersections, fields
+
+
+def project(snapshot: dict, topic: Topic) -> dict:
+    """
+    The part of a snapshot a topic covers. Snapshots without intersections
+    (the sumo.py format) are returned unchanged.
+    """
+    ids, groups = topic
+    if topic == ALL or "intersections" not in snapshot:
+        return snapshot
+    intersections = snapshot["intersections"]
+    if ids is not None:
+        intersections = [i for i in intersections if i["id"] in ids]
+    if groups is not None:
+        keep = set(ALWAYS).union(*(FIELD_GROUPS[g]["intersection"] for g in groups))
+        keep_side = set().union(*(FIELD_GROUPS[g]["sides"] for g in groups))
+        projected = []
+        for intersection in intersections:
+            item = {k: v for k, v in intersection.items() if k in keep}
+            if keep_side:
+                item["sides"] = {
+                    side: {k: v for k, v in values.items() if k in keep_side}
+                    for side, values in intersection.get("sides", {}).items()
+                }
+            projected.append(item)
+        intersections = projected
+    return {**snapshot, "intersections": intersections}
@@ -6,43 +6,20 @@ import os
 import sys
 import threading
 import asyncio
-from typing import List
+from typing import Optional
 
 import traci
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-
-# --- Connection Manager for WebSockets ---
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-    async def broadcast(self, data: dict):
-        # Create a list of connections to remove if they are disconnected
-        disconnected_connections = []
-        for connection in self.active_connections:
-            try:
-                # CHANGED: The correct method is send_json(), not json()
-                await connection.send_json(data)
-            except (WebSocketDisconnect, RuntimeError) as e:
-                # ADDED: Gracefully handle clients that disconnected unexpectedly
-                print(f"Error sending to a client: {e}. Marking for removal.")
-                disconnected_connections.append(connection)
-        
-        # ADDED: Remove disconnected clients outside the loop
-        for connection in disconnected_connections:
-            self.disconnect(connection)
-
-manager = ConnectionManager()
+from pacing import Pacer
+from tls_timing import TimeToGreenTables
+from ws_broadcast import Broadcaster, negotiate_format
+
+# Latest-value channel: the SUMO thread publishes, every client is sent the newest snapshot
+manager = Broadcaster()
+time_to_green_tables = TimeToGreenTables() # Per-TLS time-to-green matrices, rebuilt on program change
+pacer = Pacer() # Real-time by default; see the /control endpoints
 main_loop = None # To hold the main asyncio event loop
 
 # --- FastAPI App ---
@@ -62,6 +39,11 @@ if 'SUMO_HOME' in os.environ:
 else:
     sys.exit("Please declare the environment variable 'SUMO_HOME'")
 
+# The SUMO instance pool lives with the RL code; with $SUMO_POOL set the
+# simulation thread gets a pre-launched instance instead of starting SUMO
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Reinforcement Learning'))
+import sumo_pool
+
 sumo_binary = "sumo-gui"
 sumo_config_file = "map2/RL.sumocfg"
 
@@ -76,7 +58,7 @@ detector_groups = {
 def run_sumo():
     global main_loop
     try:
-        traci.start([sumo_binary, "-c", sumo_config_file])
+        sumo_pool.connect([sumo_binary, "-c", sumo_config_file])
         print("SUMO simulation started successfully.")
     except traci.TraCIException:
         print(f"Error starting SUMO. Check path: {sumo_config_file}")
@@ -88,28 +70,23 @@ def run_sumo():
         return
 
     step = 0
-    # Push data every simulation second for a real-time feel
-    last_update_time = -1 
     while step < 50000:
         try: # ADDED: Error handling within the loop
             traci.simulationStep()
             step += 1
             current_time = traci.simulation.getTime()
+            # Keep to the selected speed (and hold here while paused)
+            pacer.wait(current_time)
 
-            if current_time - last_update_time >= 1:
+            # At most one broadcast per BROADCAST_INTERVAL of wall-clock time
+            if pacer.should_broadcast(current_time):
                 # Only broadcast if there are connected clients
                 if manager.active_connections:
                     data = collect_step_data()
                     
-                    # Use asyncio.run_coroutine_threadsafe to safely call the async broadcast
-                    # function from this synchronous thread.
-                    future = asyncio.run_coroutine_threadsafe(manager.broadcast(data), main_loop)
-                    
-                    # .result() will block this thread until the broadcast is done and
-                    # will raise any exceptions that occurred in the broadcast task.
-                    future.result() 
-                
-                last_update_time = current_time
+                    # Hand the snapshot to the event loop and keep simulating; the
+                    # clients' send tasks deliver it (or a newer one) on their own.
+                    manager.publish(data)
 
         except traci.TraCIException as e:
             print(f"A TraCI error occurred at step {step}: {e}")
@@ -127,23 +104,57 @@ def run_sumo():
 # --- FastAPI WebSocket Endpoint ---
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # ?protocol=delta: keyframes plus diffs of the changed fields (see snapshot_delta)
+    # ?format=msgpack (or the "msgpack" subprotocol): binary frames instead of JSON
+    fmt, subprotocol = negotiate_format(websocket)
+    await manager.connect(websocket, websocket.query_params.get("protocol", "full"), fmt, subprotocol)
     print("A client connected.")
     try:
         while True:
             # Keep the connection alive by waiting for a message.
             # A client-side ping/pong mechanism is a good practice.
-            await websocket.receive_text()
+            message = await websocket.receive_text()
+            manager.receive(websocket, message) # e.g. a delta client asking for a keyframe
     except WebSocketDisconnect:
         manager.disconnect(websocket)
         print("A client disconnected.")
 
+@app.get("/ws/stats")
+async def websocket_stats():
+    """Per-client delivery counters (frames sent, dropped, lag) and bytes / encode time per wire format."""
+    return manager.stats()
+
+# --- Pacing Control ---
+@app.get("/control")
+async def pacing_status():
+    return pacer.status()
+
+@app.post("/control/pause")
+async def pause_simulation():
+    pacer.pause()
+    return pacer.status()
+
+@app.post("/control/resume")
+async def resume_simulation():
+    pacer.resume()
+    return pacer.status()
+
+@app.post("/control/speed")
+async def set_simulation_speed(mode: str, multiplier: Optional[float] = None):
+    """mode: realtime, multiplier (with e.g. multiplier=10) or unthrottled."""
+    try:
+        pacer.set_speed(mode, multiplier)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return pacer.status()
+
 # --- FastAPI Startup Event ---
 @app.on_event("startup")
 async def startup_event():
     """On startup, get the running event loop and start the SUMO thread."""
     global main_loop
     main_loop = asyncio.get_running_loop()
+    manager.bind(main_loop)
     sumo_thread = threading.Thread(target=run_sumo, daemon=True)
     sumo_thread.start()
 
@@ -156,35 +167,13 @@ def get_direction_vehicle_count(direction_key):
         except traci.TraCIException: pass
     return len(vehicle_ids)
 
-def calculate_time_to_green(tls_id, lane_id):
-    try:
-        logic = traci.trafficlight.getCompleteRedYellowGreenDefinition(tls_id)
-        if not logic: return -1.0
-        program = logic[0]; phases = program.phases
-        controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
-        if lane_id not in controlled_lanes: return -1.0
-        lane_index = controlled_lanes.index(lane_id)
-        current_time = traci.simulation.getTime()
-        next_switch_time = traci.trafficlight.getNextSwitch(tls_id)
-        time_until_green = next_switch_time - current_time
-        current_phase_index = traci.trafficlight.getPhase(tls_id)
-        num_phases = len(phases)
-        for i in range(1, num_phases + 1):
-            next_phase_index = (current_phase_index + i) % num_phases
-            phase_state_string = phases[next_phase_index].state
-            lane_state_in_phase = phase_state_string[lane_index].lower()
-            if 'g' in lane_state_in_phase:
-                return time_until_green
-            time_until_green += phases[next_phase_index].duration
-        return -1.0
-    except traci.TraCIException: return -1.0
-
 def collect_step_data():
     step_data = {"current_time": traci.simulation.getTime(), "directions": {}}
     for direction_key in detector_groups:
         step_data["directions"][direction_key.capitalize()] = {"vehicle_count": get_direction_vehicle_count(direction_key)}
     for tls_id in traci.trafficlight.getIDList():
         processed_directions = set()
+        tls_time_to_green = None # Every link's time to green, gathered once per TLS when needed
         for lane in traci.trafficlight.getControlledLanes(tls_id):
             try:
                 direction_key = lane.split('_')[0]
@@ -204,7 +193,9 @@ def collect_step_data():
                         step_data["directions"][direction_capitalized]["state"] = "GREEN"
                         step_data["directions"][direction_capitalized]["time"] = next_switch - traci.simulation.getTime()
                     elif 'r' in state:
-                        time_to_green = calculate_time_to_green(tls_id, lane)
+                        if tls_time_to_green is None:
+                            tls_time_to_green = time_to_green_tables.time_to_green(tls_id)
+                        time_to_green = tls_time_to_green[lane_index] if lane_index < len(tls_time_to_green) else -1.0
                         step_data["directions"][direction_capitalized]["state"] = "RED"
                         step_data["directions"][direction_capitalized]["time_until_green"] = time_to_green
                     elif 'y' in state:
@@ -3,38 +3,27 @@ import sys
 import threading
 import asyncio
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 from collections import defaultdict
 import traci
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-    async def broadcast(self, data: dict):
-        disconnected_connections = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(data)
-            except (WebSocketDisconnect, RuntimeError) as e:
-                print(f"Error sending to a client: {e}. Marking for removal.")
-                disconnected_connections.append(connection)
-        
-        for connection in disconnected_connections:
-            self.disconnect(connection)
-
-manager = ConnectionManager()
+from history_store import HistoryStore
+from pacing import Pacer
+from tls_timing import TimeToGreenTables
+from topology import build_topology_index
+from ws_broadcast import Broadcaster, negotiate_format
+
+# Latest-value channel: the SUMO thread publishes, every client is sent the newest snapshot
+manager = Broadcaster()
+time_to_green_tables = TimeToGreenTables() # Per-TLS time-to-green matrices, rebuilt on program change
+pacer = Pacer() # Real-time by default; see the /control endpoints
+# A sample of every intersection is persisted every HISTORY_INTERVAL simulated seconds;
+# `python history_store.py serve` exposes it as /historical-data on :5000
+RECORD_HISTORY = True
+HISTORY_INTERVAL = 1.0
+history = HistoryStore() if RECORD_HISTORY else None
 main_loop = None # To hold the main asyncio event loop
 
 # --- FastAPI App ---
@@ -53,6 +42,11 @@ if 'SUMO_HOME' in os.environ:
 else:
     sys.exit("Please declare the environment variable 'SUMO_HOME'")
 
+# The SUMO instance pool lives with the RL code; with $SUMO_POOL set the
+# simulation thread gets a pre-launched instance instead of starting SUMO
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Reinforcement Learning'))
+import sumo_pool
+
 sumo_binary = "sumo-gui" # or "sumo" for no GUI
 # !!! IMPORTANT: Make sure this path is correct for your project !!!
 sumo_config_file = "map6/RL.sumocfg"
@@ -61,29 +55,45 @@ sumo_config_file = "map6/RL.sumocfg"
 def run_sumo():
     global main_loop
     try:
-        traci.start([sumo_binary, "-c", sumo_config_file])
+        sumo_pool.connect([sumo_binary, "-c", sumo_config_file])
         print("SUMO simulation started successfully.")
     except traci.TraCIException as e:
         print(f"Error starting SUMO. Check path: {sumo_config_file}. Error: {e}")
         return
 
+    # The network doesn't change during the run: resolve it once, not every broadcast
+    try:
+        topology = build_topology_index()
+        print(f"Topology index built: {len(topology)} signalized intersections.")
+    except traci.TraCIException as e:
+        print(f"Error building the topology index: {e}")
+        traci.close()
+        return
+
     step = 0
-    last_update_time = -1 
+    next_history_time = float('-inf')
     # Main simulation loop
     while step < 50000: # Increase steps for a longer simulation
         try:
             traci.simulationStep()
             step += 1
             current_time = traci.simulation.getTime()
-
-            # Broadcast data every 1 simulation second
-            if current_time - last_update_time >= 1:
-                if manager.active_connections:
-                    data = collect_all_intersections_data()
-                    future = asyncio.run_coroutine_threadsafe(manager.broadcast(data), main_loop)
-                    future.result() # Wait for the broadcast to complete
-                
-                last_update_time = current_time
+            # Keep to the selected speed (and hold here while paused)
+            pacer.wait(current_time)
+
+            # Broadcast once per BROADCAST_INTERVAL of wall-clock time, record the
+            # history once per HISTORY_INTERVAL of simulated time, whatever the speed
+            broadcast = pacer.should_broadcast(current_time) and bool(manager.active_connections)
+            record = history is not None and current_time >= next_history_time
+            if record or broadcast:
+                # The history keeps every intersection; other steps only collect
+                # the ones some client subscribed to (all by default)
+                data = collect_all_intersections_data(topology, None if record else manager.wanted_intersections)
+                if record:
+                    history.record(data)
+                    next_history_time = current_time - current_time % HISTORY_INTERVAL + HISTORY_INTERVAL
+                if broadcast:
+                    manager.publish(data) # Never waits for the clients
 
         except traci.TraCIException as e:
             print(f"A TraCI error occurred at step {step}: {e}")
@@ -93,111 +103,94 @@ def run_sumo():
             break
             
     traci.close()
+    if history is not None:
+        history.close()
     print("SUMO simulation finished.")
 
 # --- FastAPI WebSocket Endpoint ---
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # ?protocol=delta: keyframes plus diffs of the changed fields (see snapshot_delta)
+    # ?format=msgpack (or the "msgpack" subprotocol): binary frames instead of JSON
+    # Send {"type": "subscribe", "intersections": [...], "fields": [...]} to get a subset (see subscriptions)
+    fmt, subprotocol = negotiate_format(websocket)
+    await manager.connect(websocket, websocket.query_params.get("protocol", "full"), fmt, subprotocol)
     print(f"Client connected: {websocket.client}")
     try:
         while True:
             # Keep connection alive by waiting for any message (or just pass)
-            await websocket.receive_text()
+            message = await websocket.receive_text()
+            manager.receive(websocket, message) # Subscriptions and keyframe requests
     except WebSocketDisconnect:
         manager.disconnect(websocket)
         print(f"Client disconnected: {websocket.client}")
 
+@app.get("/ws/stats")
+async def websocket_stats():
+    """Per-client delivery counters (frames sent, dropped, lag) and bytes / encode time per wire format."""
+    return manager.stats()
+
+# --- Pacing Control ---
+@app.get("/control")
+async def pacing_status():
+    return pacer.status()
+
+@app.post("/control/pause")
+async def pause_simulation():
+    pacer.pause()
+    return pacer.status()
+
+@app.post("/control/resume")
+async def resume_simulation():
+    pacer.resume()
+    return pacer.status()
+
+@app.post("/control/speed")
+async def set_simulation_speed(mode: str, multiplier: Optional[float] = None):
+    """mode: realtime, multiplier (with e.g. multiplier=10) or unthrottled."""
+    try:
+        pacer.set_speed(mode, multiplier)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return pacer.status()
+
 # --- FastAPI Startup Event ---
 @app.on_event("startup")
 async def startup_event():
     global main_loop
     main_loop = asyncio.get_running_loop()
+    manager.bind(main_loop)
     # Run the SUMO simulation in a separate thread
     sumo_thread = threading.Thread(target=run_sumo, daemon=True)
     sumo_thread.start()
 
 # --- HELPER FUNCTIONS ---
 
-def group_lanes_by_approach(lanes: List[str]) -> Dict[str, List[str]]:
-    """
-    Groups lanes by their approach edge ID prefix.
-    Example: '16_50_0' and '16_50_1' are grouped under '16'.
-    """
-    grouped = defaultdict(list)
-    for lane_id in lanes:
-        # Assuming lane/edge IDs are in the format 'prefix_junction_...'
-        prefix = lane_id.split('_')[0]
-        grouped[prefix].append(lane_id)
-    return dict(grouped)
-
-
-def calculate_time_to_green(tls_id: str, lane_id: str, controlled_lanes: List[str], phases: List[Any]) -> float:
-    """Calculates the time remaining until a specific lane turns green."""
-    try:
-        lane_index = controlled_lanes.index(lane_id)
-        current_time = traci.simulation.getTime()
-        next_switch_time = traci.trafficlight.getNextSwitch(tls_id)
-        time_until_green = next_switch_time - current_time
-        
-        current_phase_index = traci.trafficlight.getPhase(tls_id)
-        num_phases = len(phases)
-
-        for i in range(1, num_phases + 1):
-            next_phase_index = (current_phase_index + i) % num_phases
-            phase_state_string = phases[next_phase_index].state
-            
-            if lane_index < len(phase_state_string):
-                lane_state_in_phase = phase_state_string[lane_index].lower()
-                if 'g' in lane_state_in_phase:
-                    return time_until_green
-            
-            time_until_green += phases[next_phase_index].duration
-            
-        return -1.0
-    except (traci.TraCIException, ValueError):
-        return -1.0
-
 # =================================================================================
 # MODIFIED DATA COLLECTION LOGIC TO MATCH TARGET FORMAT
 # =================================================================================
 
-def collect_all_intersections_data() -> Dict[str, Any]:
+def collect_all_intersections_data(topology: Dict[str, Dict[str, Any]], only: Optional[Set[str]] = None) -> Dict[str, Any]:
     """
     Gathers data from e2LaneArea detectors and structures it by intersection
-    to match the specified JSON format.
+    to match the specified JSON format. Only dynamic values are read from
+    TraCI; the static structure comes from build_topology_index(). With
+    `only`, intersections outside that set are skipped.
     """
-    detectors_by_junction = defaultdict(list)
-    try:
-        all_detectors = traci.lanearea.getIDList()
-        for det_id in all_detectors:
-            lane_id = traci.lanearea.getLaneID(det_id)
-            edge_id = traci.lane.getEdgeID(lane_id)
-            junction_id = traci.edge.getToJunction(edge_id)
-            if not junction_id.startswith(':'):
-                detectors_by_junction[junction_id].append(det_id)
-    except traci.TraCIException as e:
-        print(f"Error getting detector list: {e}")
-        return {"time": -1, "intersections": [], "error": str(e)}
-
     all_intersections_list = []
     current_time = traci.simulation.getTime()
     
-    for junction_id, detector_ids in detectors_by_junction.items():
-        tls_id = junction_id
+    for junction_id, junction in topology.items():
+        if only is not None and junction_id not in only:
+            continue
+        tls_id = junction["tls_id"]
 
         try:
-            controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
-            if not controlled_lanes:
-                continue
-
-            logic = traci.trafficlight.getCompleteRedYellowGreenDefinition(tls_id)
-            program = logic[0] if logic else None
             light_state_string = traci.trafficlight.getRedYellowGreenState(tls_id)
-            lanes_by_approach = group_lanes_by_approach(controlled_lanes)
-            # Map each approach prefix (e.g., '16') to its first controlled lane (e.g., '16_50_0')
-            approach_to_rep_lane = {direction: lanes[0] for direction, lanes in lanes_by_approach.items()}
-
+            # Time to green of every approach's representative lane in one gather
+            directions = list(junction["rep_link_index"])
+            time_to_green = dict(zip(directions, time_to_green_tables.time_to_green(
+                tls_id, [junction["rep_link_index"][d] for d in directions])))
         except traci.TraCIException:
             continue
 
@@ -205,21 +198,14 @@ def collect_all_intersections_data() -> Dict[str, Any]:
         # This dict will temporarily hold data for each side before being nested
         sides_data_temp = defaultdict(lambda: {"number-of-vehicles": 0})
         total_halting_vehicles = 0
-        all_roads = set()
 
-        for det_id in detector_ids:
-            det_lane_id = traci.lanearea.getLaneID(det_id)
-            det_edge_id = traci.lane.getEdgeID(det_lane_id)
-            all_roads.add(det_edge_id)
-            # The direction key is now just the edge prefix, e.g., '16'
-            direction_key = det_edge_id.split('_')[0]
+        for det_id, direction_key in junction["detectors"]:
             vehicle_count = traci.lanearea.getLastStepVehicleNumber(det_id)
             total_halting_vehicles += traci.lanearea.getLastStepHaltingNumber(det_id)
             
             light_color, time_until_change = "unknown", -1.0
-            if direction_key in approach_to_rep_lane:
-                rep_lane = approach_to_rep_lane[direction_key]
-                lane_index = controlled_lanes.index(rep_lane)
+            if direction_key in junction["rep_lane"]:
+                lane_index = junction["rep_link_index"][direction_key]
                 state_char = light_state_string[lane_index].lower()
                 
                 if 'g' in state_char:
@@ -230,16 +216,15 @@ def collect_all_intersections_data() -> Dict[str, Any]:
                     time_until_change = round(traci.trafficlight.getNextSwitch(tls_id) - current_time, 2)
                 else:
                     light_color = "red"
-                    if program:
-                        time_to_green = calculate_time_to_green(tls_id, rep_lane, controlled_lanes, program.phases)
-                        time_until_change = round(time_to_green, 2) if time_to_green != -1 else -1.0
+                    time_until_green = time_to_green[direction_key]
+                    time_until_change = round(time_until_green, 2) if time_until_green != -1 else -1.0
 
             sides_data_temp[direction_key]["light"] = light_color
             sides_data_temp[direction_key]["time"] = time_until_change
             sides_data_temp[direction_key]["number-of-vehicles"] += vehicle_count
             intersection_data["total-vehicles"] += vehicle_count
 
-        intersection_data["roads"] = sorted(list(all_roads))
+        intersection_data["roads"] = junction["roads"]
         intersection_data["halting-vehicles"] = total_halting_vehicles
         
         # --- KEY CHANGE START ---
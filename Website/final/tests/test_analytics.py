@@ -0,0 +1,57 @@
+import datetime
+import time
+
+import pytest
+
+from analytics import AnalyticsCache
+from history_store import HistoryStore
+
+
+def snapshot(vehicles, halting=0):
+    return {"time": 0.0, "intersections": [
+        {"id": "J1", "total-vehicles": vehicles, "halting-vehicles": halting,
+         "sides": {"side-E1": {"number-of-vehicles": vehicles, "light": "red", "time": 5.0}}}]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path), flush_seconds=1e9)
+
+
+def test_refresh_matches_a_rebuild(store):
+    now = time.time()
+    for k in range(140):
+        store.record(snapshot(k % 17, k % 5), ts=now - 90000 + 600 * k) # Until about 2 hours ago
+    store.flush()
+    cache = AnalyticsCache(store, refresh_seconds=0.0)
+    for date in (None, 'last24hours'):
+        cache.get(date, resolution='raw')
+    rows_read = cache.stats['rows_read']
+    for k in range(20):
+        store.record(snapshot(k % 13, k % 3), ts=now - 300 + 10 * k)
+    for date in (None, 'last24hours'):
+        refreshed = cache.get(date, resolution='raw')
+        assert refreshed == AnalyticsCache(store).get(date, resolution='raw')
+    assert (cache.stats['rebuilds'], cache.stats['refreshes']) == (2, 2)
+    assert cache.stats['rows_read'] - rows_read == 2 * 20 # Only the new rows
+
+
+def test_level_change_rebuilds(store):
+    for k in range(120):
+        store.record(snapshot(k), ts=1_700_000_000 + k)
+    cache = AnalyticsCache(store, refresh_seconds=0.0)
+    assert cache.get(resolution='raw')['resolution'] == 'raw'
+    assert cache.get(resolution='1min')['resolution'] == '1min'
+    assert cache.stats['rebuilds'] == 2
+
+
+def test_peak_time_lies_inside_the_window(store):
+    day = datetime.datetime(2024, 3, 5, tzinfo=datetime.timezone.utc)
+    for k in range(10):
+        store.record(snapshot(5 + k), ts=day.timestamp() + 3600 * (k + 1))
+    store.record(snapshot(500), ts=(day + datetime.timedelta(days=1)).timestamp()) # Next midnight
+    store.flush()
+    summary = AnalyticsCache(store).get('custom', '2024-03-05', '2024-03-05', 'raw')['analytics']['summary']
+    assert summary['peakTime'].startswith('2024-03-05T')
+    assert summary['peakVehicles'] == 14
+    assert summary['totalSnapshots'] == 10
@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+import pytest
+
+import history_store
+from history_store import HistoryStore, historical_data, live_chunks
+
+T0 = 1_700_000_000 - 1_700_000_000 % 900 # Start of a 15 min bucket
+
+
+def snapshot(vehicles, halting=0, light="red"):
+    return {"time": 0.0, "intersections": [
+        {"id": "J1", "total-vehicles": vehicles, "halting-vehicles": halting,
+         "sides": {"side-E1": {"number-of-vehicles": vehicles, "light": light, "time": 5.0}}}]}
+
+
+def live_chunks_of(store, level='raw'):
+    return [path for partition in sorted(os.listdir(os.path.join(store.root, level)))
+            for path in live_chunks(os.path.join(store.root, level, partition))]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path), flush_seconds=1e9)
+
+
+def test_rollups_fold_raw_rows_into_buckets(store):
+    for k in range(120):
+        store.record(snapshot(k % 60, halting=1), ts=T0 + k)
+    store.close()
+    raw = store.query(T0, T0 + 120, 'raw')
+    minutes = store.query(T0, T0 + 120, '1min')
+    assert len(raw['ts']) == 120
+    assert list(minutes['ts']) == [T0, T0 + 60]
+    assert list(minutes['count']) == [60, 60]
+    assert minutes['total'][0] == pytest.approx(29.5)
+    assert (minutes['total_max'][0], minutes['total_min'][0]) == (59, 0)
+    assert minutes['side_lights'][0, 0].tolist() == [60, 0, 0]
+    quarter = store.query(T0, T0 + 120, '15min')
+    assert list(quarter['count']) == [120]
+
+
+def test_compaction_merges_chunks_without_losing_rows(store, monkeypatch):
+    monkeypatch.setattr(history_store, 'COMPACT_AT', 2)
+    for k in range(7):
+        store.record(snapshot(k), ts=T0 + k)
+        store.flush()
+    partition = os.path.dirname(live_chunks_of(store)[0])
+    assert store.stats['compactions'] >= 2
+    assert len(os.listdir(partition)) == len(live_chunks(partition)) <= 3
+    assert store.query(T0, T0 + 7, 'raw')['total'].tolist() == list(range(7))
+
+
+
+def test_reader_relists_chunks_a_compaction_deleted(store, monkeypatch):
+    for k in range(2):
+        store.record(snapshot(k), ts=T0 + k)
+        store.flush()
+    reader = HistoryStore(store.root, read_only=True)
+    stale = reader._chunks('raw', T0, T0 + 10)
+    monkeypatch.setattr(history_store, 'COMPACT_AT', 1)
+    store.compact('raw', history_store._partition('raw', T0))
+    assert not any(os.path.exists(path) for path in stale)
+
+    listings = [stale]
+    real_chunks = reader._chunks
+    monkeypatch.setattr(reader, '_chunks', lambda *args: listings.pop() if listings else real_chunks(*args))
+    assert reader.query(T0, T0 + 10, 'raw')['total'].tolist() == [0, 1]
+
+
+def test_windows_exclude_their_end(store):
+    for k in range(3):
+        store.record(snapshot(k), ts=T0 + 10 * k)
+    store.flush()
+    assert store.query(T0, T0 + 20, 'raw')['ts'].tolist() == [T0, T0 + 10]
+    start, end = store.time_range()
+    assert store.query(start, end, 'raw')['ts'].tolist() == [T0, T0 + 10, T0 + 20]
+
+
+def test_historical_data_pages_raw_snapshots_by_default(store):
+    rows = history_store.MAX_POINTS + 100 # More than query() would pick raw for
+    for k in range(rows):
+        store.record(snapshot(k % 60), ts=T0 + k)
+    store.close()
+    page = historical_data(store)
+    assert page["resolution"] == 'raw'
+    assert page["pagination"]["totalItems"] == rows
+    assert page["data"][0]["intersections"][0]["total-vehicles"] == (rows - 1) % 60
+    coarse = historical_data(store, resolution='1min')
+    assert coarse["pagination"]["totalItems"] == (rows + 59) // 60
+    assert np.isclose(coarse["data"][-1]["intersections"][0]["total-vehicles"], 29.5)
+
+
+def test_pages_read_only_the_chunks_they_need(store, monkeypatch):
+    for k in range(100):
+        store.record(snapshot(k), ts=T0 + k)
+        if k % 10 == 9:
+            store.flush() # Ten chunks of ten rows
+    store.record(snapshot(100), ts=T0 + 100) # Still buffered
+    reader = HistoryStore(store.root, read_only=True)
+    loaded = []
+    load = reader._load
+    monkeypatch.setattr(reader, '_load', lambda path: loaded.append(path) or load(path))
+
+    latest = historical_data(reader, page=2, limit=10)
+    assert [s["intersections"][0]["total-vehicles"] for s in latest["data"]] == list(range(89, 79, -1))
+    assert latest["pagination"] == {"currentPage": 2, "totalPages": 10, "totalItems": 100}
+    assert len(loaded) == 1
+
+    oldest = historical_data(store, page=3, limit=4, sort='oldest')
+    assert [s["intersections"][0]["total-vehicles"] for s in oldest["data"]] == [8, 9, 10, 11]
+    last = historical_data(store, page=99, limit=30)
+    assert last["pagination"]["currentPage"] == 4
+    assert [s["intersections"][0]["total-vehicles"] for s in last["data"]] == [10, 9, 8, 7, 6, 5, 4, 3, 2, 1, 0]
+
+
+def test_pages_of_a_window_that_cuts_chunks(store):
+    for k in range(40):
+        store.record(snapshot(k), ts=T0 + k)
+        if k % 10 == 9:
+            store.flush()
+    columns, total = store.page(T0 + 5, T0 + 25, 'raw', offset=0, limit=8, newest_first=False)
+    assert total == 20
+    assert columns['total'].tolist() == list(range(5, 13))
+    columns, total = store.page(T0 + 5, T0 + 25, 'raw', offset=16, limit=8)
+    assert columns['total'].tolist() == [5, 6, 7, 8]
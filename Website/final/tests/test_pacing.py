@@ -0,0 +1,38 @@
+import random
+
+import pacing
+from pacing import Pacer
+
+
+def broadcasts(monkeypatch, ticks):
+    """
+    Which (wall clock, simulation time) ticks a Pacer broadcasts.
+    """
+    pacer = Pacer(broadcast_interval=1.0)
+    clock = iter([wall for wall, _ in ticks])
+    monkeypatch.setattr(pacing.time, 'perf_counter', lambda: next(clock))
+    return [(wall, sim) for wall, sim in ticks if pacer.should_broadcast(sim)]
+
+
+def test_jittered_ticks_at_the_broadcast_rate_are_all_sent(monkeypatch):
+    rng = random.Random(1)
+    ticks = [(100.0 + k + rng.uniform(-0.05, 0.05), float(k)) for k in range(12)]
+    assert [sim for _, sim in broadcasts(monkeypatch, ticks)] == [float(k) for k in range(12)]
+
+
+def test_fast_steps_are_sent_on_a_steady_grid(monkeypatch):
+    ticks = [(100.0 + 0.1 * k, 0.1 * k) for k in range(100)]
+    walls = [wall for wall, _ in broadcasts(monkeypatch, ticks)]
+    assert len(walls) <= 11
+    # A step within the slack takes the next slot without shifting the ones after it
+    assert all(abs(b - a - 1.0) < 1e-6 for a, b in zip(walls[1:], walls[2:]))
+
+
+def test_no_burst_after_a_stall(monkeypatch):
+    ticks = [(100.0, 0.0), (100.5, 1.0), (105.0, 2.0), (105.1, 3.0), (105.2, 4.0), (106.0, 5.0)]
+    assert [sim for _, sim in broadcasts(monkeypatch, ticks)] == [0.0, 2.0, 5.0]
+
+
+def test_repeated_simulation_time_is_not_sent_twice(monkeypatch):
+    sent = broadcasts(monkeypatch, [(100.0, 1.0), (101.0, 1.0), (102.0, 2.0)])
+    assert [sim for _, sim in sent] == [1.0, 2.0]
@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+from snapshot_delta import DeltaDecoder, delta_message, keyframe_message, snapshot_patch
+
+MAPS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def snapshot(time, lights, vehicles=3, ids=("J1", "J2")):
+    # sumo1.py-shaped snapshot with every light `lights` seconds before its switch at 100
+    return {
+        "time": time,
+        "intersections": [
+            {"id": junction_id, "total-vehicles": vehicles, "roads": ["E1", "E2"], "halting-vehicles": 1,
+             "sides": {"side-E1": {"number-of-vehicles": vehicles, "light": lights, "time": round(100 - time, 2)},
+                       "side-E2": {"number-of-vehicles": 0, "light": "unknown", "time": -1.0}}}
+            for junction_id in ids
+        ],
+    }
+
+
+def wire(message):
+    return json.loads(json.dumps(message))
+
+
+def test_counting_down_lights_cost_nothing():
+    patch = snapshot_patch(snapshot(10.0, "green"), snapshot(10.5, "green"))
+    assert patch == {"time": 10.5}
+
+
+def test_changes_are_sent_per_intersection_and_field():
+    patch = snapshot_patch(snapshot(10.0, "green"), snapshot(11.0, "green", vehicles=4, ids=("J2", "J3")))
+    assert patch["intersections"]["J1"] is None
+    assert patch["intersections"]["J2"] == {"total-vehicles": 4, "sides": {"side-E1": {"number-of-vehicles": 4}}}
+    assert patch["intersections"]["J3"]["id"] == "J3"
+
+
+def test_decoder_round_trips_deltas():
+    snapshots = [snapshot(10.0, "green"), snapshot(10.1, "green", vehicles=5),
+                 snapshot(10.2, "yellow", ids=("J2",)), snapshot(10.3, "red", ids=("J2", "J1"))]
+    decoder = DeltaDecoder()
+    assert decoder.feed(wire(keyframe_message(1, snapshots[0]))) == snapshots[0]
+    for seq in range(1, len(snapshots)):
+        message = wire(delta_message(seq + 1, seq, snapshot_patch(snapshots[seq - 1], snapshots[seq])))
+        assert decoder.feed(message) == snapshots[seq]
+    assert (decoder.keyframes, decoder.deltas, decoder.gaps) == (1, 3, 0)
+
+
+def test_decoder_waits_for_a_keyframe_after_a_gap():
+    decoder = DeltaDecoder()
+    decoder.feed(keyframe_message(1, snapshot(10.0, "green")))
+    skipped = delta_message(3, 2, snapshot_patch(snapshot(10.1, "green"), snapshot(10.2, "red")))
+    assert decoder.feed(skipped) is None
+    assert decoder.gaps == 1 and decoder.keyframe_request() == {"type": "keyframe_request"}
+    assert decoder.feed(delta_message(4, 3, {"time": 10.3})) is None
+    assert decoder.feed(keyframe_message(5, snapshot(10.4, "red"))) == snapshot(10.4, "red")
+
+
+def test_patch_does_not_share_objects_with_the_decoder_state():
+    decoder = DeltaDecoder()
+    decoder.feed(keyframe_message(1, snapshot(10.0, "green", ids=())))
+    patch = snapshot_patch(snapshot(10.0, "green", ids=()), snapshot(10.1, "green"))
+    decoder.feed(delta_message(2, 1, patch))
+    decoder.state["intersections"]["J1"]["sides"]["side-E1"]["light"] = "red"
+    assert patch["intersections"]["J1"]["sides"]["side-E1"]["light"] == "green"
+
+
+def test_frames_send_deltas_smaller_than_keyframes():
+    pytest.importorskip('fastapi')
+    from ws_broadcast import Frame, synthetic_snapshots
+
+    decoder = DeltaDecoder()
+    frame = None
+    delta_bytes = keyframe_bytes = 0
+    for seq, data in enumerate(synthetic_snapshots(os.path.join(MAPS, 'map4'), ticks=120), start=1):
+        frame = Frame(seq, data, frame, keyframe=frame is None)
+        if frame.previous is not None:
+            frame.previous.previous = None
+        payload = frame.delta("json")
+        if frame.keyframe:
+            assert payload is None
+            payload = frame.encode("keyframe", "json")
+        else:
+            assert payload is not None, f"frame {seq} fell back to a keyframe"
+            delta_bytes += len(payload)
+            keyframe_bytes += len(frame.encode("keyframe", "json"))
+        assert decoder.feed(json.loads(payload)) == data
+    assert decoder.deltas == 119 and decoder.gaps == 0
+    assert delta_bytes < keyframe_bytes / 2
@@ -0,0 +1,45 @@
+import pytest
+
+from subscriptions import ALL, parse_subscription, project
+
+
+def snapshot():
+    return {
+        "time": 12.0,
+        "intersections": [
+            {"id": junction_id, "total-vehicles": 4, "roads": ["E1"], "halting-vehicles": 2,
+             "sides": {"side-E1": {"number-of-vehicles": 4, "light": "red", "time": 7.5}}}
+            for junction_id in ("J1", "J2", "J3")
+        ],
+    }
+
+
+def test_parse_subscription():
+    assert parse_subscription({"type": "subscribe"}) == ALL
+    assert parse_subscription({"intersections": ["J1", "J2", "J1"], "fields": None}) == (frozenset({"J1", "J2"}), None)
+    # Every field group is the same topic as no filter, so those clients share payloads
+    assert parse_subscription({"fields": ["halting", "counts", "lights"]}) == ALL
+    with pytest.raises(ValueError):
+        parse_subscription({"intersections": "J1"})
+    with pytest.raises(ValueError):
+        parse_subscription({"fields": ["lights", "colour"]})
+
+
+def test_project_keeps_the_subscribed_intersections_and_fields():
+    data = snapshot()
+    assert project(data, ALL) is data
+
+    view = project(data, parse_subscription({"intersections": ["J3", "J1"], "fields": ["lights"]}))
+    assert view["time"] == 12.0
+    assert view["intersections"] == [
+        {"id": junction_id, "roads": ["E1"], "sides": {"side-E1": {"light": "red", "time": 7.5}}}
+        for junction_id in ("J1", "J3")
+    ]
+    view = project(data, parse_subscription({"fields": ["halting"]}))
+    assert view["intersections"][0] == {"id": "J1", "roads": ["E1"], "halting-vehicles": 2}
+    assert data == snapshot() # The published snapshot is shared and never modified
+
+
+def test_snapshots_without_intersections_pass_through():
+    data = {"time": 1.0, "vehicles": []}
+    assert project(data, (frozenset({"J1"}), frozenset({"counts"}))) is data
@@ -0,0 +1,63 @@
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip('traci')
+
+import tls_timing
+from tls_timing import TimeToGreenTables, build_wait_matrix
+
+
+def phase(state, duration):
+    return types.SimpleNamespace(state=state, duration=duration)
+
+
+PROGRAM = [phase('Gr', 30), phase('yr', 3), phase('rG', 20), phase('ry', 3)]
+
+
+def test_wait_matrix_walks_the_program_cyclically():
+    wait = build_wait_matrix(PROGRAM + [phase('rrr', 2)])
+    # Link 0 is green in phase 0, link 1 in phase 2, link 2 never
+    assert np.array_equal(wait, [
+        [28.0, 3.0, -1.0],
+        [25.0, 0.0, -1.0],
+        [5.0, 38.0, -1.0],
+        [2.0, 35.0, -1.0],
+        [0.0, 33.0, -1.0],
+    ])
+
+
+class FakeLight:
+    def __init__(self):
+        self.program = '0'
+        self.builds = 0
+        self.phase = 1
+        self.programs = {'0': PROGRAM, 'short': [phase('Gr', 5), phase('rG', 5)]}
+
+        def definitions(tls_id):
+            self.builds += 1
+            return [types.SimpleNamespace(programID=p, phases=phases) for p, phases in self.programs.items()]
+
+        self.trafficlight = types.SimpleNamespace(
+            getProgram=lambda tls_id: self.program,
+            getCompleteRedYellowGreenDefinition=definitions,
+            getNextSwitch=lambda tls_id: 101.5,
+            getPhase=lambda tls_id: self.phase,
+        )
+        self.simulation = types.SimpleNamespace(getTime=lambda: 100.0)
+
+
+def test_time_to_green_is_cached_per_program(monkeypatch):
+    light = FakeLight()
+    monkeypatch.setattr(tls_timing, 'traci', light)
+    tables = TimeToGreenTables()
+
+    # 1.5 s of yellow left, then link 1 turns green; link 0 after the rest of the cycle
+    assert tables.time_to_green('J', [1, 0, 7]) == [1.5, 24.5, -1.0]
+    assert tables.time_to_green('J') == [24.5, 1.5]
+    assert light.builds == 1
+
+    light.program, light.phase = 'short', 0
+    assert tables.time_to_green('J', [1]) == [1.5]
+    assert light.builds == 2
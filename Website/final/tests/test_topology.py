@@ -0,0 +1,46 @@
+import types
+
+import pytest
+
+pytest.importorskip('traci')
+
+import topology
+from topology import build_topology_index, group_lanes_by_approach
+
+
+class FakeNetwork:
+    """
+    Junction 50 is a traffic light with two approaches ('16' and '20'); detector d4
+    ends at junction 60, which has no traffic light.
+    """
+
+    def __init__(self, traci_module):
+        detectors = {'d1': '16_50_0', 'd2': '16_50_1', 'd3': '20_50_0', 'd4': '30_60_0'}
+        controlled = {'50': ['16_50_0', '16_50_1', '20_50_0', '20_50_1']}
+
+        def controlled_lanes(tls_id):
+            if tls_id not in controlled:
+                raise traci_module.TraCIException(f"Traffic light '{tls_id}' is not known")
+            return controlled[tls_id]
+
+        self.TraCIException = traci_module.TraCIException
+        self.lanearea = types.SimpleNamespace(getIDList=lambda: list(detectors), getLaneID=detectors.__getitem__)
+        self.lane = types.SimpleNamespace(getEdgeID=lambda lane_id: lane_id.rsplit('_', 1)[0])
+        self.edge = types.SimpleNamespace(getToJunction=lambda edge_id: edge_id.split('_')[1])
+        self.trafficlight = types.SimpleNamespace(getControlledLanes=controlled_lanes)
+
+
+def test_group_lanes_by_approach():
+    assert group_lanes_by_approach(['16_50_0', '20_50_0', '16_50_1']) == {
+        '16': ['16_50_0', '16_50_1'], '20': ['20_50_0']}
+
+
+def test_topology_index_resolves_detectors_and_link_indices(monkeypatch):
+    monkeypatch.setattr(topology, 'traci', FakeNetwork(topology.traci))
+    index = build_topology_index()
+    assert list(index) == ['50']
+    junction = index['50']
+    assert junction['detectors'] == [('d1', '16'), ('d2', '16'), ('d3', '20')]
+    assert junction['roads'] == ['16_50', '20_50']
+    assert junction['rep_lane'] == {'16': '16_50_0', '20': '20_50_0'}
+    assert junction['rep_link_index'] == {'16': 0, '20': 2}
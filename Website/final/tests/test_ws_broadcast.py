@@ -0,0 +1,190 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+pytest.importorskip('fastapi')
+
+import ws_broadcast
+from ws_broadcast import Broadcaster, negotiate_format
+
+
+class FakeWebSocket:
+    """
+    Records what it is sent. With a gate, every send waits until the gate opens.
+    """
+
+    def __init__(self, name, gate=None):
+        self.client = name
+        self.headers = {}
+        self.query_params = {}
+        self.gate = gate
+        self.received = []
+        self.closed_with = None
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, payload):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.received.append(payload)
+
+    send_bytes = send_text
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def settle():
+    # Lets call_soon_threadsafe callbacks and the send tasks run
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def run(scenario):
+    async def main():
+        broadcaster = Broadcaster(send_timeout=0.2)
+        broadcaster.bind(asyncio.get_running_loop())
+        await scenario(broadcaster)
+        for websocket in broadcaster.active_connections:
+            broadcaster.disconnect(websocket)
+    asyncio.run(main())
+
+
+def test_slow_client_gets_the_latest_snapshot_without_holding_back_others():
+    async def scenario(broadcaster):
+        gate = asyncio.Event()
+        slow, fast = FakeWebSocket('slow', gate), FakeWebSocket('fast')
+        await broadcaster.connect(slow)
+        await broadcaster.connect(fast)
+        for n in range(1, 6):
+            # The simulation thread publishes; it never waits for a client
+            publisher = threading.Thread(target=broadcaster.publish, args=({"n": n},))
+            publisher.start()
+            publisher.join(timeout=1.0)
+            assert not publisher.is_alive()
+            await settle()
+        assert fast.received == [f'{{"n":{n}}}' for n in range(1, 6)]
+        assert slow.received == []
+
+        gate.set()
+        await settle()
+        # Still sending the first snapshot when 2-5 came in: only the newest follows it
+        assert slow.received == ['{"n":1}', '{"n":5}']
+        assert broadcaster.clients[slow].dropped == 3
+        assert broadcaster.clients[fast].dropped == 0
+
+    run(scenario)
+
+
+def test_new_client_gets_the_current_snapshot_right_away():
+    async def scenario(broadcaster):
+        broadcaster.publish({"n": 1})
+        await settle()
+        late = FakeWebSocket('late')
+        await broadcaster.connect(late)
+        await settle()
+        assert late.received == ['{"n":1}']
+
+    run(scenario)
+
+
+class StuckWebSocket(FakeWebSocket):
+    async def send_text(self, payload):
+        await asyncio.Event().wait()
+
+    send_bytes = send_text
+
+
+class DroppedWebSocket(FakeWebSocket):
+    async def send_text(self, payload):
+        raise OSError("Socket is closed") # Not a ConnectionError
+
+    send_bytes = send_text
+
+
+def test_each_snapshot_is_encoded_once_for_all_clients():
+    async def scenario(broadcaster):
+        clients = [FakeWebSocket(f'c{k}') for k in range(3)]
+        for websocket in clients:
+            await broadcaster.connect(websocket)
+        for n in range(4):
+            broadcaster.publish({"n": n})
+            await settle()
+        assert all(len(websocket.received) == 4 for websocket in clients)
+        assert broadcaster.encode_stats["full/json"]["messages"] == 4
+        # The very same payload object went to every client
+        assert all(a is b for a, b in zip(clients[0].received, clients[1].received))
+
+    run(scenario)
+
+
+def test_stuck_and_dropped_clients_are_removed():
+    async def scenario(broadcaster):
+        stuck, dropped, healthy = StuckWebSocket('stuck'), DroppedWebSocket('dropped'), FakeWebSocket('healthy')
+        for websocket in (stuck, dropped, healthy):
+            await broadcaster.connect(websocket)
+        broadcaster.publish({"n": 1})
+        await settle()
+        assert dropped not in broadcaster.clients
+        assert healthy.received == ['{"n":1}']
+
+        await asyncio.sleep(broadcaster.send_timeout + 0.1)
+        assert broadcaster.active_connections == [healthy]
+        assert broadcaster.evicted == 1
+        assert stuck.closed_with == 1013
+
+    run(scenario)
+
+
+def negotiate(protocols="", **query):
+    websocket = FakeWebSocket('c')
+    websocket.headers = {"sec-websocket-protocol": protocols} if protocols else {}
+    websocket.query_params = query
+    return negotiate_format(websocket)
+
+
+def test_format_negotiation(monkeypatch):
+    assert negotiate() == ("json", None)
+    assert negotiate("chat, msgpack") == ("msgpack", "msgpack")
+    assert negotiate(format="msgpack") == ("msgpack", None)
+    assert negotiate(format="xml") == ("json", None)
+    monkeypatch.setattr(ws_broadcast, 'msgpack', None)
+    assert negotiate("msgpack") == ("json", None)
+
+
+def test_msgpack_clients_get_binary_frames_next_to_json_clients():
+    msgpack = pytest.importorskip('msgpack')
+
+    async def scenario(broadcaster):
+        binary, text = FakeWebSocket('binary'), FakeWebSocket('text')
+        await broadcaster.connect(binary, fmt="msgpack", subprotocol="msgpack")
+        await broadcaster.connect(text)
+        broadcaster.publish({"time": 1.5, "intersections": [{"id": "J1", "total-vehicles": 3}]})
+        await settle()
+        assert binary.subprotocol == "msgpack"
+        assert isinstance(binary.received[0], bytes) and isinstance(text.received[0], str)
+        assert msgpack.unpackb(binary.received[0]) == json.loads(text.received[0])
+        assert set(broadcaster.stats()["sent_bytes"]) == {"full/json", "full/msgpack"}
+
+    run(scenario)
+
+
+def test_subscriptions_narrow_payloads_and_wanted_intersections():
+    async def scenario(broadcaster):
+        everything, one = FakeWebSocket('everything'), FakeWebSocket('one')
+        await broadcaster.connect(everything)
+        await broadcaster.connect(one)
+        broadcaster.receive(one, json.dumps({"type": "subscribe", "intersections": ["J2"], "fields": ["counts"]}))
+        assert broadcaster.wanted_intersections is None
+        broadcaster.disconnect(everything)
+        assert broadcaster.wanted_intersections == frozenset({"J2"})
+
+        broadcaster.publish({"time": 1.0, "intersections": [
+            {"id": j, "roads": [], "total-vehicles": 2, "halting-vehicles": 1, "sides": {}} for j in ("J1", "J2")]})
+        await settle()
+        assert json.loads(one.received[-1])["intersections"] == [{"id": "J2", "roads": [], "total-vehicles": 2, "sides": {}}]
+
+    run(scenario)
@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import traci
+
+
+def build_wait_matrix(phases: Sequence) -> np.ndarray:
+    """
+    For a signal program, returns a (n_phases, n_links) matrix whose entry
+    [p, i] is the number of seconds from the end of phase p until link i is
+    green ('G' or 'g'), walking the program cyclically (phase p itself comes
+    last). Links that are never green hold -1.
+    """
+    n_phases = len(phases)
+    n_links = max((len(phase.state) for phase in phases), default=0)
+    green = np.zeros((n_phases, n_links), dtype=bool)
+    for p, phase in enumerate(phases):
+        states = np.frombuffer(phase.state.lower().encode(), dtype=np.uint8)
+        green[p, :len(states)] = states == ord('g')
+    durations = np.array([phase.duration for phase in phases], dtype=float)
+
+    wait = np.full((n_phases, n_links), -1.0)
+    for p in range(n_phases):
+        elapsed = 0.0
+        found = np.zeros(n_links, dtype=bool)
+        for i in range(1, n_phases + 1):
+            q = (p + i) % n_phases
+            newly_green = green[q] & ~found
+            wait[p, newly_green] = elapsed
+            found |= newly_green
+            elapsed += durations[q]
+    return wait
+
+
+class TimeToGreenTables:
+    """
+    Caches build_wait_matrix() per traffic light and rebuilds it only when the
+    light switches to another program. Per tick, the time to green of any set
+    of links is one gather from the matrix plus the time left in the current
+    phase, so the cost no longer depends on the number of phases.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, tuple] = {} # tls_id -> (program_id, wait matrix or None)
+
+    def wait_matrix(self, tls_id: str) -> Optional[np.ndarray]:
+        program_id = traci.trafficlight.getProgram(tls_id)
+        cached = self.tables.get(tls_id)
+        if cached is not None and cached[0] == program_id:
+            return cached[1]
+        logics = traci.trafficlight.getCompleteRedYellowGreenDefinition(tls_id)
+        logic = next((l for l in logics if l.programID == program_id), logics[0] if logics else None)
+        matrix = build_wait_matrix(logic.phases) if logic is not None and logic.phases else None
+        if matrix is not None and matrix.shape[1] == 0:
+            matrix = None
+        self.tables[tls_id] = (program_id, matrix)
+        return matrix
+
+    def time_to_green(self, tls_id: str, link_indices: Optional[List[int]] = None) -> List[float]:
+        """
+        Seconds until each link (default: every controlled link) turns green,
+        counted from the next phase switch as calculate_time_to_green always
+        did, or -1.0 when the link is never green in the program.
+        """
+        matrix = self.wait_matrix(tls_id)
+        if matrix is None:
+            return [-1.0] * (len(link_indices) if link_indices is not None else 0)
+        remaining = traci.trafficlight.getNextSwitch(tls_id) - traci.simulation.getTime()
+        phase = traci.trafficlight.getPhase(tls_id)
+        indices = np.arange(matrix.shape[1]) if link_indices is None else np.asarray(link_indices, dtype=np.int64)
+        valid = indices < matrix.shape[1]
+        wait = np.where(valid, matrix[phase, np.minimum(indices, matrix.shape[1] - 1)], -1.0)
+        return np.where(wait >= 0, wait + remaining, -1.0).tolist()
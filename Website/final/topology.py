@@ -0,0 +1,56 @@
+from typing import Any, Dict, List
+from collections import defaultdict
+import traci
+
+
+def group_lanes_by_approach(lanes: List[str]) -> Dict[str, List[str]]:
+    """
+    Groups lanes by their approach edge ID prefix.
+    Example: '16_50_0' and '16_50_1' are grouped under '16'.
+    """
+    grouped = defaultdict(list)
+    for lane_id in lanes:
+        # Assuming lane/edge IDs are in the format 'prefix_junction_...'
+        prefix = lane_id.split('_')[0]
+        grouped[prefix].append(lane_id)
+    return dict(grouped)
+
+
+def build_topology_index() -> Dict[str, Dict[str, Any]]:
+    """
+    Resolves everything about the network that never changes during a run, so
+    the per-tick collector only has to read dynamic values:
+    detector -> lane -> edge -> junction -> approach, and for every approach
+    its representative controlled lane and that lane's link index.
+    """
+    detectors_by_junction = defaultdict(list)
+    for det_id in traci.lanearea.getIDList():
+        lane_id = traci.lanearea.getLaneID(det_id)
+        edge_id = traci.lane.getEdgeID(lane_id)
+        junction_id = traci.edge.getToJunction(edge_id)
+        if not junction_id.startswith(':'):
+            detectors_by_junction[junction_id].append((det_id, edge_id))
+
+    topology = {}
+    for junction_id, detectors in detectors_by_junction.items():
+        tls_id = junction_id
+        try:
+            controlled_lanes = traci.trafficlight.getControlledLanes(tls_id)
+        except traci.TraCIException:
+            continue # Not a traffic light
+        if not controlled_lanes:
+            continue
+
+        lanes_by_approach = group_lanes_by_approach(controlled_lanes)
+        # Map each approach prefix (e.g., '16') to its first controlled lane (e.g., '16_50_0')
+        approach_to_rep_lane = {direction: lanes[0] for direction, lanes in lanes_by_approach.items()}
+        topology[junction_id] = {
+            "tls_id": tls_id,
+            "controlled_lanes": controlled_lanes,
+            # The direction key is the edge prefix, e.g., '16'
+            "detectors": [(det_id, edge_id.split('_')[0]) for det_id, edge_id in detectors],
+            "roads": sorted({edge_id for _, edge_id in detectors}),
+            "rep_lane": approach_to_rep_lane,
+            "rep_link_index": {direction: controlled_lanes.index(lane) for direction, lane in approach_to_rep_lane.items()},
+        }
+    return topology
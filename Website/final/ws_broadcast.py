@@ -0,0 +1,454 @@
+import os
+import asyncio
+import json
+import time
+import argparse
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+import snapshot_delta
+import subscriptions
+from subscriptions import ALL, Topic
+
+try:
+    import orjson # Optional: several times faster than the standard json module
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack # Optional: enables the binary wire format
+except ImportError:
+    msgpack = None
+
+SEND_TIMEOUT = 2.0 # Seconds a client may take to accept one frame before it is evicted
+PROTOCOLS = ("full", "delta") # "full": the snapshot itself every time; "delta": see snapshot_delta
+FORMATS = ("json", "msgpack") # Wire formats; JSON (text frames) unless a client asks for msgpack (binary frames)
+
+Payload = Union[str, bytes]
+
+
+def _to_builtin(value):
+    # NumPy scalars and the like
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def encode_json(data: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, default=_to_builtin).decode()
+    return json.dumps(data, separators=(',', ':'), default=_to_builtin)
+
+
+def encode_msgpack(data: Any) -> bytes:
+    return msgpack.packb(data, default=_to_builtin, use_bin_type=True)
+
+
+ENCODERS = {"json": encode_json, "msgpack": encode_msgpack}
+
+
+def negotiate_format(websocket: WebSocket) -> Tuple[str, Optional[str]]:
+    """
+    Wire format a client asked for, with ?format=msgpack or by offering the
+    "msgpack" subprotocol, and the subprotocol to accept the connection with.
+    Falls back to JSON when msgpack isn't installed.
+    """
+    offered = [p.strip() for p in websocket.headers.get("sec-websocket-protocol", "").split(",") if p.strip()]
+    fmt = websocket.query_params.get("format", "msgpack" if "msgpack" in offered else "json")
+    if fmt not in FORMATS:
+        fmt = "json"
+    if fmt == "msgpack" and msgpack is None:
+        print("A client asked for msgpack but it isn't installed; sending it JSON.")
+        fmt = "json"
+    return fmt, fmt if fmt in offered else None
+
+
+class Frame:
+    """
+    One published snapshot. Each of its messages (full snapshot, keyframe,
+    delta from the previous frame) is projected once per subscription topic
+    and encoded once per wire format, the first time a client needs it, and
+    the same payload is sent to every client that gets it.
+    """
+
+    def __init__(self, seq: int, data: dict, previous: Optional["Frame"] = None, keyframe: bool = True,
+                 encode_stats: Optional[Dict[str, Dict[str, float]]] = None):
+        self.seq = seq
+        self.data = data
+        self.previous = previous # Only kept until the next frame is published
+        self.keyframe = keyframe or previous is None
+        self.published_at = time.perf_counter()
+        self.base_seq = previous.seq if previous is not None else 0
+        self._views: Dict[Topic, dict] = {}
+        self._indexed: Dict[Topic, dict] = {}
+        self._patches: Dict[Topic, dict] = {}
+        self._encoded: Dict[Tuple[str, str, Topic], Payload] = {}
+        self.encode_stats = encode_stats if encode_stats is not None else {}
+
+    def view(self, topic: Topic = ALL) -> dict:
+        if topic not in self._views:
+            self._views[topic] = subscriptions.project(self.data, topic)
+        return self._views[topic]
+
+    def indexed(self, topic: Topic = ALL) -> dict:
+        # Keyed form of the view, kept for the next frame's delta
+        if topic not in self._indexed:
+            self._indexed[topic] = snapshot_delta.index_snapshot(self.view(topic))
+        return self._indexed[topic]
+
+    def message(self, kind: str, topic: Topic = ALL) -> Any:
+        if kind == "keyframe":
+            return snapshot_delta.keyframe_message(self.seq, self.view(topic))
+        if kind == "delta":
+            return snapshot_delta.delta_message(self.seq, self.base_seq, self._patches[topic])
+        return self.view(topic)
+
+    def encode(self, kind: str = "full", fmt: str = "json", topic: Topic = ALL) -> Payload:
+        key = (kind, fmt, topic)
+        if key not in self._encoded:
+            start = time.perf_counter()
+            payload = ENCODERS[fmt](self.message(kind, topic))
+            stats = self.encode_stats.setdefault(f"{kind}/{fmt}", {"messages": 0, "bytes": 0, "seconds": 0.0})
+            stats["messages"] += 1
+            stats["bytes"] += len(payload)
+            stats["seconds"] += time.perf_counter() - start
+            self._encoded[key] = payload
+        return self._encoded[key]
+
+    def delta(self, fmt: str = "json", topic: Topic = ALL) -> Optional[Payload]:
+        """
+        The encoded delta from the previous frame, or None when there is none
+        to compute it from or it wouldn't be smaller than the keyframe (this
+        frame then only goes out as a keyframe).
+        """
+        if topic not in self._patches:
+            if self.previous is None:
+                return None
+            self._patches[topic] = snapshot_delta.diff(self.previous.indexed(topic), self.indexed(topic))
+        payload = self.encode("delta", fmt, topic)
+        return payload if len(payload) < len(self.encode("keyframe", fmt, topic)) else None
+
+
+class Client:
+    """
+    One connected dashboard and its delivery counters.
+    """
+
+    def __init__(self, websocket: WebSocket, protocol: str = "full", fmt: str = "json"):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.format = fmt
+        self.topic: Topic = ALL
+        self.needs_keyframe = True
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.last_seq = 0
+        self.sent = 0
+        self.dropped = 0 # Snapshots replaced by a newer one before this client got them
+        self.last_lag = 0.0 # Seconds from publish to the end of the send
+        self.max_lag = 0.0
+        self.connected_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "client": str(self.websocket.client),
+            "protocol": self.protocol,
+            "format": self.format,
+            "intersections": sorted(self.topic[0]) if self.topic[0] is not None else "all",
+            "fields": sorted(self.topic[1]) if self.topic[1] is not None else "all",
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_seq": self.last_seq,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "connected_s": round(time.time() - self.connected_at, 1),
+        }
+
+
+class Broadcaster:
+    """
+    Latest-value channel between the SUMO thread and the WebSocket clients.
+
+    The simulation thread calls publish(), which only hands the snapshot to
+    the event loop and returns immediately; it never waits for a client.
+    Every client has its own send task that always sends the newest
+    snapshot: if several are published while a slow client is still busy,
+    the older ones are skipped (and counted as dropped for that client), so
+    one slow browser neither throttles the simulation nor the other clients.
+
+    Each snapshot is encoded once per wire format in use and the same
+    payload goes to every client; sends run concurrently, each bounded by
+    SEND_TIMEOUT. A client that doesn't take a frame within that time is
+    evicted.
+
+    Clients on the delta protocol get the frame's delta from the previous
+    one when they received that one, and its keyframe otherwise (first
+    frame, a gap from conflation, a keyframe request, or every
+    keyframe_interval seconds).
+
+    Clients can subscribe to a subset of the intersections and fields (see
+    subscriptions). Subscribers are indexed by topic: each topic's payload
+    is built once per frame, and the simulation thread can ask for
+    wanted_intersections to collect only what someone is viewing.
+    """
+
+    def __init__(self, send_timeout: float = SEND_TIMEOUT, keyframe_interval: float = snapshot_delta.KEYFRAME_INTERVAL):
+        self.clients: Dict[WebSocket, Client] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.send_timeout = send_timeout
+        self.keyframe_interval = keyframe_interval
+        self.seq = 0
+        self.latest: Optional[Frame] = None
+        self.last_keyframe_at = 0.0
+        self.evicted = 0
+        self.sent_bytes: Dict[str, int] = {} # "<kind>/<format>" -> bytes sent
+        self.encode_stats: Dict[str, Dict[str, float]] = {} # "<kind>/<format>" -> messages, bytes, seconds
+        self.subscribers: Dict[Topic, Set[WebSocket]] = {}
+        # Union of the subscribed intersections, None when some client wants all.
+        # Replaced (never mutated) on the event loop, so any thread may read it.
+        self.wanted_intersections: Optional[FrozenSet[str]] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    @property
+    def active_connections(self):
+        return list(self.clients)
+
+    # --- Producer side (any thread) ---
+    def publish(self, data: dict):
+        if self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._set_latest, data)
+        except RuntimeError:
+            pass # Event loop already closed (server shutting down)
+
+    def _set_latest(self, data: dict):
+        self.seq += 1
+        now = time.perf_counter()
+        keyframe = now - self.last_keyframe_at >= self.keyframe_interval
+        if keyframe:
+            self.last_keyframe_at = now
+        previous = self.latest
+        if previous is not None:
+            previous.previous = None # Nobody will ask for its delta any more
+        self.latest = Frame(self.seq, data, previous, keyframe, self.encode_stats)
+        for client in self.clients.values():
+            client.wakeup.set()
+
+    # --- Consumer side (event loop) ---
+    async def connect(self, websocket: WebSocket, protocol: str = "full", fmt: str = "json",
+                      subprotocol: Optional[str] = None):
+        if protocol not in PROTOCOLS:
+            protocol = "full"
+        await websocket.accept(subprotocol=subprotocol)
+        client = Client(websocket, protocol, fmt)
+        self.clients[websocket] = client
+        self._index(client)
+        client.task = asyncio.create_task(self._sender(client))
+        if self.latest is not None:
+            client.wakeup.set() # New clients get the current snapshot right away
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            self._unindex(client)
+        if client is not None and client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def _index(self, client: Client):
+        self.subscribers.setdefault(client.topic, set()).add(client.websocket)
+        self._update_wanted()
+
+    def _unindex(self, client: Client):
+        topic_clients = self.subscribers.get(client.topic)
+        if topic_clients is not None:
+            topic_clients.discard(client.websocket)
+            if not topic_clients:
+                del self.subscribers[client.topic]
+        self._update_wanted()
+
+    def _update_wanted(self):
+        wanted = set()
+        for ids, _ in self.subscribers:
+            if ids is None:
+                self.wanted_intersections = None
+                return
+            wanted |= ids
+        self.wanted_intersections = frozenset(wanted)
+
+    def receive(self, websocket: WebSocket, message: str):
+        """
+        Handles a message from a client: a subscribe message, or a
+        delta-protocol keyframe request. Anything else is ignored.
+        """
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        try:
+            request = json.loads(message)
+        except ValueError:
+            return
+        if not isinstance(request, dict):
+            return
+        if request.get("type") == "subscribe":
+            try:
+                topic = subscriptions.parse_subscription(request)
+            except ValueError as e:
+                print(f"Ignoring invalid subscription from {websocket.client}: {e}")
+                return
+            self._unindex(client)
+            client.topic = topic
+            self._index(client)
+        elif request.get("type") != "keyframe_request" or client.protocol != "delta":
+            return
+        # Resend the current snapshot: as a keyframe (delta clients) in the new topic
+        client.needs_keyframe = True
+        if self.latest is not None:
+            client.wakeup.set()
+
+    def _payload(self, client: Client, frame: Frame) -> Tuple[str, Payload]:
+        if client.protocol != "delta":
+            return "full", frame.encode("full", client.format, client.topic)
+        if not (client.needs_keyframe or frame.keyframe or client.last_seq != frame.seq - 1):
+            delta = frame.delta(client.format, client.topic)
+            if delta is not None:
+                return "delta", delta
+        client.needs_keyframe = False
+        return "keyframe", frame.encode("keyframe", client.format, client.topic)
+
+    async def _sender(self, client: Client):
+        try:
+            while True:
+                await client.wakeup.wait()
+                client.wakeup.clear()
+                frame = self.latest
+                if client.last_seq:
+                    client.dropped += max(frame.seq - client.last_seq - 1, 0)
+                kind, payload = self._payload(client, frame)
+                if isinstance(payload, bytes):
+                    send = client.websocket.send_bytes(payload)
+                else:
+                    send = client.websocket.send_text(payload)
+                await asyncio.wait_for(send, self.send_timeout)
+                key = f"{kind}/{client.format}"
+                self.sent_bytes[key] = self.sent_bytes.get(key, 0) + len(payload)
+                client.last_seq = frame.seq
+                client.sent += 1
+                client.last_lag = time.perf_counter() - frame.published_at
+                client.max_lag = max(client.max_lag, client.last_lag)
+        except asyncio.TimeoutError:
+            print(f"Client {client.websocket.client} took more than {self.send_timeout}s for one frame. Evicting it.")
+            await self._evict(client)
+        except (WebSocketDisconnect, RuntimeError, OSError) as e:
+            # OSError covers ConnectionError and a socket that was dropped mid-send
+            print(f"Error sending to a client: {e}. Removing it.")
+            self.disconnect(client.websocket)
+
+    async def _evict(self, client: Client):
+        self.evicted += 1
+        self.disconnect(client.websocket)
+        try:
+            # 1013: try again later
+            await asyncio.wait_for(client.websocket.close(code=1013), self.send_timeout)
+        except (asyncio.TimeoutError, RuntimeError, OSError):
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "published": self.seq,
+            "encoder": "orjson" if orjson is not None else "json",
+            "msgpack": msgpack is not None,
+            "evicted": self.evicted,
+            "topics": len(self.subscribers),
+            "wanted_intersections": sorted(self.wanted_intersections) if self.wanted_intersections is not None else "all",
+            # Per message kind and wire format: average size and encode time of one message
+            "encoding": {
+                key: {
+                    "messages": int(stats["messages"]),
+                    "avg_bytes": round(stats["bytes"] / stats["messages"]),
+                    "avg_encode_ms": round(1000 * stats["seconds"] / stats["messages"], 3),
+                }
+                for key, stats in self.encode_stats.items()
+            },
+            "sent_bytes": dict(self.sent_bytes),
+            "clients": [client.stats() for client in self.clients.values()],
+        }
+
+
+# -------------------------
+# Wire-format benchmark
+# -------------------------
+def synthetic_snapshots(map_dir: str, ticks: int = 300, seed: int = 0):
+    """
+    sumo1.py-shaped snapshots for the signalized junctions and e2 detectors of
+    a map (RL.net.xml / RL.add.xml), with vehicle counts drifting and every
+    approach cycling through green/yellow/red, so encodings can be compared
+    without running SUMO.
+    """
+    import random
+    import xml.etree.ElementTree as ET
+
+    net = ET.parse(os.path.join(map_dir, 'RL.net.xml')).getroot()
+    signalized = {j.get('id') for j in net.iter('junction') if j.get('type') == 'traffic_light'}
+    edge_to = {e.get('id'): e.get('to') for e in net.iter('edge') if e.get('function') != 'internal'}
+    detectors = {}
+    for det in ET.parse(os.path.join(map_dir, 'RL.add.xml')).getroot().iter('laneAreaDetector'):
+        edge_id = det.get('lane').rsplit('_', 1)[0]
+        if edge_to.get(edge_id) in signalized:
+            detectors.setdefault(edge_to[edge_id], []).append((det.get('id'), edge_id))
+
+    rng = random.Random(seed)
+    counts = {det_id: rng.randint(0, 8) for dets in detectors.values() for det_id, _ in dets}
+    for tick in range(ticks):
+        intersections = []
+        for junction_id, dets in detectors.items():
+            sides = {}
+            for k, direction in enumerate(sorted({edge_id.split('_')[0] for _, edge_id in dets})):
+                t = (tick + 33 * k) % 66 # 30 s green, 3 s yellow, 33 s red per approach
+                light = "green" if t < 30 else "yellow" if t < 33 else "red"
+                remaining = 30 - t if t < 30 else 33 - t if t < 33 else 66 - t
+                sides[direction] = {"number-of-vehicles": 0, "light": light, "time": float(remaining)}
+            total = 0
+            for det_id, edge_id in dets:
+                counts[det_id] = max(0, counts[det_id] + rng.choice((-1, 0, 0, 0, 1)))
+                sides[edge_id.split('_')[0]]["number-of-vehicles"] += counts[det_id]
+                total += counts[det_id]
+            for side in sides.values():
+                if side["light"] == "green":
+                    side["number-of-vehicles"] = 0
+            intersections.append({
+                "id": junction_id, "total-vehicles": total,
+                "roads": sorted({edge_id for _, edge_id in dets}),
+                "halting-vehicles": total // 2,
+                "sides": {f"side-{direction}": side for direction, side in sides.items()},
+            })
+        yield {"time": float(tick), "intersections": intersections}
+
+
+def bench(map_dirs, ticks: int = 300):
+    formats = [fmt for fmt in FORMATS if fmt != "msgpack" or msgpack is not None]
+    if msgpack is None:
+        print("msgpack isn't installed; only JSON is measured.")
+    for map_dir in map_dirs:
+        encode_stats: Dict[str, Dict[str, float]] = {}
+        frame = None
+        for seq, snapshot in enumerate(synthetic_snapshots(map_dir, ticks), start=1):
+            frame = Frame(seq, snapshot, encode_stats=encode_stats)
+            for fmt in formats:
+                frame.encode("full", fmt)
+        print(f"\n{map_dir} ({len(frame.data['intersections'])} signalized intersections with detectors, {ticks} ticks, JSON encoder: "
+              f"{'orjson' if orjson is not None else 'json'})")
+        for key, stats in sorted(encode_stats.items()):
+            print(f"  {key:<17} {stats['bytes'] / stats['messages']:>9,.0f} bytes/tick  "
+                  f"{1e6 * stats['seconds'] / stats['messages']:>8.1f} us/tick")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the dashboard wire formats on synthetic snapshots of a map.")
+    parser.add_argument('maps', nargs='*', default=['map4', 'map5'], help="Map directories with RL.net.xml and RL.add.xml")
+    parser.add_argument('--ticks', type=int, default=300)
+    args = parser.parse_args()
+    bench(args.maps, args.ticks)
@@ -2,7 +2,7 @@ import React, { useState, useEffect, useCallback } from 'react';
 import "./Analysis.css";
 
 const TrafficAnalyticsComponent = () => {
-  const [historicalData, setHistoricalData] = useState([]);
+  const [recordCount, setRecordCount] = useState(0);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [analytics, setAnalytics] = useState(null);
@@ -21,16 +21,15 @@ const TrafficAnalyticsComponent = () => {
     fetchHistoricalData();
   }, [filters]);
 
-  // Fetch historical data with only date filter
+  // Fetch the analytics of the selected period; the history server reduces the
+  // stored time series itself, so only the summaries come over the wire
   const fetchHistoricalData = async () => {
     try {
       setLoading(true);
       setError(null);
       
       const params = new URLSearchParams({
-        page: 1,
-        limit: 500, // Get more data for better analytics
-        sort: 'latest',
+        tzOffset: new Date().getTimezoneOffset(), // Hourly and weekly patterns in local time
       });
 
       // Add date filter
@@ -42,340 +41,36 @@ const TrafficAnalyticsComponent = () => {
         }
       }
 
-      console.log('Fetching with URL:', `http://localhost:5000/historical-data?${params.toString()}`);
+      console.log('Fetching with URL:', `http://localhost:5000/analytics?${params.toString()}`);
       
-      const response = await fetch(`http://localhost:5000/historical-data?${params.toString()}`);
+      const response = await fetch(`http://localhost:5000/analytics?${params.toString()}`);
       
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
       
       const apiResponse = await response.json();
-      console.log('API Response:', apiResponse);
+      console.log('Analytics computed at', apiResponse.resolution, 'resolution:', apiResponse.analytics?.summary);
       
-      let dataArray = apiResponse.data || [];
-      
-      // Filter out invalid data
-      const validData = dataArray.filter(item => {
-        return item && 
-               item.intersections && 
-               Array.isArray(item.intersections) && 
-               item.intersections.length > 0;
-      });
-
-      console.log('Valid data items:', validData.length, 'out of', dataArray.length);
-      
-      if (validData.length === 0) {
+      if (!apiResponse.analytics) {
         setAnalytics(null);
         setChartData(null);
-        setHistoricalData([]);
+        setRecordCount(0);
         return;
       }
       
-      setHistoricalData(validData);
-      processAdvancedAnalytics(validData);
-      generateAdvancedChartData(validData);
+      setRecordCount(apiResponse.analytics.summary.totalSnapshots);
+      setAnalytics(apiResponse.analytics);
+      setChartData(apiResponse.chartData);
       
     } catch (err) {
-      console.error('Error fetching historical data:', err);
+      console.error('Error fetching analytics:', err);
       setError(err.message);
     } finally {
       setLoading(false);
     }
   };
 
-  // Enhanced analytics processing with more detailed metrics
-  const processAdvancedAnalytics = (data) => {
-    try {
-      if (!data || data.length === 0) {
-        setAnalytics(null);
-        return;
-      }
-
-      console.log('Processing advanced analytics for', data.length, 'snapshots');
-
-      const timeSeriesData = data.map((snapshot, index) => {
-        const intersections = snapshot.intersections || [];
-        const timestamp = new Date(snapshot.createdAt || Date.now());
-        
-        if (!Array.isArray(intersections)) {
-          return {
-            timestamp,
-            time: snapshot.time || 0,
-            totalVehicles: 0,
-            totalHalting: 0,
-            intersections: [],
-            hour: timestamp.getHours(),
-            dayOfWeek: timestamp.getDay(),
-            date: timestamp.toISOString().split('T')[0]
-          };
-        }
-
-        const totalVehicles = intersections.reduce((sum, int) => sum + (int['total-vehicles'] || 0), 0);
-        const totalHalting = intersections.reduce((sum, int) => sum + (int['halting-vehicles'] || 0), 0);
-
-        return {
-          timestamp,
-          time: snapshot.time || 0,
-          totalVehicles,
-          totalHalting,
-          intersections,
-          hour: timestamp.getHours(),
-          dayOfWeek: timestamp.getDay(),
-          date: timestamp.toISOString().split('T')[0],
-          congestionRate: totalVehicles > 0 ? (totalHalting / totalVehicles * 100) : 0,
-          snapshotIndex: index
-        };
-      }).filter(item => item !== null);
-
-      if (timeSeriesData.length === 0) {
-        setAnalytics(null);
-        return;
-      }
-
-      // Basic metrics
-      const totalSnapshots = timeSeriesData.length;
-      const avgVehicles = timeSeriesData.reduce((sum, d) => sum + d.totalVehicles, 0) / totalSnapshots;
-      const avgHalting = timeSeriesData.reduce((sum, d) => sum + d.totalHalting, 0) / totalSnapshots;
-      const avgCongestion = avgVehicles > 0 ? (avgHalting / avgVehicles * 100) : 0;
-      const peakVehicles = Math.max(...timeSeriesData.map(d => d.totalVehicles));
-      const peakSnapshot = timeSeriesData.find(d => d.totalVehicles === peakVehicles);
-
-      // Hourly analysis
-      const hourlyStats = {};
-      for (let hour = 0; hour < 24; hour++) {
-        const hourlyData = timeSeriesData.filter(d => d.hour === hour);
-        if (hourlyData.length > 0) {
-          hourlyStats[hour] = {
-            avgVehicles: hourlyData.reduce((sum, d) => sum + d.totalVehicles, 0) / hourlyData.length,
-            avgCongestion: hourlyData.reduce((sum, d) => sum + d.congestionRate, 0) / hourlyData.length,
-            totalSnapshots: hourlyData.length,
-            peakVehicles: Math.max(...hourlyData.map(d => d.totalVehicles))
-          };
-        }
-      }
-
-      // Daily analysis
-      const dailyStats = {};
-      const dayNames = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'];
-      for (let day = 0; day < 7; day++) {
-        const dailyData = timeSeriesData.filter(d => d.dayOfWeek === day);
-        if (dailyData.length > 0) {
-          dailyStats[day] = {
-            name: dayNames[day],
-            avgVehicles: dailyData.reduce((sum, d) => sum + d.totalVehicles, 0) / dailyData.length,
-            avgCongestion: dailyData.reduce((sum, d) => sum + d.congestionRate, 0) / dailyData.length,
-            totalSnapshots: dailyData.length,
-            peakVehicles: Math.max(...dailyData.map(d => d.totalVehicles))
-          };
-        }
-      }
-
-      // Intersection detailed analysis
-      const intersectionStats = {};
-      const lightingStats = {
-        red: { count: 0, totalTime: 0 },
-        green: { count: 0, totalTime: 0 },
-        yellow: { count: 0, totalTime: 0 }
-      };
-
-      timeSeriesData.forEach(snapshot => {
-        if (snapshot.intersections && Array.isArray(snapshot.intersections)) {
-          snapshot.intersections.forEach(int => {
-            if (!int || !int.id) return;
-            
-            if (!intersectionStats[int.id]) {
-              intersectionStats[int.id] = {
-                totalVehicles: [],
-                haltingVehicles: [],
-                congestionRates: [],
-                lightStates: { red: 0, green: 0, yellow: 0 },
-                roadSides: {}
-              };
-            }
-            
-            const vehicles = int['total-vehicles'] || 0;
-            const halting = int['halting-vehicles'] || 0;
-            const congestionRate = vehicles > 0 ? (halting / vehicles * 100) : 0;
-            
-            intersectionStats[int.id].totalVehicles.push(vehicles);
-            intersectionStats[int.id].haltingVehicles.push(halting);
-            intersectionStats[int.id].congestionRates.push(congestionRate);
-
-            // Analyze traffic light patterns
-            if (int.sides && typeof int.sides === 'object') {
-              Object.entries(int.sides).forEach(([sideId, sideData]) => {
-                if (sideData && sideData.light) {
-                  const light = sideData.light.toLowerCase();
-                  if (lightingStats[light]) {
-                    lightingStats[light].count++;
-                    lightingStats[light].totalTime += (sideData.time || 0);
-                  }
-                  
-                  intersectionStats[int.id].lightStates[light]++;
-                  
-                  if (!intersectionStats[int.id].roadSides[sideId]) {
-                    intersectionStats[int.id].roadSides[sideId] = {
-                      vehicles: [],
-                      lights: { red: 0, green: 0, yellow: 0 }
-                    };
-                  }
-                  
-                  intersectionStats[int.id].roadSides[sideId].vehicles.push(sideData['number-of-vehicles'] || 0);
-                  intersectionStats[int.id].roadSides[sideId].lights[light]++;
-                }
-              });
-            }
-          });
-        }
-      });
-
-      // Calculate intersection analytics
-      const intersectionAnalytics = Object.keys(intersectionStats).map(id => {
-        const stats = intersectionStats[id];
-        const roadSideAnalytics = Object.entries(stats.roadSides).map(([sideId, sideData]) => ({
-          id: sideId,
-          avgVehicles: sideData.vehicles.length > 0 ? sideData.vehicles.reduce((a, b) => a + b, 0) / sideData.vehicles.length : 0,
-          maxVehicles: sideData.vehicles.length > 0 ? Math.max(...sideData.vehicles) : 0,
-          lightDistribution: sideData.lights
-        }));
-
-        return {
-          id,
-          avgVehicles: stats.totalVehicles.length > 0 ? stats.totalVehicles.reduce((a, b) => a + b, 0) / stats.totalVehicles.length : 0,
-          avgHalting: stats.haltingVehicles.length > 0 ? stats.haltingVehicles.reduce((a, b) => a + b, 0) / stats.haltingVehicles.length : 0,
-          avgCongestion: stats.congestionRates.length > 0 ? stats.congestionRates.reduce((a, b) => a + b, 0) / stats.congestionRates.length : 0,
-          maxVehicles: stats.totalVehicles.length > 0 ? Math.max(...stats.totalVehicles) : 0,
-          maxCongestion: stats.congestionRates.length > 0 ? Math.max(...stats.congestionRates) : 0,
-          minVehicles: stats.totalVehicles.length > 0 ? Math.min(...stats.totalVehicles) : 0,
-          minCongestion: stats.congestionRates.length > 0 ? Math.min(...stats.congestionRates) : 0,
-          lightDistribution: stats.lightStates,
-          roadSides: roadSideAnalytics,
-          efficiency: stats.congestionRates.length > 0 ? 100 - (stats.congestionRates.reduce((a, b) => a + b, 0) / stats.congestionRates.length) : 0
-        };
-      });
-
-      // Traffic flow patterns
-      const flowPatterns = {
-        peakHours: Object.entries(hourlyStats)
-          .sort(([,a], [,b]) => b.avgVehicles - a.avgVehicles)
-          .slice(0, 3)
-          .map(([hour, stats]) => ({ hour: parseInt(hour), ...stats })),
-        offPeakHours: Object.entries(hourlyStats)
-          .sort(([,a], [,b]) => a.avgVehicles - b.avgVehicles)
-          .slice(0, 3)
-          .map(([hour, stats]) => ({ hour: parseInt(hour), ...stats }))
-      };
-
-      // Congestion distribution
-      const congestionDistribution = {
-        low: timeSeriesData.filter(d => d.congestionRate < 20).length,
-        medium: timeSeriesData.filter(d => d.congestionRate >= 20 && d.congestionRate < 50).length,
-        high: timeSeriesData.filter(d => d.congestionRate >= 50).length
-      };
-
-      const analyticsResult = {
-        summary: {
-          totalSnapshots,
-          avgVehicles: Math.round(avgVehicles * 10) / 10,
-          avgHalting: Math.round(avgHalting * 10) / 10,
-          avgCongestion: Math.round(avgCongestion * 10) / 10,
-          peakVehicles,
-          peakTime: peakSnapshot?.timestamp,
-          dateRange: filters.dateRange,
-          intersectionCount: intersectionAnalytics.length,
-          systemEfficiency: Math.round((100 - avgCongestion) * 10) / 10,
-          dataQuality: Math.round((totalSnapshots / (totalSnapshots + 0)) * 100) // Simple quality metric
-        },
-        timeSeriesData,
-        intersectionAnalytics,
-        hourlyStats,
-        dailyStats,
-        lightingStats,
-        flowPatterns,
-        congestionDistribution,
-        trends: {
-          vehicleTrend: timeSeriesData.length > 1 ? 
-            ((timeSeriesData[timeSeriesData.length - 1].totalVehicles - timeSeriesData[0].totalVehicles) / timeSeriesData[0].totalVehicles * 100) : 0,
-          congestionTrend: timeSeriesData.length > 1 ? 
-            ((timeSeriesData[timeSeriesData.length - 1].congestionRate - timeSeriesData[0].congestionRate)) : 0
-        }
-      };
-
-      console.log('Advanced analytics processed successfully:', analyticsResult);
-      setAnalytics(analyticsResult);
-
-    } catch (err) {
-      console.error('Error processing analytics:', err);
-      setError('Error processing analytics: ' + err.message);
-    }
-  };
-
-  // Generate advanced chart data
-  const generateAdvancedChartData = (data) => {
-    try {
-      if (!data || data.length === 0) {
-        setChartData(null);
-        return;
-      }
-
-      const timeSeriesData = data.map((snapshot, index) => {
-        const intersections = snapshot.intersections || [];
-        const timestamp = new Date(snapshot.createdAt || Date.now());
-        
-        const totalVehicles = Array.isArray(intersections) 
-          ? intersections.reduce((sum, int) => sum + ((int && int['total-vehicles']) || 0), 0)
-          : 0;
-          
-        const totalHalting = Array.isArray(intersections)
-          ? intersections.reduce((sum, int) => sum + ((int && int['halting-vehicles']) || 0), 0)
-          : 0;
-
-        return {
-          index,
-          time: snapshot.time || 0,
-          timestamp,
-          totalVehicles,
-          totalHalting,
-          congestionRate: totalVehicles > 0 ? (totalHalting / totalVehicles * 100) : 0,
-          hour: timestamp.getHours(),
-          dayOfWeek: timestamp.getDay()
-        };
-      });
-
-      // Hourly aggregation for better visualization
-      const hourlyData = {};
-      timeSeriesData.forEach(point => {
-        if (!hourlyData[point.hour]) {
-          hourlyData[point.hour] = { vehicles: [], congestion: [], count: 0 };
-        }
-        hourlyData[point.hour].vehicles.push(point.totalVehicles);
-        hourlyData[point.hour].congestion.push(point.congestionRate);
-        hourlyData[point.hour].count++;
-      });
-
-      const hourlyAverages = Object.entries(hourlyData).map(([hour, data]) => ({
-        hour: parseInt(hour),
-        avgVehicles: data.vehicles.reduce((a, b) => a + b, 0) / data.vehicles.length,
-        avgCongestion: data.congestion.reduce((a, b) => a + b, 0) / data.congestion.length,
-        maxVehicles: Math.max(...data.vehicles),
-        minVehicles: Math.min(...data.vehicles)
-      }));
-
-      setChartData({
-        timeSeriesData,
-        hourlyAverages,
-        maxVehicles: Math.max(...timeSeriesData.map(d => d.totalVehicles)),
-        maxCongestion: Math.max(...timeSeriesData.map(d => d.congestionRate)),
-        avgVehicles: timeSeriesData.reduce((sum, d) => sum + d.totalVehicles, 0) / timeSeriesData.length,
-        avgCongestion: timeSeriesData.reduce((sum, d) => sum + d.congestionRate, 0) / timeSeriesData.length
-      });
-
-    } catch (err) {
-      console.error('Error generating chart data:', err);
-    }
-  };
-
   // Filter handlers
   const handleFilterChange = (filterName, value) => {
     setFilters(prev => ({
@@ -503,9 +198,9 @@ const TrafficAnalyticsComponent = () => {
           </button>
 
           <div className="status-info">
-            {historicalData.length > 0 && (
+            {recordCount > 0 && (
               <>
-                <span className="status-badge">{historicalData.length} records</span>
+                <span className="status-badge">{recordCount} records</span>
                 <span className="status-badge">{analytics?.summary?.intersectionCount || 0} intersections</span>
                 <span>Showing {filters.dateRange}</span>
               </>
@@ -521,7 +216,7 @@ const TrafficAnalyticsComponent = () => {
       </div>
 
       {/* No Data Message */}
-      {!loading && (!analytics || historicalData.length === 0) && (
+      {!loading && (!analytics || recordCount === 0) && (
         <div className="no-data-container">
           <h3 className="no-data-title">No Traffic Data Available</h3>
           <p className="no-data-text">